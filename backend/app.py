@@ -1,28 +1,11 @@
-from flask import Flask
-from flask_cors import CORS
-from app.routes.task_routes import task_bp
-from app.routes.questionnaire_routes import questionnaire_bp
+from app import create_app, start_workers
 import os
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-
-app = Flask(__name__)
-# Configure CORS to allow all origins, methods, and headers
-CORS(app, resources={r"/*": {
-    "origins": "*",
-    "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"]
-}}, supports_credentials=True)
-
-# Register blueprints
-app.register_blueprint(task_bp, url_prefix='/api/tasks')
-app.register_blueprint(questionnaire_bp, url_prefix='/api/questionnaires')
-
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    return {'status': 'healthy'}, 200
+# Development server; in production run wsgi.py under gunicorn (see gunicorn.conf.py)
+app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 5000))) 
\ No newline at end of file
+    # Only the reloader child serves requests, so only it runs the workers
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_workers()
+    app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -1 +1,141 @@
-# This file makes the app directory a Python package 
\ No newline at end of file
+"""
+Document processor and questionnaire API.
+
+`create_app()` builds the Flask app; `start_workers()` and `shutdown()`
+manage the background task workers of the serving process. backend/app.py
+runs the development server and wsgi.py is the production entry point.
+"""
+import threading
+
+_worker_pool = None
+_lifecycle_lock = threading.Lock()
+_pool_metrics_registered = False
+_env_loaded = False
+
+
+def load_env():
+    """Read .env into the environment, once per process"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+
+# Modules read their settings from the environment when imported, so load
+# .env before any of them is
+load_env()
+
+
+def create_app(config=None):
+    """
+    Build the API app. `config` is a mapping of Flask settings applied on
+    top of the defaults, e.g. {'TESTING': True}; set ENSURE_INDEXES to
+    False to skip the MongoDB index check at startup.
+    """
+    from flask import Flask
+    from flask_cors import CORS
+    from app import metrics
+    from app.config import USE_MONGODB
+    from app.db import pool_stats
+    from app.indexes import ENSURE_INDEXES_ON_STARTUP, bootstrap as bootstrap_indexes
+    from app.routes.task_routes import task_bp
+    from app.routes.questionnaire_routes import questionnaire_bp
+
+    app = Flask(__name__)
+    app.config['ENSURE_INDEXES'] = ENSURE_INDEXES_ON_STARTUP
+    app.config.from_mapping(config or {})
+
+    # Configure CORS to allow all origins, methods, and headers
+    CORS(app, resources={r"/*": {
+        "origins": "*",
+        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"]
+    }}, supports_credentials=True)
+
+    # Register blueprints
+    metrics.init_app(app)
+    app.register_blueprint(task_bp, url_prefix='/api/tasks')
+    app.register_blueprint(questionnaire_bp, url_prefix='/api/questionnaires')
+
+    if USE_MONGODB:
+        if app.config['ENSURE_INDEXES']:
+            bootstrap_indexes()
+        _register_pool_metrics()
+
+    @app.route('/api/health', methods=['GET'])
+    def health_check():
+        return {'status': 'healthy'}, 200
+
+    @app.route('/api/metrics', methods=['GET'])
+    def prometheus_metrics():
+        return metrics.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
+    @app.route('/api/metrics/pool', methods=['GET'])
+    def pool_metrics():
+        return pool_stats.snapshot(), 200
+
+    return app
+
+
+def _register_pool_metrics():
+    # Metrics are process-wide, so register them once however many apps are built
+    global _pool_metrics_registered
+    from app import metrics
+    from app.db import pool_stats
+
+    with _lifecycle_lock:
+        if _pool_metrics_registered:
+            return
+        _pool_metrics_registered = True
+
+    metrics.Gauge(
+        'mongo_pool_connections', 'MongoDB pool connections by state',
+        lambda: {(state,): pool_stats.snapshot()[key]
+                 for state, key in (('open', 'open'), ('in_use', 'inUse'), ('waiting', 'waiting'))},
+        ('state',)
+    )
+    metrics.Gauge(
+        'mongo_pool_checkouts_total', 'MongoDB connection checkouts by result',
+        lambda: {(result,): pool_stats.snapshot()[key]
+                 for result, key in (('ok', 'checkedOut'), ('failed', 'checkoutFailed'))},
+        ('result',), kind='counter'
+    )
+
+
+def start_workers():
+    """
+    Start the embedded task worker pool, unless RUN_EMBEDDED_WORKERS is off.
+    Threads do not survive a fork, so call this in each serving process.
+    """
+    global _worker_pool
+    from app.config import RUN_EMBEDDED_WORKERS
+    from app.services.job_queue import WorkerPool
+    from app.services.task_service import TaskService
+
+    with _lifecycle_lock:
+        if not RUN_EMBEDDED_WORKERS or _worker_pool is not None:
+            return _worker_pool
+        _worker_pool = WorkerPool(TaskService._process_task)
+        _worker_pool.start()
+        return _worker_pool
+
+
+def shutdown(timeout=None):
+    """
+    Drain the process before it exits: stop taking tasks and wait up to
+    `timeout` seconds for running ones, finish queued deployments and
+    write buffered questionnaire responses. Tasks still running afterwards
+    are requeued by another worker once their heartbeat expires.
+    """
+    global _worker_pool
+    from app.services.questionnaire_service import shutdown_deployments
+    from app.services.response_writer import response_writer
+
+    with _lifecycle_lock:
+        pool, _worker_pool = _worker_pool, None
+    if pool is not None:
+        print("Waiting for running tasks to finish...")
+        pool.stop(timeout)
+    shutdown_deployments()
+    response_writer.close()
@@ -0,0 +1,66 @@
+"""
+Request parsing and per-item results shared by the bulk endpoints.
+
+A bulk request body is a JSON array of items, or NDJSON (one JSON item per
+line, Content-Type application/x-ndjson). Every item gets a result with
+its position in the request, so clients can tell which ones failed.
+"""
+from collections import Counter
+import json
+import os
+
+from bson import ObjectId
+
+BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', '1000'))
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+class BulkRequestError(ValueError):
+    """Raised for a bulk request body that cannot be parsed"""
+
+
+def parse_items(request):
+    if request.mimetype in NDJSON_TYPES:
+        items = []
+        for number, line in enumerate(request.get_data(as_text=True).splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                raise BulkRequestError(f"Invalid JSON on line {number}")
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            raise BulkRequestError("Expected a JSON array or NDJSON body")
+
+    if len(items) > BULK_MAX_ITEMS:
+        raise BulkRequestError(f"At most {BULK_MAX_ITEMS} items per request")
+    return items
+
+
+def item_id(item):
+    """The id of an item given as an object with _id/id, or as a bare id"""
+    if isinstance(item, dict):
+        return item.get('_id') or item.get('id')
+    if isinstance(item, str):
+        return item
+    return None
+
+
+def item_object_id(item):
+    """item_id, if it is an ObjectId string; None when missing or malformed"""
+    _id = item_id(item)
+    return _id if isinstance(_id, str) and ObjectId.is_valid(_id) else None
+
+
+def write_errors(error):
+    """Error messages of a BulkWriteError, by operation index"""
+    return {e['index']: e.get('errmsg', 'Write failed') for e in error.details.get('writeErrors', [])}
+
+
+def response(results):
+    """Bulk response body: per-item results, in request order, and totals by status"""
+    results = sorted(results, key=lambda r: r['index'])
+    return {'results': results, 'counts': dict(Counter(r['status'] for r in results))}
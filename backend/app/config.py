@@ -1,69 +1,33 @@
 import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
 
 # Check if we should use MongoDB or in-memory store
 USE_MONGODB = os.environ.get('USE_MONGODB', 'false').lower() == 'true'
 
-if USE_MONGODB:
-    # MongoDB configuration
-    from pymongo import MongoClient
-    MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
-    DB_NAME = os.environ.get('DB_NAME', 'document_processor')
+# Default number of files a task downloads and extracts concurrently
+TASK_CONCURRENCY = int(os.environ.get('TASK_CONCURRENCY', '4'))
 
-    # Initialize MongoDB client
-    client = MongoClient(MONGO_URI)
-    db = client[DB_NAME]
+# Task queue and worker pool settings
+WORKER_CONCURRENCY = int(os.environ.get('WORKER_CONCURRENCY', '2'))
+WORKER_POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL', '2'))
+WORKER_HEARTBEAT_TIMEOUT = float(os.environ.get('WORKER_HEARTBEAT_TIMEOUT', '60'))
+QUEUE_MAX_DEPTH = int(os.environ.get('QUEUE_MAX_DEPTH', '100'))
+# Run the worker pool inside the API process (required for the in-memory store)
+RUN_EMBEDDED_WORKERS = os.environ.get('RUN_EMBEDDED_WORKERS', 'true').lower() == 'true'
+
+if USE_MONGODB:
+    # Collections on the shared client, connected on first use
+    from app.db import LazyCollection
 
-    # Collections
-    tasks_collection = db.tasks
+    tasks_collection = LazyCollection('tasks')
+    credentials_collection = LazyCollection('credentials')
 else:
     # In-memory store for development
-    class InMemoryCollection:
-        def __init__(self):
-            self.data = {}
-            self.counter = 0
-        
-        def find(self):
-            return self
-        
-        def find_one(self, query):
-            _id = query.get('_id')
-            return self.data.get(_id)
-        
-        def insert_one(self, document):
-            _id = document.get('_id')
-            self.data[_id] = document
-            self.counter += 1
-            return type('obj', (object,), {'inserted_id': _id})
-        
-        def update_one(self, query, update):
-            _id = query.get('_id')
-            if _id in self.data:
-                if '$set' in update:
-                    for key, value in update['$set'].items():
-                        self.data[_id][key] = value
-                return type('obj', (object,), {'modified_count': 1})
-            return type('obj', (object,), {'modified_count': 0})
-        
-        def delete_one(self, query):
-            _id = query.get('_id')
-            if _id in self.data:
-                del self.data[_id]
-                return type('obj', (object,), {'deleted_count': 1})
-            return type('obj', (object,), {'deleted_count': 0})
-        
-        def sort(self, *args, **kwargs):
-            # Just return self for chaining, actual sorting will be done when converted to list
-            return self
-        
-        def __iter__(self):
-            # Return all values in the data dictionary
-            return iter(self.data.values())
+    from app.memory_store import InMemoryCollection, DESCENDING, HASHED
     
     # Create in-memory collections
-    tasks_collection = InMemoryCollection()
+    tasks_collection = InMemoryCollection('tasks')
+    tasks_collection.create_index([('createdAt', DESCENDING)])
+    tasks_collection.create_index([('status', HASHED)])
+    credentials_collection = InMemoryCollection('credentials')
     
     print("Using in-memory store instead of MongoDB") 
\ No newline at end of file
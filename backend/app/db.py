@@ -0,0 +1,178 @@
+"""
+Shared MongoDB client.
+
+All collections go through one lazily created MongoClient, so importing
+the models does not open connections and the API keeps a single
+connection pool. The client is dropped in forked children (gunicorn
+pre-fork workers, multiprocessing) and recreated on first use there, as
+pymongo clients must not be shared across a fork.
+"""
+import os
+import threading
+
+from pymongo import MongoClient, monitoring
+
+MONGO_URI = (os.environ.get('MONGO_URI') or os.environ.get('MONGODB_URI')
+             or 'mongodb://localhost:27017/')
+DB_NAME = os.environ.get('DB_NAME', 'document_processor')
+
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '50'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '30000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '10000'))
+# primary, primaryPreferred, secondary, secondaryPreferred or nearest
+MONGO_READ_PREFERENCE = os.environ.get('MONGO_READ_PREFERENCE', 'primary')
+# A number of nodes or 'majority'
+MONGO_WRITE_CONCERN = os.environ.get('MONGO_WRITE_CONCERN', '1')
+MONGO_JOURNAL = os.environ.get('MONGO_JOURNAL', 'false').lower() == 'true'
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters collected from pymongo pool events"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counts = {
+            'pools': 0,
+            'connectionsCreated': 0,
+            'connectionsClosed': 0,
+            'checkedOut': 0,
+            'checkedIn': 0,
+            'checkoutFailed': 0,
+            'poolsCleared': 0,
+        }
+        self.waiting = 0
+
+    def _count(self, name, delta=1):
+        with self.lock:
+            self.counts[name] += delta
+
+    def snapshot(self):
+        with self.lock:
+            counts = dict(self.counts)
+            waiting = self.waiting
+        counts['open'] = counts['connectionsCreated'] - counts['connectionsClosed']
+        counts['inUse'] = counts['checkedOut'] - counts['checkedIn']
+        counts['waiting'] = waiting
+        counts['maxPoolSize'] = MONGO_MAX_POOL_SIZE
+        return counts
+
+    def pool_created(self, event):
+        self._count('pools')
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._count('poolsCleared')
+
+    def pool_closed(self, event):
+        self._count('pools', -1)
+
+    def connection_created(self, event):
+        self._count('connectionsCreated')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._count('connectionsClosed')
+
+    def connection_check_out_started(self, event):
+        with self.lock:
+            self.waiting += 1
+
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            self.waiting -= 1
+            self.counts['checkoutFailed'] += 1
+
+    def connection_checked_out(self, event):
+        with self.lock:
+            self.waiting -= 1
+            self.counts['checkedOut'] += 1
+
+    def connection_checked_in(self, event):
+        self._count('checkedIn')
+
+
+pool_stats = PoolStats()
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _write_concern():
+    return MONGO_WRITE_CONCERN if MONGO_WRITE_CONCERN == 'majority' else int(MONGO_WRITE_CONCERN)
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(
+                    MONGO_URI,
+                    maxPoolSize=MONGO_MAX_POOL_SIZE,
+                    minPoolSize=MONGO_MIN_POOL_SIZE,
+                    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+                    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+                    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                    readPreference=MONGO_READ_PREFERENCE,
+                    w=_write_concern(),
+                    journal=MONGO_JOURNAL,
+                    event_listeners=[pool_stats],
+                )
+    return _client
+
+
+def get_db(name=None):
+    return get_client()[name or DB_NAME]
+
+
+def close_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def _reset_after_fork():
+    # The parent's sockets and monitor threads are unusable in the child;
+    # forget the client instead of closing it and build a new one on demand
+    global _client, _client_lock
+    _client = None
+    _client_lock = threading.Lock()
+    pool_stats.lock = threading.Lock()
+    pool_stats.reset()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class LazyCollection:
+    """
+    A collection that is looked up on the shared client when first used.
+
+    Behaves like a pymongo Collection; attribute access is forwarded to it.
+    """
+    def __init__(self, name, db_name=None):
+        self.name = name
+        self.db_name = db_name
+
+    def _collection(self):
+        return get_db(self.db_name)[self.name]
+
+    def __getattr__(self, attr):
+        return getattr(self._collection(), attr)
+
+    def __repr__(self):
+        return f"LazyCollection({self.db_name or DB_NAME}.{self.name})"
@@ -0,0 +1,133 @@
+"""
+MongoDB index bootstrap and query plan checks.
+
+Creates the indexes the services rely on and explains the queries they run,
+warning when one of them still needs a collection scan or an in-memory
+sort. Runs at API startup when MongoDB is enabled, or on demand:
+
+    python -m app.indexes            # create indexes, then verify
+    python -m app.indexes --verify   # only explain the known queries
+"""
+import argparse
+import os
+
+ENSURE_INDEXES_ON_STARTUP = os.environ.get('ENSURE_INDEXES_ON_STARTUP', 'true').lower() == 'true'
+
+# Indexes per collection, as (keys, options)
+INDEXES = {
+    'tasks': [
+        # Task list, newest first, and keyset pagination on createdAt + _id
+        ([('createdAt', -1), ('_id', -1)], {'name': 'createdAt_id'}),
+        # Queue claim: oldest queued task first
+        ([('status', 1), ('queuedAt', 1)], {'name': 'status_queuedAt'}),
+        # Orphan recovery: in_progress tasks with a stale heartbeat
+        ([('status', 1), ('heartbeatAt', 1)], {'name': 'status_heartbeatAt'}),
+    ],
+    'questionnaires': [
+        # Questionnaire list, newest first, and keyset pagination
+        ([('created_at', -1), ('_id', -1)], {'name': 'created_at_id'}),
+        ([('status', 1), ('created_at', -1)], {'name': 'status_created_at'}),
+    ],
+    'responses': [
+        # Responses of one questionnaire, e.g. to rebuild its statistics
+        ([('questionnaire_id', 1), ('submitted_at', 1)], {'name': 'questionnaire_id_submitted_at'}),
+    ],
+}
+
+# Queries issued by TaskService, JobQueue and questionnaire_routes, as
+# (collection, description, filter, sort)
+KNOWN_QUERIES = [
+    ('tasks', 'TaskService.get_all_tasks', {}, [('createdAt', -1)]),
+    ('tasks', 'TaskService.get_tasks_page (next page)',
+     {'createdAt': {'$lte': '9999'},
+      '$or': [{'createdAt': {'$lt': '9999'}}, {'createdAt': '9999', '_id': {'$lt': ''}}]},
+     [('createdAt', -1), ('_id', -1)]),
+    ('tasks', 'JobQueue.claim', {'status': 'queued'}, [('queuedAt', 1)]),
+    ('tasks', 'JobQueue.recover_orphaned',
+     {'status': 'in_progress', 'heartbeatAt': {'$lt': '9999'}}, None),
+    ('tasks', 'JobQueue.enqueue (queue depth)', {'status': 'queued'}, None),
+    ('questionnaires', 'questionnaire_routes.get_questionnaires', {}, [('created_at', -1)]),
+]
+
+
+def _collections():
+    from app.config import tasks_collection
+    from app.models.questionnaire import questionnaire_collection
+    from app.models.response import responses_collection
+    return {'tasks': tasks_collection, 'questionnaires': questionnaire_collection,
+            'responses': responses_collection}
+
+
+def ensure_indexes(collections=None):
+    collections = collections or _collections()
+    for name, indexes in INDEXES.items():
+        collection = collections.get(name)
+        if collection is None:
+            continue
+        for keys, options in indexes:
+            collection.create_index(keys, **options)
+    print("MongoDB indexes are in place")
+
+
+def _plan_stages(plan):
+    """All stage names in a (possibly nested) explain plan"""
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for key in ('inputStage', 'queryPlan', 'winningPlan'):
+            if key in plan:
+                yield from _plan_stages(plan[key])
+        for child in plan.get('inputStages', []):
+            yield from _plan_stages(child)
+
+
+def explain_query(collection, query, sort=None):
+    cursor = collection.find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    explanation = cursor.limit(1).explain()
+    return list(_plan_stages(explanation.get('queryPlanner', {}).get('winningPlan', {})))
+
+
+def verify_indexes(collections=None):
+    """Explain the known queries and return warnings for unindexed ones"""
+    collections = collections or _collections()
+    warnings = []
+    for name, description, query, sort in KNOWN_QUERIES:
+        collection = collections.get(name)
+        if collection is None or not hasattr(collection, 'database'):
+            # The in-memory store has no query planner to ask
+            continue
+        stages = explain_query(collection, query, sort)
+        if 'COLLSCAN' in stages:
+            warnings.append(f"{description} on '{name}' uses a collection scan")
+        elif 'SORT' in stages:
+            warnings.append(f"{description} on '{name}' sorts in memory")
+    for warning in warnings:
+        print(f"WARNING: {warning}")
+    return warnings
+
+
+def bootstrap():
+    """Startup hook: create indexes and report queries that miss them"""
+    try:
+        ensure_indexes()
+        verify_indexes()
+    except Exception as e:
+        print(f"Could not bootstrap MongoDB indexes: {str(e)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create and verify MongoDB indexes")
+    parser.add_argument('--verify', action='store_true',
+                        help="only explain the known queries, do not create indexes")
+    args = parser.parse_args()
+
+    if not args.verify:
+        ensure_indexes()
+    warnings = verify_indexes()
+    raise SystemExit(1 if warnings else 0)
+
+
+if __name__ == '__main__':
+    main()
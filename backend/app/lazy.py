@@ -0,0 +1,63 @@
+"""
+Registry of heavy dependencies that are imported on first use.
+
+The Google API client stack and requests take a large share of startup
+time and are only needed once a task runs. Modules declare them with
+
+    requests = lazy.module('requests')
+
+and the import happens on the first attribute access, e.g.
+`requests.Session()`. `available()` checks that a dependency is installed
+without importing it.
+"""
+import importlib
+import importlib.util
+import threading
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class LazyModule:
+    """Stand-in that imports the module named `name` on first attribute access"""
+    __slots__ = ('_name', '_module')
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            # import_module holds the import lock, so concurrent first uses are safe
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def module(name):
+    """The shared lazy handle for the module `name`"""
+    with _registry_lock:
+        handle = _registry.get(name)
+        if handle is None:
+            handle = _registry[name] = LazyModule(name)
+        return handle
+
+
+def available(*names):
+    """True if all the named modules can be imported; imports nothing but parent packages"""
+    try:
+        return all(importlib.util.find_spec(name) is not None for name in names)
+    except (ImportError, ValueError):
+        return False
+
+
+def loaded():
+    """Names of the registered modules that have been imported so far"""
+    with _registry_lock:
+        return sorted(name for name, handle in _registry.items() if handle._module is not None)
@@ -0,0 +1,653 @@
+"""
+In-memory stand-in for a pymongo collection, used when USE_MONGODB is off
+(development, CI and load testing).
+
+It implements the subset of the pymongo API the services use, with Mongo
+semantics where it matters:
+
+- filters with dotted paths, $eq/$ne/$gt/$gte/$lt/$lte/$in/$nin/$exists
+  and $and/$or/$nor; comparisons are type-bracketed like Mongo
+- inclusion/exclusion projections
+- cursors with sort (on one or more keys), skip and limit
+- updates with $set/$unset/$inc/$push/$setOnInsert and upserts
+- bulk_write with the pymongo InsertOne/UpdateOne/UpdateMany/ReplaceOne/
+  DeleteOne/DeleteMany operations
+- single-field secondary indexes: sorted (range queries and ordered scans
+  that stop as soon as skip + limit documents matched) and hashed
+  (equality and $in). Array values are indexed as a whole, not per element.
+
+All operations take a re-entrant lock, so the collection can be shared by
+the API and the task worker threads. Documents are copied on the way in
+and out, as a round trip through pymongo would.
+"""
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from types import SimpleNamespace
+import copy
+import threading
+
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+ASCENDING = 1
+DESCENDING = -1
+HASHED = 'hashed'
+
+# Filter results up to this size are sorted directly instead of walking
+# the sort index
+INDEX_SCAN_THRESHOLD = 1000
+
+_MISSING = object()
+
+# BSON comparison order between types
+_TYPE_RANKS = ((type(None), 0), (bool, 7), (int, 1), (float, 1), (str, 2),
+               (dict, 3), (list, 4), (ObjectId, 6), (datetime, 8))
+
+
+def _sort_key(value):
+    """Total order over values that follows Mongo's cross-type ordering"""
+    if value is _MISSING:
+        value = None
+    for value_type, rank in _TYPE_RANKS:
+        if isinstance(value, value_type):
+            if rank == 0:
+                return (rank, 0)
+            if rank in (3, 4):
+                return (rank, repr(value))
+            return (rank, value)
+    return (9, repr(value))
+
+
+def _get_path(document, path):
+    value = document
+    for part in path.split('.'):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return _MISSING
+    return value
+
+
+def _set_path(document, path, value):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        document = document.setdefault(part, {})
+    document[parts[-1]] = value
+
+
+def _unset_path(document, path):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return
+    document.pop(parts[-1], None)
+
+
+def _compare(value, operand, test):
+    # Range operators only match values of the same BSON type class
+    if value is _MISSING:
+        return False
+    left, right = _sort_key(value), _sort_key(operand)
+    return left[0] == right[0] and test(left, right)
+
+
+def _equals(value, operand):
+    if value is _MISSING:
+        return operand is None
+    if isinstance(value, list) and not isinstance(operand, list):
+        return operand in value
+    return value == operand
+
+
+def _match_condition(value, condition):
+    if not isinstance(condition, dict) or not any(k.startswith('$') for k in condition):
+        return _equals(value, condition)
+
+    for op, operand in condition.items():
+        if op == '$eq':
+            matched = _equals(value, operand)
+        elif op == '$ne':
+            matched = not _equals(value, operand)
+        elif op == '$in':
+            matched = any(_equals(value, item) for item in operand)
+        elif op == '$nin':
+            matched = not any(_equals(value, item) for item in operand)
+        elif op == '$exists':
+            matched = (value is not _MISSING) == bool(operand)
+        elif op == '$gt':
+            matched = _compare(value, operand, lambda a, b: a > b)
+        elif op == '$gte':
+            matched = _compare(value, operand, lambda a, b: a >= b)
+        elif op == '$lt':
+            matched = _compare(value, operand, lambda a, b: a < b)
+        elif op == '$lte':
+            matched = _compare(value, operand, lambda a, b: a <= b)
+        else:
+            raise ValueError(f"Unsupported query operator: {op}")
+        if not matched:
+            return False
+    return True
+
+
+def matches(document, query):
+    """Check whether a document satisfies a Mongo-style filter"""
+    for key, condition in (query or {}).items():
+        if key == '$and':
+            if not all(matches(document, sub) for sub in condition):
+                return False
+        elif key == '$or':
+            if not any(matches(document, sub) for sub in condition):
+                return False
+        elif key == '$nor':
+            if any(matches(document, sub) for sub in condition):
+                return False
+        elif not _match_condition(_get_path(document, key), condition):
+            return False
+    return True
+
+
+def project(document, projection):
+    """Copy of a stored document with the projection applied"""
+    if not projection:
+        return copy.deepcopy(document)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    include_id = projection.get('_id', 1)
+    fields = {k: v for k, v in projection.items() if k != '_id'}
+    if fields and all(fields.values()):
+        result = {}
+        for path in fields:
+            value = _get_path(document, path)
+            if value is not _MISSING:
+                _set_path(result, path, copy.deepcopy(value))
+        if include_id and '_id' in document:
+            result['_id'] = document['_id']
+        return result
+    result = copy.deepcopy(document)
+    for path in fields:
+        _unset_path(result, path)
+    if not include_id:
+        result.pop('_id', None)
+    return result
+
+
+def _normalize_keys(key_or_list, direction=None):
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction if direction is not None else ASCENDING)]
+    return list(key_or_list)
+
+
+class _SortedIndex:
+    def __init__(self, field):
+        self.field = field
+        self.entries = []
+
+    def _entry(self, document):
+        return (_sort_key(_get_path(document, self.field)), _sort_key(document['_id']))
+
+    def add(self, document):
+        insort(self.entries, self._entry(document) + (document['_id'],))
+
+    def remove(self, document):
+        entry = self._entry(document)
+        i = bisect_left(self.entries, entry)
+        while i < len(self.entries) and self.entries[i][:2] == entry:
+            if self.entries[i][2] == document['_id']:
+                del self.entries[i]
+                return
+            i += 1
+
+    def lookup(self, condition):
+        """Ids matching condition, or None if the index cannot serve it"""
+        if not isinstance(condition, dict) or not any(k.startswith('$') for k in condition):
+            condition = {'$eq': condition}
+        ids = None
+        for op, operand in condition.items():
+            if op == '$eq' and not isinstance(operand, (list, dict)):
+                found = self._range(_sort_key(operand), True, _sort_key(operand), True)
+            elif op == '$in' and not any(isinstance(v, (list, dict)) for v in operand):
+                found = []
+                for value in operand:
+                    found.extend(self._range(_sort_key(value), True, _sort_key(value), True))
+            elif op in ('$gt', '$gte'):
+                low = _sort_key(operand)
+                found = self._range(low, op == '$gte', (low[0] + 1,), False)
+            elif op in ('$lt', '$lte'):
+                high = _sort_key(operand)
+                found = self._range((high[0],), True, high, op == '$lte')
+            else:
+                continue
+            found = set(found)
+            ids = found if ids is None else ids & found
+        return ids
+
+    def _slice(self, low, low_inclusive, high, high_inclusive):
+        entries = self.entries
+        start = bisect_left(entries, (low,)) if low_inclusive else bisect_right(entries, (low, (99,)))
+        end = bisect_right(entries, (high, (99,))) if high_inclusive else bisect_left(entries, (high,))
+        return start, end
+
+    def _range(self, low, low_inclusive, high, high_inclusive):
+        start, end = self._slice(low, low_inclusive, high, high_inclusive)
+        return [entry[2] for entry in self.entries[start:end]]
+
+    def ordered_ids(self, descending=False, condition=None):
+        """
+        Ids in index order, limited to the range operators in condition so a
+        keyset-paginated scan starts right at its cursor.
+        """
+        start, end = 0, len(self.entries)
+        if isinstance(condition, dict):
+            for op, operand in condition.items():
+                key = _sort_key(operand)
+                if op in ('$gt', '$gte'):
+                    low, high = self._slice(key, op == '$gte', (key[0] + 1,), False)
+                elif op in ('$lt', '$lte'):
+                    low, high = self._slice((key[0],), True, key, op == '$lte')
+                else:
+                    continue
+                start, end = max(start, low), min(end, high)
+        entries = self.entries
+        indices = range(end - 1, start - 1, -1) if descending else range(start, end)
+        return (entries[i][2] for i in indices)
+
+
+class _HashIndex:
+    def __init__(self, field):
+        self.field = field
+        self.buckets = {}
+
+    def _key(self, document):
+        value = _get_path(document, self.field)
+        return _sort_key(None if value is _MISSING else value)
+
+    def add(self, document):
+        self.buckets.setdefault(self._key(document), set()).add(document['_id'])
+
+    def remove(self, document):
+        key = self._key(document)
+        bucket = self.buckets.get(key)
+        if bucket:
+            bucket.discard(document['_id'])
+            if not bucket:
+                del self.buckets[key]
+
+    def lookup(self, condition):
+        if not isinstance(condition, dict) or not any(k.startswith('$') for k in condition):
+            condition = {'$eq': condition}
+        if set(condition) == {'$eq'} and not isinstance(condition['$eq'], (list, dict)):
+            return set(self.buckets.get(_sort_key(condition['$eq']), ()))
+        if set(condition) == {'$in'} and not any(isinstance(v, (list, dict)) for v in condition['$in']):
+            ids = set()
+            for value in condition['$in']:
+                ids |= self.buckets.get(_sort_key(value), set())
+            return ids
+        return None
+
+
+class InMemoryCursor:
+    def __init__(self, collection, query=None, projection=None):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _normalize_keys(key_or_list, direction)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def __iter__(self):
+        documents = self._collection._select(self._query, self._sort, self._skip, self._limit)
+        return iter([project(document, self._projection) for document in documents])
+
+
+class InMemoryCollection:
+    def __init__(self, name=''):
+        self.name = name
+        self.data = {}
+        self._indexes = {}
+        self._unique = set()
+        self.lock = threading.RLock()
+
+    # Indexes
+
+    def create_index(self, keys, unique=False, **kwargs):
+        field, direction = _normalize_keys(keys)[0]
+        with self.lock:
+            if field not in self._indexes:
+                index = _HashIndex(field) if direction == HASHED else _SortedIndex(field)
+                for document in self.data.values():
+                    index.add(document)
+                self._indexes[field] = index
+            if unique:
+                self._unique.add(field)
+        return kwargs.get('name', f"{field}_{direction}")
+
+    def index_information(self):
+        with self.lock:
+            return {f"{field}_{'hashed' if isinstance(index, _HashIndex) else 1}": {'key': [(field, 1)]}
+                    for field, index in self._indexes.items()}
+
+    def _index_add(self, document):
+        for index in self._indexes.values():
+            index.add(document)
+
+    def _index_remove(self, document):
+        for index in self._indexes.values():
+            index.remove(document)
+
+    # Queries
+
+    def _select(self, query, sort=None, skip=0, limit=0):
+        with self.lock:
+            ordered = self._index_order(sort, query) if sort else None
+            if ordered is not None:
+                candidates = self._candidate_ids(query, skip_field=sort[0][0])
+                # A very selective filter index beats walking the sort index
+                if candidates is not None and len(candidates) <= INDEX_SCAN_THRESHOLD:
+                    ordered = None
+            else:
+                candidates = self._candidate_ids(query)
+
+            if ordered is not None:
+                # Walk the index in sort order and stop once enough matched
+                wanted = skip + limit if limit else None
+                selected = []
+                for _id in ordered:
+                    if candidates is not None and _id not in candidates:
+                        continue
+                    document = self.data[_id]
+                    if matches(document, query):
+                        selected.append(document)
+                        if wanted and len(selected) >= wanted:
+                            break
+                return selected[skip:]
+
+            documents = self.data.values() if candidates is None else \
+                (self.data[_id] for _id in candidates if _id in self.data)
+            selected = [document for document in documents if matches(document, query)]
+            if sort:
+                for field, direction in reversed(sort):
+                    selected.sort(key=lambda d: _sort_key(_get_path(d, field)),
+                                  reverse=direction == DESCENDING)
+            return selected[skip:skip + limit] if limit else selected[skip:]
+
+    def _candidate_ids(self, query, skip_field=None):
+        if '_id' in (query or {}):
+            condition = query['_id']
+            if not isinstance(condition, dict):
+                return {condition} if condition in self.data else set()
+            if set(condition) == {'$in'}:
+                return {_id for _id in condition['$in'] if _id in self.data}
+        best = None
+        for field, condition in (query or {}).items():
+            index = self._indexes.get(field)
+            if index is None or field == skip_field:
+                continue
+            ids = index.lookup(condition)
+            if ids is not None and (best is None or len(ids) < len(best)):
+                best = ids
+        return best
+
+    def _index_order(self, sort, query):
+        field, direction = sort[0]
+        index = self._indexes.get(field)
+        if not isinstance(index, _SortedIndex):
+            return None
+        # The index breaks ties on _id, so a trailing _id key in the same
+        # direction is already satisfied
+        if len(sort) > 2 or (len(sort) == 2 and sort[1] != ('_id', direction)):
+            return None
+        return index.ordered_ids(descending=direction == DESCENDING,
+                                 condition=(query or {}).get(field))
+
+    def find(self, query=None, projection=None):
+        return InMemoryCursor(self, query, projection)
+
+    def find_one(self, query=None, projection=None, sort=None):
+        documents = self._select(query or {}, _normalize_keys(sort) if sort else None, 0, 1)
+        return project(documents[0], projection) if documents else None
+
+    def count_documents(self, query, **kwargs):
+        with self.lock:
+            if not query:
+                return len(self.data)
+            return len(self._select(query))
+
+    def estimated_document_count(self):
+        return len(self.data)
+
+    # Writes
+
+    def _check_unique(self, document, ignore_id=None):
+        for field in self._unique:
+            value = _get_path(document, field)
+            for other in self._select({field: None if value is _MISSING else value}):
+                if other['_id'] != ignore_id:
+                    raise DuplicateKeyError(f"E11000 duplicate key error: {field} {value!r}")
+
+    def insert_one(self, document):
+        with self.lock:
+            if '_id' not in document:
+                document['_id'] = ObjectId()
+            if document['_id'] in self.data:
+                raise DuplicateKeyError(f"E11000 duplicate key error: _id {document['_id']!r}")
+            self._check_unique(document)
+            # Like a round trip through BSON, later changes to the caller's
+            # objects must not leak into the store
+            stored = copy.deepcopy(document)
+            self.data[stored['_id']] = stored
+            self._index_add(stored)
+        return SimpleNamespace(inserted_id=stored['_id'], acknowledged=True)
+
+    def insert_many(self, documents, ordered=True):
+        inserted_ids = []
+        errors = []
+        for i, document in enumerate(documents):
+            try:
+                inserted_ids.append(self.insert_one(document).inserted_id)
+            except DuplicateKeyError as e:
+                errors.append({'index': i, 'code': 11000, 'errmsg': str(e)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'nInserted': len(inserted_ids)})
+        return SimpleNamespace(inserted_ids=inserted_ids, acknowledged=True)
+
+    def _apply_update(self, document, update, inserting=False):
+        update = copy.deepcopy(update)
+        if not any(key.startswith('$') for key in update):
+            replacement = dict(update)
+            replacement['_id'] = document['_id']
+            document.clear()
+            document.update(replacement)
+            return
+        for op, fields in update.items():
+            for path, value in fields.items():
+                if op == '$set' or (op == '$setOnInsert' and inserting):
+                    _set_path(document, path, value)
+                elif op == '$unset':
+                    _unset_path(document, path)
+                elif op == '$inc':
+                    current = _get_path(document, path)
+                    _set_path(document, path, (0 if current is _MISSING else current) + value)
+                elif op == '$push':
+                    current = _get_path(document, path)
+                    items = [] if current is _MISSING else list(current)
+                    if isinstance(value, dict) and '$each' in value:
+                        items.extend(value['$each'])
+                    else:
+                        items.append(value)
+                    _set_path(document, path, items)
+                elif op != '$setOnInsert':
+                    raise ValueError(f"Unsupported update operator: {op}")
+
+    def _update(self, document, update, inserting=False):
+        """
+        Apply an update in place, keeping indexes in sync. Returns whether the
+        document changed and a copy of it from before the update.
+        """
+        before = copy.deepcopy(document)
+        self._index_remove(document)
+        try:
+            self._apply_update(document, update, inserting)
+            self._check_unique(document, ignore_id=document['_id'])
+        except Exception:
+            document.clear()
+            document.update(before)
+            raise
+        finally:
+            self._index_add(document)
+        return document != before, before
+
+    def _upsert(self, query, update):
+        document = {k: v for k, v in query.items()
+                    if not k.startswith('$') and not isinstance(v, dict)}
+        document.setdefault('_id', ObjectId())
+        with self.lock:
+            self._check_unique(document)
+            self.data[document['_id']] = document
+            self._index_add(document)
+            self._update(document, update, inserting=True)
+        return document
+
+    def update_one(self, query, update, upsert=False):
+        with self.lock:
+            documents = self._select(query, limit=1)
+            if documents:
+                modified, _ = self._update(documents[0], update)
+                return SimpleNamespace(matched_count=1, modified_count=int(modified),
+                                       upserted_id=None, acknowledged=True)
+            if upsert:
+                document = self._upsert(query, update)
+                return SimpleNamespace(matched_count=0, modified_count=0,
+                                       upserted_id=document['_id'], acknowledged=True)
+        return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None,
+                               acknowledged=True)
+
+    def update_many(self, query, update, upsert=False):
+        with self.lock:
+            documents = self._select(query)
+            modified = sum(1 for document in documents if self._update(document, update)[0])
+            if not documents and upsert:
+                document = self._upsert(query, update)
+                return SimpleNamespace(matched_count=0, modified_count=0,
+                                       upserted_id=document['_id'], acknowledged=True)
+        return SimpleNamespace(matched_count=len(documents), modified_count=modified,
+                               upserted_id=None, acknowledged=True)
+
+    def replace_one(self, query, replacement, upsert=False):
+        replacement = dict(replacement)
+        _id = replacement.pop('_id', None)
+        if upsert and _id is not None and '_id' not in query:
+            # An upserted document keeps the _id of the replacement
+            query = dict(query, _id=_id)
+        return self.update_one(query, replacement, upsert=upsert)
+
+    def find_one_and_update(self, query, update, projection=None, sort=None,
+                            upsert=False, return_document=False, **kwargs):
+        with self.lock:
+            documents = self._select(query, _normalize_keys(sort) if sort else None, 0, 1)
+            if documents:
+                document = documents[0]
+                _, before = self._update(document, update)
+            elif upsert:
+                document = self._upsert(query, update)
+                before = None
+            else:
+                return None
+            result = document if return_document else before
+            return project(result, projection) if result is not None else None
+
+    def delete_one(self, query):
+        with self.lock:
+            documents = self._select(query, limit=1)
+            for document in documents:
+                self._index_remove(document)
+                del self.data[document['_id']]
+        return SimpleNamespace(deleted_count=len(documents), acknowledged=True)
+
+    def delete_many(self, query):
+        with self.lock:
+            documents = self._select(query)
+            for document in documents:
+                self._index_remove(document)
+                del self.data[document['_id']]
+        return SimpleNamespace(deleted_count=len(documents), acknowledged=True)
+
+    def bulk_write(self, requests, ordered=True):
+        """
+        Apply pymongo write operations in order. Like Mongo, an ordered bulk
+        write stops at the first error and an unordered one carries on;
+        either way errors are raised together as a BulkWriteError.
+        """
+        counts = {'nInserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'nUpserted': 0}
+        upserted = []
+        errors = []
+        with self.lock:
+            for i, request in enumerate(requests):
+                try:
+                    result = self._apply_request(request)
+                except DuplicateKeyError as e:
+                    errors.append({'index': i, 'code': 11000, 'errmsg': str(e)})
+                    if ordered:
+                        break
+                    continue
+                if isinstance(request, InsertOne):
+                    counts['nInserted'] += 1
+                elif isinstance(request, (DeleteOne, DeleteMany)):
+                    counts['nRemoved'] += result.deleted_count
+                elif result.upserted_id is not None:
+                    counts['nUpserted'] += 1
+                    upserted.append({'index': i, '_id': result.upserted_id})
+                else:
+                    counts['nMatched'] += result.matched_count
+                    counts['nModified'] += result.modified_count
+
+        if errors:
+            raise BulkWriteError(dict(counts, writeErrors=errors, upserted=upserted))
+        return SimpleNamespace(
+            inserted_count=counts['nInserted'],
+            matched_count=counts['nMatched'],
+            modified_count=counts['nModified'],
+            deleted_count=counts['nRemoved'],
+            upserted_count=counts['nUpserted'],
+            upserted_ids={u['index']: u['_id'] for u in upserted},
+            bulk_api_result=dict(counts, writeErrors=[], upserted=upserted),
+            acknowledged=True
+        )
+
+    def _apply_request(self, request):
+        if isinstance(request, InsertOne):
+            return self.insert_one(request._doc)
+        if isinstance(request, UpdateOne):
+            return self.update_one(request._filter, request._doc, upsert=bool(request._upsert))
+        if isinstance(request, UpdateMany):
+            return self.update_many(request._filter, request._doc, upsert=bool(request._upsert))
+        if isinstance(request, ReplaceOne):
+            return self.replace_one(request._filter, request._doc, upsert=bool(request._upsert))
+        if isinstance(request, DeleteOne):
+            return self.delete_one(request._filter)
+        if isinstance(request, DeleteMany):
+            return self.delete_many(request._filter)
+        raise TypeError(f"Unsupported bulk write operation: {request!r}")
+
+    def drop(self):
+        with self.lock:
+            self.data.clear()
+            for index in self._indexes.values():
+                index.__init__(index.field)
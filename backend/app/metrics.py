@@ -0,0 +1,194 @@
+"""
+Lightweight in-process metrics in the Prometheus text format.
+
+Counters and histograms are plain dicts of floats behind a lock, keyed by
+label values, so recording a sample costs a dict lookup and a bisect.
+Gauges are callbacks evaluated when /api/metrics is scraped.
+
+    with timed(PIPELINE_STAGE_SECONDS, stage='download'):
+        ...
+    PIPELINE_FILES.inc(result='failed')
+
+Metrics are per process; with several worker processes, scrape each one.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Label values -> [count per bucket (+Inf last), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self):
+        """{label values: (count, sum)} of the samples observed so far"""
+        with self._lock:
+            return {key: (sum(counts), total) for key, (counts, total) in self._values.items()}
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Gauge:
+    """
+    Samples read from `callback`, a function returning {label values: value},
+    at scrape time. `kind='counter'` exposes totals kept elsewhere.
+    """
+    def __init__(self, name, documentation, callback, labelnames=(), kind='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+        _registry.append(self)
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.kind}'
+        for key, value in self.callback().items():
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """Observe the time spent in the block, whether or not it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+
+def render():
+    lines = []
+    for metric in list(_registry):
+        try:
+            lines.extend(metric.collect())
+        except Exception as e:
+            print(f"Could not collect metric {metric.name}: {str(e)}")
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """Time every request by route template, method and status"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            # The route template keeps the number of label values bounded
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            labels = {'method': request.method, 'route': route, 'status': str(response.status_code)}
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, **labels)
+        return response
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Time to handle an API request',
+    ('method', 'route', 'status')
+)
+PIPELINE_STAGE_SECONDS = Histogram(
+    'pipeline_stage_duration_seconds',
+    'Time spent per task pipeline step: Drive listing page, file download, extraction, output write',
+    ('stage',)
+)
+PIPELINE_FILES = Counter(
+    'pipeline_files_total', 'Files processed by tasks, by result (extracted, cached or failed)',
+    ('result',)
+)
+TASK_RUNS = Counter('task_runs_total', 'Finished task runs by status', ('status',))
+BRAINBASE_CALL_SECONDS = Histogram(
+    'brainbase_call_duration_seconds', 'Time per Brainbase API call', ('call',)
+)
+BRAINBASE_CALL_ERRORS = Counter(
+    'brainbase_call_errors_total', 'Failed Brainbase API calls', ('call',)
+)
+
+
+@contextmanager
+def timed_call(call):
+    """Time a Brainbase call and count it as an error if it raises"""
+    try:
+        with timed(BRAINBASE_CALL_SECONDS, call=call):
+            yield
+    except Exception:
+        BRAINBASE_CALL_ERRORS.inc(call=call)
+        raise
@@ -1,27 +1,14 @@
 from datetime import datetime
 from typing import List, Optional
 from enum import Enum
-from pymongo import MongoClient
 from bson import ObjectId
+from app.db import LazyCollection
 from pydantic import BaseModel, Field
 import os
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-
-# MongoDB connection setup
-MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
+# Questionnaires live in their own database on the shared MongoDB client
 DB_NAME = os.getenv('DB_NAME', 'questionnaire_db')
-
-try:
-    client = MongoClient(MONGODB_URI)
-    db = client[DB_NAME]
-    questionnaire_collection = db['questionnaires']
-    print(f"Successfully connected to MongoDB: {DB_NAME}")
-except Exception as e:
-    print(f"Error connecting to MongoDB: {e}")
-    raise e
+questionnaire_collection = LazyCollection('questionnaires', DB_NAME)
 
 class QuestionnaireStatus(str, Enum):
     NOT_STARTED = "Not Started"
@@ -57,4 +44,12 @@ class Questionnaire(BaseModel):
         if data:
             data['id'] = str(data.pop('_id'))
             return cls(**data)
-        return None 
\ No newline at end of file
+        return None
+
+    @staticmethod
+    def partial_from_mongo(data):
+        """Convert a projected MongoDB document to a response dict"""
+        item = {k: v for k, v in data.items() if k != '_id'}
+        if '_id' in data:
+            item['id'] = str(data['_id'])
+        return item
@@ -0,0 +1,19 @@
+from app.config import USE_MONGODB
+
+if USE_MONGODB:
+    # Responses are stored next to the questionnaires they answer
+    from app.db import LazyCollection
+    from app.models.questionnaire import DB_NAME
+
+    responses_collection = LazyCollection('responses', DB_NAME)
+    questionnaire_stats_collection = LazyCollection('questionnaire_stats', DB_NAME)
+    # Responses that could not be stored after repeated attempts
+    dead_letters_collection = LazyCollection('response_dead_letters', DB_NAME)
+else:
+    # In-memory store for development
+    from app.memory_store import InMemoryCollection, ASCENDING
+
+    responses_collection = InMemoryCollection('responses')
+    responses_collection.create_index([('questionnaire_id', ASCENDING)])
+    questionnaire_stats_collection = InMemoryCollection('questionnaire_stats')
+    dead_letters_collection = InMemoryCollection('response_dead_letters')
@@ -2,10 +2,23 @@ from datetime import datetime
 from bson import ObjectId
 
 class Task:
-    def __init__(self, name, source_type='google_drive', source_path='', 
-                 output_type='google_sheets', output_path='', 
-                 google_api_key='', google_credentials='', 
-                 status='pending', _id=None, created_at=None):
+    """
+    A document processing task.
+
+    Google credentials are not part of the stored task document. They live
+    in the credential store and the document only keeps `credentialsId`;
+    `google_api_key` and `google_credentials` are filled in by the worker
+    (or carry new values submitted through the API) and are never
+    serialized by `to_dict`.
+    """
+    __slots__ = ('_id', 'name', 'source_type', 'source_path', 'output_type',
+                 'output_path', 'google_api_key', 'google_credentials',
+                 'credentials_id', 'status', 'concurrency', 'created_at')
+
+    def __init__(self, name, source_type='google_drive', source_path='',
+                 output_type='google_sheets', output_path='',
+                 google_api_key='', google_credentials='', credentials_id=None,
+                 status='pending', concurrency=None, _id=None, created_at=None):
         self._id = _id or str(ObjectId())
         self.name = name
         self.source_type = source_type
@@ -14,25 +27,33 @@ class Task:
         self.output_path = output_path
         self.google_api_key = google_api_key
         self.google_credentials = google_credentials
+        self.credentials_id = credentials_id
         self.status = status
+        self.concurrency = concurrency
         self.created_at = created_at or datetime.utcnow().isoformat()
-    
+
     @classmethod
     def from_dict(cls, data):
+        get = data.get
         return cls(
-            name=data.get('name', 'New Task'),
-            source_type=data.get('sourceType', 'google_drive'),
-            source_path=data.get('sourcePath', ''),
-            output_type=data.get('outputType', 'google_sheets'),
-            output_path=data.get('outputPath', ''),
-            google_api_key=data.get('googleApiKey', ''),
-            google_credentials=data.get('googleCredentials', ''),
-            status=data.get('status', 'pending'),
-            _id=data.get('_id'),
-            created_at=data.get('createdAt')
+            name=get('name', 'New Task'),
+            source_type=get('sourceType', 'google_drive'),
+            source_path=get('sourcePath', ''),
+            output_type=get('outputType', 'google_sheets'),
+            output_path=get('outputPath', ''),
+            # Only present in API payloads and documents stored before
+            # credentials moved to the credential store
+            google_api_key=get('googleApiKey', ''),
+            google_credentials=get('googleCredentials', ''),
+            credentials_id=get('credentialsId'),
+            status=get('status', 'pending'),
+            concurrency=get('concurrency'),
+            _id=get('_id'),
+            created_at=get('createdAt')
         )
-    
+
     def to_dict(self):
+        """Stored document, without secrets; the API also leaves out credentialsId"""
         return {
             '_id': self._id,
             'name': self.name,
@@ -40,8 +61,24 @@ class Task:
             'sourcePath': self.source_path,
             'outputType': self.output_type,
             'outputPath': self.output_path,
-            'googleApiKey': self.google_api_key,
-            'googleCredentials': self.google_credentials,
+            'credentialsId': self.credentials_id,
             'status': self.status,
+            'concurrency': self.concurrency,
             'createdAt': self.created_at
-        } 
\ No newline at end of file
+        }
+
+    def to_summary(self):
+        """Compact representation for task lists"""
+        return {
+            '_id': self._id,
+            'name': self.name,
+            'status': self.status,
+            'sourceType': self.source_type,
+            'outputType': self.output_type,
+            'createdAt': self.created_at
+        }
+
+# Projection that loads just what Task.to_summary needs
+TASK_SUMMARY_PROJECTION = {
+    'name': 1, 'status': 1, 'sourceType': 1, 'outputType': 1, 'createdAt': 1
+}
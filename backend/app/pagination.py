@@ -0,0 +1,124 @@
+"""
+Keyset (cursor) pagination helpers shared by the list endpoints.
+
+Pages are ordered by a creation timestamp and then _id, both descending.
+The cursor is an opaque token holding the sort value and _id of the last
+item of the previous page; the next page is everything strictly after it.
+"""
+from datetime import datetime
+import base64
+import json
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class PaginationError(ValueError):
+    """Raised for a malformed cursor, limit or fields parameter"""
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'$date': value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {'$oid': str(value)}
+    return value
+
+
+def _decode_value(value):
+    # Only values go into the page query; anything else, such as a
+    # {"$ne": null} operator, makes the cursor invalid
+    if isinstance(value, dict):
+        if set(value) == {'$date'} and isinstance(value['$date'], str):
+            return datetime.fromisoformat(value['$date'])
+        if set(value) == {'$oid'} and isinstance(value['$oid'], str):
+            return ObjectId(value['$oid'])
+        raise ValueError(f"Unexpected cursor value: {value}")
+    if isinstance(value, list):
+        raise ValueError(f"Unexpected cursor value: {value}")
+    return value
+
+
+def encode_cursor(sort_value, _id):
+    payload = json.dumps([_encode_value(sort_value), _encode_value(_id)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        sort_value, _id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return _decode_value(sort_value), _decode_value(_id)
+    except (ValueError, TypeError, InvalidId) as e:
+        raise PaginationError(f"Invalid cursor: {token}") from e
+
+
+def parse_limit(value):
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise PaginationError(f"Invalid limit: {value}")
+    if limit < 1:
+        raise PaginationError("limit must be at least 1")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_fields(value, field_map):
+    """
+    Turn a `fields=a,b` parameter into a Mongo projection.
+
+    field_map maps the field names used in API responses to document field
+    names. Returns None when no fields were requested.
+    """
+    if not value:
+        return None
+    projection = {}
+    for field in (f.strip() for f in value.split(',')):
+        if not field:
+            continue
+        if field not in field_map:
+            raise PaginationError(f"Unknown field: {field}")
+        projection[field_map[field]] = 1
+    return projection or None
+
+
+def fetch_page(collection, sort_field, limit, cursor=None, projection=None, query=None):
+    """
+    Return (documents, next_cursor) for one page, newest first.
+
+    The sort field is always fetched so the next cursor can be built.
+    """
+    query = dict(query or {})
+    if cursor:
+        sort_value, _id = decode_cursor(cursor)
+        # The range on sort_field lets an index on it seek straight to the cursor
+        query[sort_field] = {'$lte': sort_value}
+        query['$or'] = [
+            {sort_field: {'$lt': sort_value}},
+            {sort_field: sort_value, '_id': {'$lt': _id}}
+        ]
+
+    strip_sort_field = projection is not None and sort_field not in projection
+    if strip_sort_field:
+        projection = dict(projection, **{sort_field: 1})
+
+    documents = list(
+        collection.find(query, projection)
+        .sort([(sort_field, -1), ('_id', -1)])
+        .limit(limit + 1)
+    )
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        next_cursor = encode_cursor(last.get(sort_field), last['_id'])
+    if strip_sort_field:
+        for document in documents:
+            document.pop(sort_field, None)
+    return documents, next_cursor
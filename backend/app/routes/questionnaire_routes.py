@@ -1,18 +1,30 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
 from bson import ObjectId
+from bson.errors import InvalidId
 from app.models.questionnaire import (
     Questionnaire, 
     questionnaire_collection
 )
 from app.services.questionnaire_service import QuestionnaireService
+from app.services.job_queue import QueueFullError
+from app.services.deployment_registry import DeploymentRegistry
+from app.services.response_writer import ResponseBufferFullError
+from app.services.questionnaire_stats import QuestionnaireStats
+from app.pagination import fetch_page, parse_fields, parse_limit
+from app.bulk import BulkRequestError, parse_items, response as bulk_response
 from flask_cors import CORS
-from dotenv import load_dotenv
 
 questionnaire_bp = Blueprint('questionnaire', __name__)
 
-# Load environment variables
-load_dotenv()
+# Fields that can be requested with ?fields= on the questionnaire list
+QUESTIONNAIRE_FIELDS = {
+    'id': '_id',
+    'title': 'title',
+    'questions': 'questions',
+    'created_at': 'created_at',
+    'status': 'status'
+}
 
 def use_mongodb():
     """Check if MongoDB is available"""
@@ -36,15 +48,47 @@ def create_questionnaire():
 @questionnaire_bp.route('/', methods=['GET'])
 def get_questionnaires():
     try:
-        # Fetch all questionnaires from MongoDB
-        items = [
-            Questionnaire.from_mongo(q).dict() 
-            for q in questionnaire_collection.find().sort("created_at", -1)
-        ]
-        return jsonify(items), 200
+        # Without pagination parameters the full list is returned as before
+        if not any(param in request.args for param in ('limit', 'cursor', 'fields')):
+            items = [
+                Questionnaire.from_mongo(q).dict() 
+                for q in questionnaire_collection.find().sort("created_at", -1)
+            ]
+            return jsonify(items), 200
+        
+        # Fetch one page of questionnaires, newest first
+        projection = parse_fields(request.args.get('fields'), QUESTIONNAIRE_FIELDS)
+        docs, next_cursor = fetch_page(
+            questionnaire_collection, 'created_at',
+            parse_limit(request.args.get('limit')),
+            cursor=request.args.get('cursor'),
+            projection=projection
+        )
+        if projection is None:
+            items = [Questionnaire.from_mongo(q).dict() for q in docs]
+        else:
+            # Partial documents cannot be validated as Questionnaire models
+            items = [Questionnaire.partial_from_mongo(q) for q in docs]
+        return jsonify({"items": items, "nextCursor": next_cursor}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@questionnaire_bp.route('/bulk', methods=['POST', 'PUT', 'DELETE'])
+def bulk_questionnaires():
+    # A JSON array or NDJSON stream of questionnaires (or of ids to delete)
+    try:
+        items = parse_items(request)
+    except BulkRequestError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if request.method == 'POST':
+        results = QuestionnaireService.create_questionnaires(items)
+    elif request.method == 'PUT':
+        results = QuestionnaireService.update_questionnaires(items)
+    else:
+        results = QuestionnaireService.delete_questionnaires(items)
+    return jsonify(bulk_response(results)), 200
+
 @questionnaire_bp.route('/<questionnaire_id>', methods=['GET'])
 def get_questionnaire(questionnaire_id):
     try:
@@ -63,13 +107,15 @@ def update_questionnaire(questionnaire_id):
         data['id'] = questionnaire_id
         questionnaire = Questionnaire(**data)
         
-        # Update in MongoDB
-        result = questionnaire_collection.replace_one(
+        # Update in MongoDB, keeping fields the form does not own (deployment)
+        document = questionnaire.to_mongo()
+        document.pop("_id")
+        result = questionnaire_collection.update_one(
             {"_id": ObjectId(questionnaire_id)},
-            questionnaire.to_mongo()
+            {"$set": document}
         )
         
-        if result.modified_count:
+        if result.matched_count:
             return jsonify(questionnaire.dict()), 200
         return jsonify({"error": "Questionnaire not found"}), 404
     except Exception as e:
@@ -81,6 +127,7 @@ def delete_questionnaire(questionnaire_id):
         # Delete from MongoDB
         result = questionnaire_collection.delete_one({"_id": ObjectId(questionnaire_id)})
         if result.deleted_count:
+            DeploymentRegistry.delete(questionnaire_id)
             return jsonify({"message": "Questionnaire deleted successfully"}), 200
         return jsonify({"error": "Questionnaire not found"}), 404
     except Exception as e:
@@ -110,18 +157,61 @@ def start_questionnaire(questionnaire_id):
     if request.method == 'OPTIONS':
         return '', 204
     
-    result = QuestionnaireService.start_questionnaire(questionnaire_id)
-    if not result:
+    try:
+        deployment = QuestionnaireService.start_questionnaire(questionnaire_id)
+    except InvalidId as e:
+        return jsonify({'error': str(e)}), 400
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+    if not deployment:
         return jsonify({'error': 'Questionnaire not found'}), 404
-    return jsonify(result)
+    # Deployment runs in the background; poll the deployment endpoint for its status
+    return jsonify({
+        'questionnaire_id': questionnaire_id,
+        'job_id': deployment['job_id'],
+        'status': deployment['status'],
+        'status_url': f"/api/questionnaires/{questionnaire_id}/deployment"
+    }), 202
+
+@questionnaire_bp.route('/<questionnaire_id>/deployment', methods=['GET'])
+def get_deployment(questionnaire_id):
+    try:
+        deployment = QuestionnaireService.get_deployment(questionnaire_id)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    if deployment is None:
+        return jsonify({'error': 'Questionnaire not found'}), 404
+    return jsonify(deployment), 200
+
+@questionnaire_bp.route('/<questionnaire_id>/stats', methods=['GET'])
+def get_stats(questionnaire_id):
+    try:
+        exists = questionnaire_collection.find_one({"_id": ObjectId(questionnaire_id)}, {"_id": 1})
+    except InvalidId as e:
+        return jsonify({"error": str(e)}), 400
+    if not exists:
+        return jsonify({"error": "Questionnaire not found"}), 404
+    # Precomputed counters, updated as responses are stored
+    return jsonify(QuestionnaireStats.get(questionnaire_id)), 200
 
 @questionnaire_bp.route('/<questionnaire_id>/submit', methods=['POST', 'OPTIONS'])
 def submit_questionnaire(questionnaire_id):
     if request.method == 'OPTIONS':
         return '', 204
     
-    answers = request.json.get('answers', {})
-    result = QuestionnaireService.submit_questionnaire(questionnaire_id, answers)
+    data = request.get_json() or {}
+    answers = data.get('answers', {})
+    if not isinstance(answers, (dict, list)):
+        return jsonify({'error': 'answers must be an object or a list'}), 400
+    # Retried webhooks send the same key and are only stored once
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    if idempotency_key is not None and not isinstance(idempotency_key, str):
+        return jsonify({'error': 'idempotency_key must be a string'}), 400
+    
+    try:
+        result = QuestionnaireService.submit_questionnaire(questionnaire_id, answers, idempotency_key)
+    except ResponseBufferFullError as e:
+        return jsonify({'error': str(e)}), 503
     if not result:
         return jsonify({'error': 'Questionnaire not found'}), 404
-    return jsonify(result) 
+    return jsonify(result), 202 
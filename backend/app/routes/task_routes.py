@@ -1,12 +1,45 @@
-from flask import Blueprint, request, jsonify
-from app.services.task_service import TaskService
+from flask import Blueprint, Response, request, jsonify
+import json
+import time
+from app.services.task_service import TaskService, SSE_ENABLED
+from app.services.job_queue import QueueFullError
+from app.pagination import PaginationError, parse_limit
+from app.bulk import BulkRequestError, parse_items, response as bulk_response
 
 task_bp = Blueprint('tasks', __name__)
 
 @task_bp.route('', methods=['GET'])
 def get_all_tasks():
-    tasks = TaskService.get_all_tasks()
-    return jsonify(tasks)
+    # Without pagination parameters the full list is returned as before
+    if not any(param in request.args for param in ('limit', 'cursor', 'fields')):
+        tasks = TaskService.get_all_tasks()
+        return jsonify(tasks)
+    
+    try:
+        tasks, next_cursor = TaskService.get_tasks_page(
+            parse_limit(request.args.get('limit')),
+            cursor=request.args.get('cursor'),
+            fields=request.args.get('fields')
+        )
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'items': tasks, 'nextCursor': next_cursor})
+
+@task_bp.route('/bulk', methods=['POST', 'PUT', 'DELETE'])
+def bulk_tasks():
+    # A JSON array or NDJSON stream of tasks (or of task ids to delete)
+    try:
+        items = parse_items(request)
+    except BulkRequestError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if request.method == 'POST':
+        results = TaskService.create_tasks(items)
+    elif request.method == 'PUT':
+        results = TaskService.update_tasks(items)
+    else:
+        results = TaskService.delete_tasks(items)
+    return jsonify(bulk_response(results))
 
 @task_bp.route('/<task_id>', methods=['GET'])
 def get_task(task_id):
@@ -37,9 +70,41 @@ def delete_task(task_id):
         return jsonify({'error': 'Task not found'}), 404
     return jsonify({'message': 'Task deleted successfully'})
 
+@task_bp.route('/<task_id>/events', methods=['GET'])
+def task_events(task_id):
+    if not SSE_ENABLED:
+        return jsonify({'error': 'Event streams are disabled on this server; '
+                                 f"poll /api/tasks/{task_id} instead"}), 503
+    if not TaskService.get_task_by_id(task_id):
+        return jsonify({'error': 'Task not found'}), 404
+    
+    def stream():
+        # Ask EventSource to wait a moment before reconnecting after a timeout
+        yield 'retry: 2000\n\n'
+        last_sent = time.monotonic()
+        for event in TaskService.watch_task(task_id):
+            if event is None:
+                if time.monotonic() - last_sent >= 15:
+                    # Comment line that keeps proxies from closing an idle stream
+                    yield ': keepalive\n\n'
+                    last_sent = time.monotonic()
+                continue
+            seq = (event['progress'] or {}).get('seq', 0)
+            yield f"id: {seq}\nevent: progress\ndata: {json.dumps(event)}\n\n"
+            last_sent = time.monotonic()
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @task_bp.route('/<task_id>/start', methods=['POST'])
 def start_task(task_id):
-    success = TaskService.start_task(task_id)
+    try:
+        full_rescan = request.args.get('full', '').lower() in ('1', 'true')
+        success = TaskService.start_task(task_id, full_rescan=full_rescan)
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
     if not success:
         return jsonify({'error': 'Task not found'}), 404
-    return jsonify({'message': 'Task started successfully'}) 
\ No newline at end of file
+    return jsonify({'message': 'Task queued successfully'}), 202 
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+Brainbase Labs client used to deploy questionnaire flows.
+
+Services get the client from `get_brainbase_client()`. Tests and local
+development can inject another client with `set_brainbase_client()`, or set
+BRAINBASE_FAKE=true to use the in-process FakeBrainbaseClient, which
+records calls and returns made-up ids without touching the network.
+"""
+from types import SimpleNamespace
+import itertools
+import random
+import threading
+import time
+import os
+
+BRAINBASE_FAKE = os.environ.get('BRAINBASE_FAKE', 'false').lower() == 'true'
+
+_client = None
+_client_injected = False
+_client_lock = threading.Lock()
+
+
+def set_brainbase_client(client):
+    """Use `client` for all deployments (None restores the default)"""
+    global _client, _client_injected
+    _client = client
+    _client_injected = client is not None
+
+
+def get_brainbase_client():
+    """The process-wide client, created on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if BRAINBASE_FAKE:
+                    _client = FakeBrainbaseClient()
+                else:
+                    from brainbase_labs import BrainbaseLabs
+                    _client = BrainbaseLabs(api_key=os.getenv("BRAINBASE_LABS_API_KEY"))
+    return _client
+
+
+def _reset_after_fork():
+    # Do not share the parent's HTTP connections with a forked child
+    global _client, _client_lock
+    if not _client_injected:
+        _client = None
+    _client_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class _FakeResource:
+    def __init__(self, client, kind, fields):
+        self._client = client
+        self._kind = kind
+        self._fields = fields
+
+    def create(self, **kwargs):
+        return self._client._record(self._kind, self._fields, kwargs)
+
+    def update(self, deployment_id, **kwargs):
+        kwargs = dict(kwargs, deployment_id=deployment_id)
+        return self._client._record(self._kind, self._fields, kwargs, 'update')
+
+
+class FakeBrainbaseClient:
+    """
+    Stand-in for BrainbaseLabs with the calls the deployment makes:
+    create (and update) on workers, workers.flows and
+    workers.deployments.voice.
+
+    `latency` delays every call and `fail_on` names a call kind
+    ('worker', 'flow' or 'voice_deployment') that raises instead. With
+    `error_rate`, any call fails with that probability.
+    """
+    def __init__(self, latency=0, fail_on=None, error_rate=0):
+        self.latency = latency
+        self.fail_on = fail_on
+        self.error_rate = error_rate
+        self.calls = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+        self.workers = _FakeResource(self, 'worker', ('name',))
+        self.workers.flows = _FakeResource(self, 'flow', ('worker_id', 'name', 'label'))
+        self.workers.deployments = SimpleNamespace(
+            voice=_FakeResource(self, 'voice_deployment', ('worker_id', 'flow_id', 'phone_number'))
+        )
+
+    def _record(self, kind, fields, kwargs, action='create'):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls.append((kind, action, kwargs))
+            object_id = kwargs.get('deployment_id') if action == 'update' else None
+            object_id = object_id or f"fake-{kind}-{next(self._ids)}"
+        if kind == self.fail_on or (self.error_rate and random.random() < self.error_rate):
+            raise RuntimeError(f"Fake Brainbase failure on {kind}")
+        return SimpleNamespace(id=object_id, **{f: kwargs.get(f) for f in fields})
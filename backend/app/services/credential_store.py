@@ -0,0 +1,76 @@
+from app.config import credentials_collection
+from bson import ObjectId
+from pymongo import ReplaceOne
+from datetime import datetime
+
+
+class CredentialStore:
+    """
+    Google credentials for tasks, kept out of the task documents.
+
+    Tasks reference an entry by `credentialsId`. Only the task worker loads
+    the secrets, right before it processes a task.
+    """
+    @staticmethod
+    def save(google_credentials, google_api_key='', credentials_id=None):
+        credentials_id = credentials_id or str(ObjectId())
+        credentials_collection.replace_one(
+            {'_id': credentials_id},
+            {
+                '_id': credentials_id,
+                'googleCredentials': google_credentials,
+                'googleApiKey': google_api_key,
+                'updatedAt': datetime.utcnow().isoformat()
+            },
+            upsert=True
+        )
+        return credentials_id
+
+    @staticmethod
+    def save_many(entries):
+        """
+        Save (google_credentials, google_api_key, credentials_id) entries in
+        one bulk write; returns their credential ids.
+        """
+        now = datetime.utcnow().isoformat()
+        ids = [credentials_id or str(ObjectId()) for _, _, credentials_id in entries]
+        if entries:
+            credentials_collection.bulk_write([
+                ReplaceOne(
+                    {'_id': credentials_id},
+                    {'_id': credentials_id, 'googleCredentials': google_credentials,
+                     'googleApiKey': google_api_key, 'updatedAt': now},
+                    upsert=True
+                )
+                for credentials_id, (google_credentials, google_api_key, _) in zip(ids, entries)
+            ], ordered=False)
+        return ids
+
+    @staticmethod
+    def load(credentials_id):
+        if not credentials_id:
+            return None
+        return credentials_collection.find_one({'_id': credentials_id})
+
+    @staticmethod
+    def delete(credentials_id):
+        if credentials_id:
+            credentials_collection.delete_one({'_id': credentials_id})
+
+    @staticmethod
+    def delete_many(credentials_ids):
+        credentials_ids = [c for c in credentials_ids if c]
+        if credentials_ids:
+            credentials_collection.delete_many({'_id': {'$in': credentials_ids}})
+
+    @staticmethod
+    def attach(task):
+        """Fill in the secrets of a Task object from the store"""
+        if task.google_credentials:
+            # Legacy task document that still carries its credentials inline
+            return task
+        credentials = CredentialStore.load(task.credentials_id)
+        if credentials:
+            task.google_credentials = credentials.get('googleCredentials', '')
+            task.google_api_key = credentials.get('googleApiKey', '')
+        return task
@@ -0,0 +1,46 @@
+from app.db import LazyCollection
+from app.models.questionnaire import DB_NAME
+from datetime import datetime
+import hashlib
+
+# One entry per questionnaire, next to the questionnaires themselves
+flow_deployments_collection = LazyCollection('flow_deployments', DB_NAME)
+
+
+def flow_code_hash(code):
+    return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+
+class DeploymentRegistry:
+    """
+    What is deployed on Brainbase for each questionnaire.
+
+    Entries are keyed by questionnaire id and hold the Brainbase worker,
+    flow and voice deployment ids, the hash of the deployed flow code and
+    its version number, so a redeploy can reuse what already exists.
+    """
+    @staticmethod
+    def get(questionnaire_id):
+        return flow_deployments_collection.find_one({'_id': questionnaire_id})
+
+    @staticmethod
+    def save(questionnaire_id, entry):
+        entry = dict(entry, _id=questionnaire_id, updated_at=datetime.utcnow())
+        flow_deployments_collection.replace_one({'_id': questionnaire_id}, entry, upsert=True)
+        return entry
+
+    @staticmethod
+    def delete(questionnaire_id):
+        flow_deployments_collection.delete_one({'_id': questionnaire_id})
+
+    @staticmethod
+    def delete_many(questionnaire_ids):
+        flow_deployments_collection.delete_many({'_id': {'$in': list(questionnaire_ids)}})
+
+    @staticmethod
+    def referenced_files():
+        return {
+            entry['file_path']
+            for entry in flow_deployments_collection.find({}, {'file_path': 1})
+            if entry.get('file_path')
+        }
@@ -0,0 +1,68 @@
+"""
+Chunked Drive downloads into memory-bounded buffers.
+
+Files are fetched with ranged `get_media` requests into a
+SpooledTemporaryFile, so small documents never touch the disk and large
+ones spill to a temp file that is removed as soon as the buffer is closed.
+"""
+from contextlib import contextmanager
+import os
+import tempfile
+
+from app import lazy
+
+errors = lazy.module('googleapiclient.errors')
+media = lazy.module('googleapiclient.http')
+
+# Bytes requested per ranged GET
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get('DRIVE_DOWNLOAD_CHUNK_SIZE', str(4 * 1024 * 1024)))
+# Buffers larger than this spill from memory to a temporary file
+DOWNLOAD_SPOOL_MAX_SIZE = int(os.environ.get('DRIVE_DOWNLOAD_SPOOL_MAX_SIZE', str(16 * 1024 * 1024)))
+# How many times a download resumes from its last completed chunk after an error
+DOWNLOAD_MAX_RESUMES = int(os.environ.get('DRIVE_DOWNLOAD_MAX_RESUMES', '3'))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def download_to_buffer(drive_service, file_id, chunk_size=DOWNLOAD_CHUNK_SIZE,
+                       spool_max_size=DOWNLOAD_SPOOL_MAX_SIZE, max_resumes=DOWNLOAD_MAX_RESUMES):
+    """
+    Download a Drive file chunk by chunk and return a buffer rewound to the start.
+
+    If a chunk fails, the download resumes from the last completed byte
+    range instead of starting over. The caller owns the returned buffer and
+    must close it.
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=spool_max_size)
+    try:
+        request = drive_service.files().get_media(fileId=file_id)
+        downloader = media.MediaIoBaseDownload(buffer, request, chunksize=chunk_size)
+        resumes = 0
+        done = False
+        while not done:
+            try:
+                # num_retries covers transient failures within a single chunk
+                _, done = downloader.next_chunk(num_retries=2)
+            except (errors.HttpError, OSError) as e:
+                status = getattr(getattr(e, 'resp', None), 'status', None)
+                if resumes >= max_resumes or (status is not None and status not in RETRYABLE_STATUS):
+                    raise
+                resumes += 1
+                # The downloader keeps its byte offset, so the next call
+                # requests the range after the last chunk that was written
+                buffer.seek(0, os.SEEK_END)
+        buffer.seek(0)
+        return buffer
+    except BaseException:
+        buffer.close()
+        raise
+
+
+@contextmanager
+def open_download(drive_service, file_id, **kwargs):
+    """Context manager around download_to_buffer that always releases the buffer"""
+    buffer = download_to_buffer(drive_service, file_id, **kwargs)
+    try:
+        yield buffer
+    finally:
+        buffer.close()
@@ -0,0 +1,92 @@
+"""
+Paginated and incremental listing of the PDFs in a Drive folder.
+
+Both listings are generators, so callers can start processing the first
+page while later pages are still being fetched. Incremental runs use the
+Drive changes feed from a saved startPageToken and only yield files that
+were added or modified since then, plus the files that failed in the
+previous run, fetched by id.
+"""
+from app import lazy
+from app.metrics import PIPELINE_STAGE_SECONDS, timed
+import os
+
+errors = lazy.module('googleapiclient.errors')
+
+DRIVE_PAGE_SIZE = int(os.environ.get('DRIVE_PAGE_SIZE', '100'))
+
+PDF_MIME_TYPE = 'application/pdf'
+FILE_FIELDS = "id, name, mimeType, parents, trashed, md5Checksum, modifiedTime"
+
+
+def iter_folder_files(drive_service, folder_id, page_size=DRIVE_PAGE_SIZE):
+    """Yield every PDF in the folder, following nextPageToken"""
+    page_token = None
+    while True:
+        request = drive_service.files().list(
+            q=f"'{folder_id}' in parents and mimeType contains '{PDF_MIME_TYPE}' and trashed = false",
+            fields=f"nextPageToken, files({FILE_FIELDS})",
+            pageSize=page_size,
+            pageToken=page_token,
+            orderBy='createdTime'
+        )
+        with timed(PIPELINE_STAGE_SECONDS, stage='list'):
+            response = request.execute()
+
+        yield from response.get('files', [])
+
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return
+
+
+def _is_folder_pdf(file, folder_id):
+    return (not file.get('trashed') and folder_id in file.get('parents', [])
+            and PDF_MIME_TYPE in file.get('mimeType', ''))
+
+
+def get_start_page_token(drive_service):
+    """Cursor for the current head of the changes feed"""
+    return drive_service.changes().getStartPageToken().execute()['startPageToken']
+
+
+def iter_changed_files(drive_service, folder_id, start_page_token, page_size=DRIVE_PAGE_SIZE):
+    """Yield PDFs in the folder that were added or modified after start_page_token"""
+    page_token = start_page_token
+    seen = set()
+    while page_token:
+        request = drive_service.changes().list(
+            pageToken=page_token,
+            fields=f"nextPageToken, newStartPageToken, changes(removed, fileId, file({FILE_FIELDS}))",
+            pageSize=page_size,
+            includeRemoved=False,
+            restrictToMyDrive=False
+        )
+        with timed(PIPELINE_STAGE_SECONDS, stage='list'):
+            response = request.execute()
+
+        for change in response.get('changes', []):
+            file = change.get('file')
+            if change.get('removed') or not file or not _is_folder_pdf(file, folder_id):
+                continue
+            if file['id'] in seen:
+                continue
+            seen.add(file['id'])
+            yield file
+
+        page_token = response.get('nextPageToken')
+
+
+def iter_files_by_id(drive_service, folder_id, file_ids):
+    """Yield the files with these ids that are still PDFs in the folder"""
+    for file_id in file_ids:
+        request = drive_service.files().get(fileId=file_id, fields=FILE_FIELDS)
+        try:
+            with timed(PIPELINE_STAGE_SECONDS, stage='list'):
+                file = request.execute()
+        except errors.HttpError as e:
+            if e.resp.status == 404:
+                continue
+            raise
+        if _is_folder_pdf(file, folder_id):
+            yield file
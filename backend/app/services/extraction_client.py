@@ -0,0 +1,221 @@
+"""
+Batched, rate-limited client for the external document-extraction API.
+
+Calls from the task worker threads are funnelled into an asyncio loop
+running on a background thread. Documents that arrive within
+EXTRACTION_BATCH_WAIT seconds of each other are sent as one batch request
+(up to EXTRACTION_BATCH_SIZE documents), requests are paced by a token
+bucket (EXTRACTION_QPS) and at most EXTRACTION_MAX_IN_FLIGHT requests are
+outstanding at once. 429 and 5xx responses are retried with jittered
+exponential backoff.
+
+The API is expected to accept
+    POST {EXTRACTION_API_URL}  {"documents": [{"id": ..., "content": <base64>}]}
+and answer
+    {"results": [{"id": ..., "text": ..., "fields": {...}}]}
+"""
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import base64
+import os
+import random
+import threading
+import time
+
+from app import lazy
+
+requests = lazy.module('requests')
+
+EXTRACTION_API_URL = os.environ.get('EXTRACTION_API_URL', '')
+EXTRACTION_API_KEY = os.environ.get('EXTRACTION_API_KEY', '')
+EXTRACTION_BATCH_SIZE = int(os.environ.get('EXTRACTION_BATCH_SIZE', '8'))
+EXTRACTION_BATCH_WAIT = float(os.environ.get('EXTRACTION_BATCH_WAIT', '0.05'))
+EXTRACTION_QPS = float(os.environ.get('EXTRACTION_QPS', '5'))
+EXTRACTION_MAX_IN_FLIGHT = int(os.environ.get('EXTRACTION_MAX_IN_FLIGHT', '4'))
+EXTRACTION_MAX_RETRIES = int(os.environ.get('EXTRACTION_MAX_RETRIES', '5'))
+EXTRACTION_TIMEOUT = float(os.environ.get('EXTRACTION_TIMEOUT', '120'))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class ExtractionError(Exception):
+    """Raised when the extraction API rejects a batch or retries are exhausted"""
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ExtractionClient:
+    def __init__(self, url=EXTRACTION_API_URL, api_key=EXTRACTION_API_KEY,
+                 batch_size=EXTRACTION_BATCH_SIZE, batch_wait=EXTRACTION_BATCH_WAIT,
+                 qps=EXTRACTION_QPS, max_in_flight=EXTRACTION_MAX_IN_FLIGHT,
+                 max_retries=EXTRACTION_MAX_RETRIES, timeout=EXTRACTION_TIMEOUT):
+        self.url = url
+        self.api_key = api_key
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.qps = qps
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._pid = None
+        self._loop = None
+        self._start_lock = threading.Lock()
+
+    def extract(self, content):
+        """Blocking call used by the worker threads; returns {'text', 'fields'}"""
+        self._ensure_started()
+        future = asyncio.run_coroutine_threadsafe(self._submit(content), self._loop)
+        return future.result()
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+    def _ensure_started(self):
+        # The loop thread does not survive a fork, so start a new one per process
+        if self._loop is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._loop is not None and self._pid == os.getpid():
+                return
+            ready = threading.Event()
+            thread = threading.Thread(target=self._run_loop, args=(ready,),
+                                      name="extraction-client", daemon=True)
+            thread.start()
+            ready.wait()
+            self._pid = os.getpid()
+
+    def _run_loop(self, ready):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.max_in_flight,
+                                                     thread_name_prefix="extraction-http"))
+        self._queue = asyncio.Queue()
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._bucket = TokenBucket(self.qps)
+        self._session = requests.Session()
+        self._loop = loop
+        loop.create_task(self._batcher())
+        ready.set()
+        loop.run_forever()
+
+        # Stopped by close(): cancel the batcher and pending requests, whose
+        # callers get a CancelledError, then release the loop
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+
+    async def _submit(self, content):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((content, future))
+        return await future
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            loop.create_task(self._send_batch(batch))
+
+    async def _send_batch(self, batch):
+        futures = [future for _, future in batch]
+        try:
+            async with self._in_flight:
+                payload = {'documents': [
+                    {'id': str(i), 'content': base64.b64encode(content or b'').decode('ascii')}
+                    for i, (content, _) in enumerate(batch)
+                ]}
+                response = await self._post_with_retry(payload)
+
+            results = {r.get('id'): r for r in response.get('results', [])}
+            for i, future in enumerate(futures):
+                result = results.get(str(i))
+                if future.done():
+                    continue
+                if result is None or 'error' in result:
+                    error = result.get('error') if result else 'missing from batch response'
+                    future.set_exception(ExtractionError(error))
+                else:
+                    future.set_result({'text': result.get('text', ''),
+                                       'fields': result.get('fields', {})})
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _post_with_retry(self, payload):
+        loop = asyncio.get_running_loop()
+        headers = {'Authorization': f"Bearer {self.api_key}"} if self.api_key else {}
+        for attempt in range(self.max_retries + 1):
+            await self._bucket.acquire()
+            try:
+                response = await loop.run_in_executor(None, lambda: self._session.post(
+                    self.url, json=payload, headers=headers, timeout=self.timeout
+                ))
+            except requests.RequestException as e:
+                if attempt == self.max_retries:
+                    raise ExtractionError(f"Extraction request failed: {e}") from e
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code in RETRYABLE_STATUS and attempt < self.max_retries:
+                retry_after = response.headers.get('Retry-After')
+                delay = float(retry_after) if retry_after and retry_after.isdigit() \
+                    else self._backoff(attempt)
+                await asyncio.sleep(delay)
+                continue
+            if response.status_code >= 400:
+                raise ExtractionError(
+                    f"Extraction API returned {response.status_code}: {response.text[:200]}"
+                )
+            return response.json()
+
+    @staticmethod
+    def _backoff(attempt, base=0.5, cap=30.0):
+        # Full jitter keeps retrying workers from synchronising
+        return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_extraction_client():
+    """Shared client, or None when no EXTRACTION_API_URL is configured"""
+    global _client
+    if not EXTRACTION_API_URL:
+        return None
+    with _client_lock:
+        if _client is None:
+            _client = ExtractionClient()
+        return _client
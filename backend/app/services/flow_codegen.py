@@ -0,0 +1,151 @@
+"""
+Brainbase flow (.based) code generation for questionnaires.
+
+Every question type has a template that is compiled once at import and
+filled in per question. Text from the questionnaire only ever ends up in
+the program as an escaped string literal. Generated programs are memoized
+by a hash of the questionnaire content, so deploying many copies or
+variants of a questionnaire renders each distinct one once.
+"""
+from collections import OrderedDict
+from string import Template
+import hashlib
+import json
+import os
+import threading
+
+FLOW_CODEGEN_CACHE_SIZE = int(os.environ.get('FLOW_CODEGEN_CACHE_SIZE', '256'))
+
+HEADER = Template('state = {}\nmeta_prompt = $title\n\n')
+
+FOOTER = 'talk("Thank you for completing the questionnaire. Your responses have been recorded.")'
+
+QUESTION_TEMPLATES = {
+    'rating': Template(
+        'loop:\n'
+        '    ${qid}_response = talk($text, True)\n'
+        'until "User has provided a rating between 1 to 5":\n'
+        '    ${qid}_answer = ${qid}_response.ask(\n'
+        '        question="Based on the user\'s response, what rating did they give from 1 to 5?",\n'
+        '        example={"rating": 4}\n'
+        '    )\n'
+        'state["$qid"] = ${qid}_answer["rating"]\n\n'
+    ),
+    'text': Template(
+        'loop:\n'
+        '    ${qid}_response = talk($text, True)\n'
+        'until "User has provided an answer":\n'
+        '    ${qid}_answer = ${qid}_response.ask(\n'
+        '        question="What is the user\'s response ?",\n'
+        '        example={"message": "User response"}\n'
+        '    )\n'
+        'state["$qid"] = ${qid}_answer["message"]\n\n'
+    ),
+    'multiple_choice': Template(
+        'loop:\n'
+        '    ${qid}_response = talk($text, True)\n'
+        'until $until:\n'
+        '    ${qid}_answer = ${qid}_response.ask(\n'
+        '        question=$ask,\n'
+        '        example={"choice": $example}\n'
+        '    )\n'
+        'state["$qid"] = ${qid}_answer["choice"]\n\n'
+    ),
+}
+
+# Other names the question types go by; unknown types are asked as text
+TYPE_ALIASES = {
+    'open_ended': 'text',
+    'multiple-choice': 'multiple_choice',
+    'choice': 'multiple_choice',
+}
+
+
+def string_literal(text):
+    """A double-quoted literal for `text`, escaping quotes, backslashes and control characters"""
+    return json.dumps(str(text), ensure_ascii=False)
+
+
+def fstring_literal(text):
+    """An f-string literal that evaluates to `text`"""
+    return 'f' + string_literal(str(text).replace('{', '{{').replace('}', '}}'))
+
+
+def _question_fields(question, index):
+    question_type = question.get('type', 'text')
+    question_type = TYPE_ALIASES.get(question_type, question_type)
+    text = question.get('text') or f'Question {index}'
+    options = [str(o) for o in (question.get('options') or []) if str(o).strip()]
+
+    fields = {'qid': f'q{index}', 'text': string_literal(text)}
+    if question_type == 'multiple_choice' and options:
+        choices = ', '.join(options)
+        fields.update(
+            text=string_literal(f'{text} The options are: {choices}.'),
+            until=string_literal(f'User has chosen one of: {choices}'),
+            ask=string_literal(f'Which of these options did the user choose: {choices}?'),
+            example=string_literal(options[0])
+        )
+        return 'multiple_choice', fields
+    if question_type not in QUESTION_TEMPLATES or question_type == 'multiple_choice':
+        # Multiple choice without options can only be answered freely
+        question_type = 'text'
+    return question_type, fields
+
+
+def content_hash(questionnaire):
+    """Hash of everything the generated program depends on"""
+    content = {
+        'title': questionnaire.get('title', ''),
+        'questions': [
+            {'text': q.get('text'), 'type': q.get('type', 'text'), 'options': q.get('options') or []}
+            for q in questionnaire.get('questions', [])
+        ]
+    }
+    encoded = json.dumps(content, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def render(questionnaire):
+    """Generate the flow program, bypassing the cache"""
+    parts = [HEADER.substitute(title=fstring_literal(questionnaire.get('title', '')))]
+    for i, question in enumerate(questionnaire.get('questions', []), start=1):
+        question_type, fields = _question_fields(question, i)
+        parts.append(QUESTION_TEMPLATES[question_type].substitute(fields))
+    parts.append(FOOTER)
+    return ''.join(parts)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def generate(questionnaire):
+    """Generate the flow program for a questionnaire dict, memoized by content"""
+    return _generate(questionnaire, content_hash(questionnaire))
+
+
+def _generate(questionnaire, key):
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    code = render(questionnaire)
+    with _cache_lock:
+        _cache[key] = code
+        while len(_cache) > FLOW_CODEGEN_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return code
+
+
+def generate_many(questionnaires):
+    """Generate the programs for many questionnaires, in order; duplicates are rendered once"""
+    by_hash = {}
+    codes = []
+    for questionnaire in questionnaires:
+        key = content_hash(questionnaire)
+        if key not in by_hash:
+            by_hash[key] = _generate(questionnaire, key)
+        codes.append(by_hash[key])
+    return codes
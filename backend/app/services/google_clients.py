@@ -0,0 +1,158 @@
+"""
+Process-wide pool of authorized Google API clients.
+
+Building a client (`build('drive', ...)`) parses a discovery document and
+minting a service account token costs a round trip, so both are cached here
+instead of being redone for every file. Credentials are shared per
+(credential fingerprint, scopes) and refreshed shortly before they expire.
+Built clients hold an httplib2 connection that is not thread-safe, so they
+are checked out to one thread at a time and returned to an idle pool.
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import hashlib
+import json
+import os
+import threading
+import time
+
+from app import lazy
+
+# Imported when the first client is built
+discovery = lazy.module('googleapiclient.discovery')
+service_account = lazy.module('google.oauth2.service_account')
+google_auth_requests = lazy.module('google.auth.transport.requests')
+google_auth_httplib2 = lazy.module('google_auth_httplib2')
+httplib2 = lazy.module('httplib2')
+requests = lazy.module('requests')
+
+GOOGLE_APIS_AVAILABLE = lazy.available(
+    'googleapiclient', 'google.oauth2', 'google_auth_httplib2', 'httplib2', 'requests'
+)
+
+DRIVE_SCOPES = ('https://www.googleapis.com/auth/drive.readonly',)
+SHEETS_SCOPES = ('https://www.googleapis.com/auth/spreadsheets',)
+
+# Drop clients and credentials that have not been used for this many seconds
+CLIENT_IDLE_TTL = float(os.environ.get('GOOGLE_CLIENT_IDLE_TTL', '900'))
+# Refresh access tokens this many seconds before they expire
+TOKEN_REFRESH_MARGIN = float(os.environ.get('GOOGLE_TOKEN_REFRESH_MARGIN', '300'))
+
+
+class _CredentialsEntry:
+    __slots__ = ('credentials', 'lock', 'last_used')
+
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class GoogleClientCache:
+    def __init__(self, idle_ttl=CLIENT_IDLE_TTL, refresh_margin=TOKEN_REFRESH_MARGIN):
+        self.idle_ttl = idle_ttl
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self._credentials = {}
+        self._idle_clients = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self._refresh_session = None
+
+    @staticmethod
+    def fingerprint(credentials_json=None, credentials_file=None):
+        """Stable key for a credential source that never holds the secret itself"""
+        if credentials_json is not None:
+            material = credentials_json if isinstance(credentials_json, str) \
+                else json.dumps(credentials_json, sort_keys=True)
+        else:
+            material = f"{os.path.abspath(credentials_file)}:{os.path.getmtime(credentials_file)}"
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    @contextmanager
+    def client(self, api, version, scopes, credentials_json=None, credentials_file=None):
+        """
+        Check out an authorized client for the duration of the `with` block.
+        """
+        scopes = tuple(sorted(scopes))
+        credentials_key = (self.fingerprint(credentials_json, credentials_file), scopes)
+        entry = self._get_credentials(credentials_key, credentials_json, credentials_file)
+        self._ensure_fresh(entry)
+
+        client_key = credentials_key + (api, version)
+        with self._lock:
+            idle = self._idle_clients.get(client_key)
+            service = idle.pop()[0] if idle else None
+
+        if service is None:
+            authorized_http = google_auth_httplib2.AuthorizedHttp(
+                entry.credentials, http=httplib2.Http()
+            )
+            service = discovery.build(api, version, http=authorized_http, cache_discovery=False)
+
+        try:
+            yield service
+        finally:
+            with self._lock:
+                self._idle_clients.setdefault(client_key, []).append(
+                    (service, time.monotonic())
+                )
+            self._sweep()
+
+    def clear(self):
+        with self._lock:
+            self._credentials.clear()
+            self._idle_clients.clear()
+
+    def _get_credentials(self, key, credentials_json, credentials_file):
+        with self._lock:
+            entry = self._credentials.get(key)
+            if entry is None:
+                scopes = list(key[1])
+                if credentials_json is not None:
+                    info = json.loads(credentials_json) if isinstance(credentials_json, str) \
+                        else credentials_json
+                    credentials = service_account.Credentials.from_service_account_info(
+                        info, scopes=scopes
+                    )
+                else:
+                    credentials = service_account.Credentials.from_service_account_file(
+                        credentials_file, scopes=scopes
+                    )
+                entry = self._credentials[key] = _CredentialsEntry(credentials)
+            entry.last_used = time.monotonic()
+            return entry
+
+    def _ensure_fresh(self, entry):
+        credentials = entry.credentials
+        if credentials.valid and credentials.expiry and \
+                credentials.expiry - datetime.utcnow() > self.refresh_margin:
+            return
+        with entry.lock:
+            # Another thread may have refreshed while we waited for the lock
+            if credentials.valid and credentials.expiry and \
+                    credentials.expiry - datetime.utcnow() > self.refresh_margin:
+                return
+            if self._refresh_session is None:
+                self._refresh_session = requests.Session()
+            credentials.refresh(google_auth_requests.Request(self._refresh_session))
+
+    def _sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < min(60.0, self.idle_ttl):
+            return
+        with self._lock:
+            self._last_sweep = now
+            for key in list(self._idle_clients):
+                fresh = [(s, t) for s, t in self._idle_clients[key] if now - t < self.idle_ttl]
+                if fresh:
+                    self._idle_clients[key] = fresh
+                else:
+                    del self._idle_clients[key]
+            for key in list(self._credentials):
+                if now - self._credentials[key].last_used >= self.idle_ttl:
+                    del self._credentials[key]
+                    for client_key in [k for k in self._idle_clients if k[:2] == key]:
+                        del self._idle_clients[client_key]
+
+
+client_cache = GoogleClientCache()
@@ -0,0 +1,173 @@
+from app.config import (
+    tasks_collection,
+    WORKER_CONCURRENCY,
+    WORKER_POLL_INTERVAL,
+    WORKER_HEARTBEAT_TIMEOUT,
+    QUEUE_MAX_DEPTH
+)
+from datetime import datetime, timedelta
+import socket
+import threading
+import time
+import os
+
+try:
+    from pymongo import ReturnDocument
+    RETURN_AFTER = ReturnDocument.AFTER
+except ImportError:
+    RETURN_AFTER = True
+
+
+class QueueFullError(Exception):
+    """Raised when the task queue has reached QUEUE_MAX_DEPTH"""
+
+
+class JobQueue:
+    """
+    Task queue persisted in tasks_collection.
+
+    A task is queued by setting its status to 'queued'. Workers claim the
+    oldest queued task atomically and keep a heartbeat on it while it runs,
+    so tasks orphaned by a dead worker can be put back on the queue.
+    """
+    # Wakes up idle workers in this process when a task is enqueued
+    _wakeup = threading.Event()
+
+    @staticmethod
+    def enqueue(task_id):
+        task = tasks_collection.find_one({'_id': task_id}, {'status': 1})
+        if not task:
+            return False
+
+        # Starting a task that is already queued or running is a no-op
+        if task.get('status') in ('queued', 'in_progress'):
+            return True
+
+        if tasks_collection.count_documents({'status': 'queued'}) >= QUEUE_MAX_DEPTH:
+            raise QueueFullError(f"Task queue is full ({QUEUE_MAX_DEPTH} tasks waiting)")
+
+        # The status guard is part of the update, so a concurrent start or a
+        # worker claiming the task in between cannot be overwritten
+        result = tasks_collection.update_one(
+            {'_id': task_id, 'status': {'$nin': ['queued', 'in_progress']}},
+            {'$set': {
+                'status': 'queued',
+                'queuedAt': datetime.utcnow().isoformat(),
+                # A new run starts writing output from scratch; requeued
+                # orphans keep their checkpoint and resume from it
+                'outputWrittenFiles': [],
+                'progress': None
+            }}
+        )
+        if not result.matched_count:
+            # Either queued or started by someone else since the check, or deleted
+            return tasks_collection.count_documents({'_id': task_id}) > 0
+        JobQueue._wakeup.set()
+        return True
+
+    @staticmethod
+    def claim(worker_id):
+        """Atomically move the oldest queued task to in_progress"""
+        now = datetime.utcnow().isoformat()
+        return tasks_collection.find_one_and_update(
+            {'status': 'queued'},
+            {'$set': {'status': 'in_progress', 'workerId': worker_id,
+                      'startedAt': now, 'heartbeatAt': now}},
+            sort=[('queuedAt', 1)],
+            return_document=RETURN_AFTER
+        )
+
+    @staticmethod
+    def heartbeat(task_id, worker_id):
+        tasks_collection.update_one(
+            {'_id': task_id, 'workerId': worker_id, 'status': 'in_progress'},
+            {'$set': {'heartbeatAt': datetime.utcnow().isoformat()}}
+        )
+
+    @staticmethod
+    def recover_orphaned():
+        """Requeue in_progress tasks whose worker stopped sending heartbeats"""
+        cutoff = (datetime.utcnow() - timedelta(seconds=WORKER_HEARTBEAT_TIMEOUT)).isoformat()
+        # Tasks started before heartbeats existed have no heartbeatAt at all
+        for query in ({'status': 'in_progress', 'heartbeatAt': {'$lt': cutoff}},
+                      {'status': 'in_progress', 'heartbeatAt': None}):
+            result = tasks_collection.update_many(
+                query,
+                {'$set': {'status': 'queued', 'queuedAt': datetime.utcnow().isoformat()}}
+            )
+            if result.modified_count:
+                print(f"Requeued {result.modified_count} orphaned task(s)")
+        JobQueue._wakeup.set()
+
+
+class WorkerPool:
+    """
+    Fixed-size pool of threads that take tasks off the JobQueue and run them.
+    """
+    def __init__(self, process_task, concurrency=WORKER_CONCURRENCY,
+                 poll_interval=WORKER_POLL_INTERVAL):
+        self.process_task = process_task
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.worker_prefix = f"{socket.gethostname()}-{os.getpid()}"
+        self._stopping = threading.Event()
+        self._threads = []
+        self._active = {}
+        self._active_lock = threading.Lock()
+
+    def start(self):
+        JobQueue.recover_orphaned()
+        for i in range(self.concurrency):
+            thread = threading.Thread(
+                target=self._run,
+                args=(f"{self.worker_prefix}-{i}",),
+                name=f"task-worker-{i}"
+            )
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+        heartbeat = threading.Thread(target=self._heartbeat, name="task-worker-heartbeat")
+        heartbeat.daemon = True
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        print(f"Started {self.concurrency} task worker(s)")
+
+    def stop(self, timeout=None):
+        """Stop taking new tasks and wait for in-flight ones to finish"""
+        self._stopping.set()
+        JobQueue._wakeup.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+
+    def _run(self, worker_id):
+        while not self._stopping.is_set():
+            task = JobQueue.claim(worker_id)
+            if not task:
+                JobQueue._wakeup.wait(self.poll_interval)
+                JobQueue._wakeup.clear()
+                continue
+
+            with self._active_lock:
+                self._active[task['_id']] = worker_id
+            try:
+                self.process_task(task)
+            finally:
+                with self._active_lock:
+                    self._active.pop(task['_id'], None)
+
+    def _heartbeat(self):
+        interval = max(1.0, WORKER_HEARTBEAT_TIMEOUT / 3)
+        elapsed = 0.0
+        while not self._stopping.wait(interval):
+            with self._active_lock:
+                active = list(self._active.items())
+            for task_id, worker_id in active:
+                JobQueue.heartbeat(task_id, worker_id)
+
+            # Periodically pick up tasks left behind by workers that died
+            elapsed += interval
+            if elapsed >= WORKER_HEARTBEAT_TIMEOUT:
+                elapsed = 0.0
+                JobQueue.recover_orphaned()
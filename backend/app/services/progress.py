@@ -0,0 +1,104 @@
+from app.config import tasks_collection
+from datetime import datetime
+import threading
+import time
+import os
+
+# Progress is written to the task at most this often, apart from stage changes
+PROGRESS_WRITE_INTERVAL = float(os.environ.get('PROGRESS_WRITE_INTERVAL', '1'))
+
+# Order of the counters in the stored `progress.n` list
+PROGRESS_COUNTERS = ('listed', 'downloaded', 'extracted', 'written', 'failed')
+
+
+def expand_progress(progress):
+    """API representation of the compact progress stored on a task"""
+    if not progress:
+        return None
+    counts = dict(zip(PROGRESS_COUNTERS, progress.get('n', [])))
+    return dict(
+        counts,
+        stage=progress.get('s'),
+        etaSeconds=progress.get('eta'),
+        updatedAt=progress.get('at'),
+        seq=progress.get('seq', 0)
+    )
+
+
+class ProgressTracker:
+    """
+    Counts the files of a task run through the pipeline stages and keeps a
+    compact summary on the task document:
+
+        progress: {s: stage, n: [listed, downloaded, extracted, written, failed],
+                   eta: seconds left, at: time, seq: write counter}
+
+    Counters are updated from the file worker threads. Writes are throttled
+    to one per PROGRESS_WRITE_INTERVAL, except for stage changes.
+    """
+    def __init__(self, task_id, write_interval=PROGRESS_WRITE_INTERVAL):
+        self.task_id = task_id
+        self.write_interval = write_interval
+        self.counts = dict.fromkeys(PROGRESS_COUNTERS, 0)
+        self.stage_name = 'listing'
+        self.listing_done = False
+        self.started = time.monotonic()
+        self._last_write = 0.0
+        self._seq = 0
+        self._lock = threading.Lock()
+        # Keeps writes from different threads in seq order
+        self._write_lock = threading.Lock()
+
+    def add(self, counter, n=1):
+        with self._lock:
+            self.counts[counter] += n
+        self._write()
+
+    def stage(self, name):
+        with self._lock:
+            self.stage_name = name
+        self._write(force=True)
+
+    def track_listing(self, files):
+        """Pass through a file iterator, counting the files as they are listed"""
+        for file in files:
+            self.add('listed')
+            yield file
+        with self._lock:
+            self.listing_done = True
+            if self.stage_name == 'listing':
+                self.stage_name = 'processing'
+        self._write(force=True)
+
+    def eta(self):
+        """Seconds until all listed files are written, at the current rate"""
+        done = self.counts['written'] + self.counts['failed']
+        elapsed = time.monotonic() - self.started
+        if not self.listing_done or not done or elapsed <= 0:
+            return None
+        remaining = max(self.counts['listed'] - done, 0)
+        return round(remaining * elapsed / done, 1)
+
+    def snapshot(self):
+        with self._lock:
+            self._seq += 1
+            return {
+                's': self.stage_name,
+                'n': [self.counts[c] for c in PROGRESS_COUNTERS],
+                'eta': self.eta(),
+                'at': datetime.utcnow().isoformat(),
+                'seq': self._seq
+            }
+
+    def _write(self, force=False):
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_write < self.write_interval:
+                return
+            self._last_write = now
+        try:
+            with self._write_lock:
+                tasks_collection.update_one({'_id': self.task_id}, {'$set': {'progress': self.snapshot()}})
+        except Exception as e:
+            # Progress is informational; never fail the task over it
+            print(f"Could not record progress for task {self.task_id}: {str(e)}")
@@ -1,167 +1,463 @@
 from flask import Blueprint, request, jsonify
-from datetime import datetime
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 import uuid
 import os
 import json
 from pathlib import Path
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app import bulk
+from app.metrics import timed_call
 from app.models.questionnaire import questionnaire_collection, Questionnaire
+from app.services.brainbase_client import get_brainbase_client
+from app.services import flow_codegen
+from app.services.deployment_registry import DeploymentRegistry, flow_code_hash
+from app.services.job_queue import QueueFullError
+from app.services.response_writer import response_writer, ResponseBufferFullError
+
+# Deployment jobs running at the same time, and waiting at most
+DEPLOY_CONCURRENCY = int(os.environ.get('DEPLOY_CONCURRENCY', '2'))
+DEPLOY_QUEUE_MAX_DEPTH = int(os.environ.get('DEPLOY_QUEUE_MAX_DEPTH', '20'))
+# A job still queued after this long is assumed lost
+DEPLOY_JOB_TIMEOUT = int(os.environ.get('DEPLOY_JOB_TIMEOUT', '600'))
+# A running job whose heartbeat is older than this is assumed lost
+DEPLOY_HEARTBEAT_TIMEOUT = int(os.environ.get('DEPLOY_HEARTBEAT_TIMEOUT', '60'))
+
+# Generated flow files, and how long an unreferenced one is kept
+FLOWS_DIR = Path(os.environ.get('FLOWS_DIR', 'flows'))
+FLOW_FILE_GRACE_PERIOD = int(os.environ.get('FLOW_FILE_GRACE_PERIOD', '3600'))
+
+_deploy_executor = None
+_deploy_slots = threading.BoundedSemaphore(DEPLOY_CONCURRENCY + DEPLOY_QUEUE_MAX_DEPTH)
+_deploy_lock = threading.Lock()
+
+
+def _get_deploy_executor():
+    global _deploy_executor
+    with _deploy_lock:
+        if _deploy_executor is None:
+            _deploy_executor = ThreadPoolExecutor(
+                max_workers=DEPLOY_CONCURRENCY, thread_name_prefix='flow-deploy'
+            )
+        return _deploy_executor
+
+
+def shutdown_deployments(wait=True):
+    """Stop the deployment executor, by default after the queued jobs have run"""
+    global _deploy_executor
+    with _deploy_lock:
+        executor, _deploy_executor = _deploy_executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def _reset_after_fork():
+    # Executor threads do not survive a fork; the child starts its own
+    global _deploy_executor, _deploy_slots, _deploy_lock
+    _deploy_executor = None
+    _deploy_slots = threading.BoundedSemaphore(DEPLOY_CONCURRENCY + DEPLOY_QUEUE_MAX_DEPTH)
+    _deploy_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
 
 class QuestionnaireService:
     @staticmethod
     def start_questionnaire(questionnaire_id):
         """
-        Generate Python code for a questionnaire flow and save it to a file.
-        Then deploy it using Brainbase Labs SDK.
+        Queue a deployment of the questionnaire flow.
+
+        Returns the deployment state stored on the questionnaire document,
+        or None if the questionnaire does not exist. Starting a questionnaire
+        whose deployment is already queued or running returns that job,
+        unless the job is stale: queued for longer than DEPLOY_JOB_TIMEOUT,
+        or running without a heartbeat for DEPLOY_HEARTBEAT_TIMEOUT, as
+        happens when the process running it died. A stale job is replaced.
+        A malformed id raises bson.errors.InvalidId.
         """
+        _id = ObjectId(questionnaire_id)
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=DEPLOY_JOB_TIMEOUT)
+        heartbeat_cutoff = now - timedelta(seconds=DEPLOY_HEARTBEAT_TIMEOUT)
+        deployment = {
+            "job_id": uuid.uuid4().hex,
+            "status": "queued",
+            "queued_at": now,
+        }
+
+        if not _deploy_slots.acquire(blocking=False):
+            raise QueueFullError(f"Deployment queue is full ({DEPLOY_QUEUE_MAX_DEPTH} waiting)")
         try:
-            questionnaire_doc = questionnaire_collection.find_one({"_id": ObjectId(questionnaire_id)})
-            if not questionnaire_doc:
-                return None
-            
-            questionnaire = Questionnaire.from_mongo(questionnaire_doc)
-            python_code = QuestionnaireService._generate_flow_code(questionnaire.dict())
-            
-            flows_dir = Path("flows")
-            flows_dir.mkdir(exist_ok=True)
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            questionnaire_name = questionnaire.title.replace(' ', '_').lower()
-            
-            filename = f"{questionnaire_name}_{timestamp}_flow.based"
-            file_path = flows_dir / filename
-            
-            with open(file_path, 'w') as f:
-                f.write(python_code)
-            
-            # Deploy the flow using Brainbase Labs SDK
-            from brainbase_labs import BrainbaseLabs
-            
-            # Initialize Brainbase Labs SDK
-            bb = BrainbaseLabs(api_key=os.getenv("BRAINBASE_LABS_API_KEY"))
-            
-            # Create or get Twilio integration
-            # twilio_integration = bb.team.integrations.twilio.create(
-            #     account_sid=os.getenv("TWILIO_ACCOUNT_SID"),
-            #     auth_token=os.getenv("TWILIO_AUTH_TOKEN")
-            # )
-            
-            # Get phone number from environment or configuration
-            raw_phone_number = os.getenv("TWILIO_PHONE_NUMBER")
-            
-            # Create a worker for this questionnaire
-            worker = bb.workers.create(
-                name=f"Questionnaire: {questionnaire.title}",
-                description=f"A questionnaire assistant for {questionnaire.title}",
-                status="active"
+            # Claim the questionnaire unless another deployment is in flight
+            claimed = questionnaire_collection.find_one_and_update(
+                {"_id": _id, "$or": [
+                    {"deployment.status": {"$nin": ["queued", "running"]}},
+                    {"deployment.status": "queued", "deployment.queued_at": {"$lt": cutoff}},
+                    {"deployment.status": "running",
+                     "deployment.heartbeat_at": {"$lt": heartbeat_cutoff}},
+                    # Jobs started before heartbeats existed have no heartbeat_at
+                    {"deployment.status": "running", "deployment.heartbeat_at": None,
+                     "deployment.started_at": {"$lt": cutoff}}
+                ]},
+                {"$set": {"deployment": deployment}},
+                projection={"_id": 1}
             )
-            
-            # Create a flow for the worker
-            flow = bb.workers.flows.create(
-                worker_id=worker.id,
-                name=questionnaire.title,
-                path=str(file_path),
-                label="v1",
-                validate=False
+            if not claimed:
+                _deploy_slots.release()
+                existing = questionnaire_collection.find_one({"_id": _id}, {"deployment": 1})
+                return existing.get("deployment") if existing else None
+
+            _get_deploy_executor().submit(
+                QuestionnaireService._run_deployment, questionnaire_id, deployment["job_id"]
             )
-            
-            # Deploy the flow to a voice channel
-            voice_deployment = bb.workers.deployments.voice.create(
-                worker_id=worker.id,
-                name=f"{questionnaire.title} Voice Deployment",
-                flow_id=flow.id,
-                phone_number=raw_phone_number,
-                config={}
+        except Exception:
+            _deploy_slots.release()
+            raise
+        return deployment
+
+    @staticmethod
+    def get_deployment(questionnaire_id):
+        doc = questionnaire_collection.find_one({"_id": ObjectId(questionnaire_id)}, {"deployment": 1})
+        if not doc:
+            return None
+        return doc.get("deployment") or {"status": "not_deployed"}
+
+    @staticmethod
+    def _update_deployment(questionnaire_id, job_id, fields):
+        # Only the job that owns the deployment may update it
+        questionnaire_collection.update_one(
+            {"_id": ObjectId(questionnaire_id), "deployment.job_id": job_id},
+            {"$set": {f"deployment.{k}": v for k, v in fields.items()}}
+        )
+
+    @staticmethod
+    def _heartbeat(questionnaire_id, job_id, done):
+        """Keep a running job's heartbeat fresh so it is not taken for lost"""
+        interval = max(1.0, DEPLOY_HEARTBEAT_TIMEOUT / 3)
+        while not done.wait(interval):
+            try:
+                QuestionnaireService._update_deployment(
+                    questionnaire_id, job_id, {"heartbeat_at": datetime.utcnow()}
+                )
+            except Exception as e:
+                print(f"Error updating deployment heartbeat of {questionnaire_id}: {str(e)}")
+
+    @staticmethod
+    def _run_deployment(questionnaire_id, job_id):
+        done = threading.Event()
+        try:
+            now = datetime.utcnow()
+            QuestionnaireService._update_deployment(
+                questionnaire_id, job_id,
+                {"status": "running", "started_at": now, "heartbeat_at": now}
             )
-            
-            deployment_status = "success" if voice_deployment else "failed"
-            deployment_message = f"Deployed to {voice_deployment.phone_number}" if voice_deployment else "Deployment failed"
-            
-            print('successfully deployed questionnaire')
-            return {
-                "questionnaire_id": questionnaire_id,
-                "file_path": str(file_path),
-                "status": "success",
-                "message": "Questionnaire flow generated successfully",
-                "deployment": {
-                    "status": deployment_status,
-                    "message": deployment_message,
-                    "worker_id": worker.id if worker else None,
-                    "flow_id": flow.id if flow else None,
-                    "deployment_id": voice_deployment.id if voice_deployment else None,
-                    "phone_number": voice_deployment.phone_number if voice_deployment else None
-                }
-            }
+            heartbeat = threading.Thread(
+                target=QuestionnaireService._heartbeat,
+                args=(questionnaire_id, job_id, done),
+                name="flow-deploy-heartbeat"
+            )
+            heartbeat.daemon = True
+            heartbeat.start()
+            result = QuestionnaireService.deploy_questionnaire(questionnaire_id)
+            result.update(status="succeeded", finished_at=datetime.utcnow())
+            QuestionnaireService._update_deployment(questionnaire_id, job_id, result)
+            print(f"Deployed questionnaire {questionnaire_id}")
         except Exception as e:
-            print(f"Error in start_questionnaire: {str(e)}")
-            return {
-                "questionnaire_id": questionnaire_id,
-                "status": "error",
-                "message": f"Error: {str(e)}"
-            }
-    
+            print(f"Error deploying questionnaire {questionnaire_id}: {str(e)}")
+            QuestionnaireService._update_deployment(
+                questionnaire_id, job_id,
+                {"status": "failed", "error": str(e), "finished_at": datetime.utcnow()}
+            )
+        finally:
+            done.set()
+            _deploy_slots.release()
+
+    @staticmethod
+    def deploy_questionnaire(questionnaire_id, client=None):
+        """
+        Generate the flow code for a questionnaire, save it to a file and
+        deploy it with the Brainbase Labs SDK.
+
+        The worker, flow and voice deployment recorded in the deployment
+        registry are reused. Unchanged flow code is not deployed again;
+        changed code is uploaded as the next flow version.
+        """
+        questionnaire_doc = questionnaire_collection.find_one({"_id": ObjectId(questionnaire_id)})
+        if not questionnaire_doc:
+            raise ValueError(f"Questionnaire {questionnaire_id} not found")
+
+        questionnaire = Questionnaire.from_mongo(questionnaire_doc)
+        python_code = QuestionnaireService._generate_flow_code(questionnaire.dict())
+        code_hash = flow_code_hash(python_code)
+
+        # Get phone number from environment or configuration
+        raw_phone_number = os.getenv("TWILIO_PHONE_NUMBER")
+
+        entry = DeploymentRegistry.get(questionnaire_id) or {}
+        if (entry.get("code_hash") == code_hash and entry.get("deployment_id")
+                and entry.get("phone_number") == raw_phone_number):
+            return QuestionnaireService._deployment_result(entry, reused=True)
+
+        # Flow files are named by content, so an unchanged flow is written once
+        FLOWS_DIR.mkdir(exist_ok=True)
+        file_path = FLOWS_DIR / f"{questionnaire_id}_{code_hash[:16]}.based"
+        if not file_path.exists():
+            with open(file_path, 'w') as f:
+                f.write(python_code)
+
+        bb = client or get_brainbase_client()
+
+        # Create or get Twilio integration
+        # twilio_integration = bb.team.integrations.twilio.create(
+        #     account_sid=os.getenv("TWILIO_ACCOUNT_SID"),
+        #     auth_token=os.getenv("TWILIO_AUTH_TOKEN")
+        # )
+
+        worker_id = entry.get("worker_id")
+        if not worker_id:
+            # Create a worker for this questionnaire
+            with timed_call('worker_create'):
+                worker = bb.workers.create(
+                    name=f"Questionnaire: {questionnaire.title}",
+                    description=f"A questionnaire assistant for {questionnaire.title}",
+                    status="active"
+                )
+            worker_id = worker.id
+            # Record the worker right away so a failed deployment reuses it
+            entry = DeploymentRegistry.save(questionnaire_id, {"worker_id": worker_id})
+
+        version = entry.get("version", 0)
+        flow_id = entry.get("flow_id")
+        if entry.get("code_hash") != code_hash or not flow_id:
+            # Upload the changed flow as a new version of the worker's flow
+            version += 1
+            with timed_call('flow_create'):
+                flow = bb.workers.flows.create(
+                    worker_id=worker_id,
+                    name=questionnaire.title,
+                    path=str(file_path),
+                    label=f"v{version}",
+                    validate=False
+                )
+            flow_id = flow.id
+
+        voice = bb.workers.deployments.voice
+        if entry.get("deployment_id"):
+            # Point the existing voice deployment at the current flow
+            # (PATCH /workers/{worker_id}/deployments/voice/{deployment_id})
+            with timed_call('voice_deployment_update'):
+                voice_deployment = voice.update(
+                    entry["deployment_id"],
+                    worker_id=worker_id,
+                    flow_id=flow_id,
+                    phone_number=raw_phone_number
+                )
+        else:
+            # Deploy the flow to a voice channel
+            with timed_call('voice_deployment_create'):
+                voice_deployment = voice.create(
+                    worker_id=worker_id,
+                    name=f"{questionnaire.title} Voice Deployment",
+                    flow_id=flow_id,
+                    phone_number=raw_phone_number,
+                    config={}
+                )
+        if not voice_deployment:
+            raise RuntimeError("Voice deployment failed")
+
+        entry = DeploymentRegistry.save(questionnaire_id, {
+            "worker_id": worker_id,
+            "flow_id": flow_id,
+            "deployment_id": voice_deployment.id,
+            "phone_number": voice_deployment.phone_number,
+            "code_hash": code_hash,
+            "version": version,
+            "file_path": str(file_path)
+        })
+        QuestionnaireService._collect_flow_files()
+        return QuestionnaireService._deployment_result(entry, reused=False)
+
+    @staticmethod
+    def _deployment_result(entry, reused):
+        return {
+            "file_path": entry.get("file_path"),
+            "worker_id": entry.get("worker_id"),
+            "flow_id": entry.get("flow_id"),
+            "deployment_id": entry.get("deployment_id"),
+            "phone_number": entry.get("phone_number"),
+            "flow_version": f"v{entry.get('version', 1)}",
+            "reused": reused
+        }
+
+    @staticmethod
+    def _collect_flow_files():
+        """Delete flow files no deployment refers to any more"""
+        referenced = {Path(p).name for p in DeploymentRegistry.referenced_files()}
+        # Leave recent files alone, another deployment may be about to use them
+        cutoff = time.time() - FLOW_FILE_GRACE_PERIOD
+        for path in FLOWS_DIR.glob("*.based"):
+            try:
+                if path.name not in referenced and path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError as e:
+                print(f"Could not remove flow file {path}: {str(e)}")
+
     @staticmethod
     def _generate_flow_code(questionnaire):
         """
-        Generate Python code for a questionnaire flow.
+        Generate the Brainbase flow code for a questionnaire dict.
         """
-        questions = questionnaire.get('questions', [])
-        
-        # Start with basic setup
-        lines = []
-        lines.append("state = {}")
-        lines.append(f"meta_prompt = f\"{questionnaire.get('title', '')}\"")
-        lines.append("")
-        
-        # Process each question
-        for i, question in enumerate(questions):
-            question_id = f"q{i+1}"
-            question_text = question.get('text', f'Question {i+1}')
-            question_type = question.get('type', 'text')
-            
-            if question_type == 'rating':
-                lines.append(f"loop:")
-                lines.append(f'    {question_id}_response = talk("{question_text}", True)')
-                lines.append(f'until "User has provided a rating between 1 to 5":')
-                lines.append(f'    {question_id}_answer = {question_id}_response.ask(')
-                lines.append(f'        question="Based on the user\'s response, what rating did they give from 1 to 5?",')
-                lines.append(f'        example={{"rating": 4}}')
-                lines.append(f'    )')
-                lines.append(f'state["{question_id}"] = {question_id}_answer["rating"]')
-            else:
-                lines.append(f"loop:")
-                lines.append(f'    {question_id}_response = talk("{question_text}", True)')
-                lines.append(f'until "User has provided an answer":')
-                lines.append(f'    {question_id}_answer = {question_id}_response.ask(')
-                lines.append(f'        question="What is the user\'s response ?",')
-                lines.append(f'        example={{"message": "User response"}}')
-                lines.append(f'    )')
-                lines.append(f'state["{question_id}"] = {question_id}_answer["message"]')
-            
-            lines.append("")
-        
-        lines.append('talk("Thank you for completing the questionnaire. Your responses have been recorded.")')
-        
-        return "\n".join(lines)
+        return flow_codegen.generate(questionnaire)
+
+    @staticmethod
+    def generate_flow_codes(questionnaires):
+        """
+        Generate the flow code for many questionnaire dicts in one call.
+        """
+        return flow_codegen.generate_many(questionnaires)
     
     @staticmethod
-    def submit_questionnaire(questionnaire_id, answers):
+    def create_questionnaires(items):
+        """Validate and insert many questionnaires at once; returns per-item results"""
+        results = []
+        created = []
+        for i, data in enumerate(items):
+            try:
+                # to_mongo parses the id, so a malformed one fails this item only
+                questionnaire = Questionnaire(**data)
+                created.append((i, questionnaire, questionnaire.to_mongo()))
+            except Exception as e:
+                results.append({"index": i, "status": "error", "error": str(e)})
+        if not created:
+            return results
+
+        try:
+            questionnaire_collection.insert_many(
+                [document for _, _, document in created], ordered=False
+            )
+            errors = {}
+        except BulkWriteError as e:
+            errors = bulk.write_errors(e)
+
+        for position, (i, questionnaire, _) in enumerate(created):
+            if position in errors:
+                results.append({"index": i, "status": "error", "id": questionnaire.id,
+                                "error": errors[position]})
+            else:
+                results.append({"index": i, "status": "created", "id": questionnaire.id})
+        return results
+
+    @staticmethod
+    def update_questionnaires(items):
+        """Validate and update many questionnaires, given with their id, in one bulk write"""
+        results = []
+        updates = []
+        for i, data in enumerate(items):
+            try:
+                _id = bulk.item_object_id(data) if isinstance(data, dict) else None
+                if not _id:
+                    raise ValueError("Questionnaire must be an object with a valid id")
+                document = Questionnaire(**dict(data, id=_id)).to_mongo()
+                updates.append((i, document.pop("_id"), document))
+            except Exception as e:
+                results.append({"index": i, "status": "error", "error": str(e)})
+
+        existing = set()
+        if updates:
+            existing = {
+                doc["_id"] for doc in questionnaire_collection.find(
+                    {"_id": {"$in": [_id for _, _id, _ in updates]}}, {"_id": 1}
+                )
+            }
+        operations = [(i, _id, document) for i, _id, document in updates if _id in existing]
+        for i, _id, _ in updates:
+            if _id not in existing:
+                results.append({"index": i, "status": "not_found", "id": str(_id)})
+        if not operations:
+            return results
+
+        try:
+            # $set keeps the fields the form does not own, like the deployment
+            questionnaire_collection.bulk_write(
+                [UpdateOne({"_id": _id}, {"$set": document}) for _, _id, document in operations],
+                ordered=False
+            )
+            errors = {}
+        except BulkWriteError as e:
+            errors = bulk.write_errors(e)
+
+        for position, (i, _id, _) in enumerate(operations):
+            if position in errors:
+                results.append({"index": i, "status": "error", "id": str(_id), "error": errors[position]})
+            else:
+                results.append({"index": i, "status": "updated", "id": str(_id)})
+        return results
+
+    @staticmethod
+    def delete_questionnaires(items):
+        """Delete many questionnaires, given as ids or objects with an id"""
+        results = []
+        ids = {}
+        for i, item in enumerate(items):
+            _id = bulk.item_object_id(item)
+            if _id:
+                ids[i] = ObjectId(_id)
+            else:
+                results.append({"index": i, "status": "error", "error": "Invalid questionnaire id"})
+
+        existing = set()
+        if ids:
+            existing = {
+                doc["_id"] for doc in questionnaire_collection.find(
+                    {"_id": {"$in": list(ids.values())}}, {"_id": 1}
+                )
+            }
+        if existing:
+            questionnaire_collection.delete_many({"_id": {"$in": list(existing)}})
+            DeploymentRegistry.delete_many([str(_id) for _id in existing])
+
+        for i, _id in ids.items():
+            status = "deleted" if _id in existing else "not_found"
+            results.append({"index": i, "status": status, "id": str(_id)})
+        return results
+
+    @staticmethod
+    def submit_questionnaire(questionnaire_id, answers, idempotency_key=None):
         """
-        Submit answers for a questionnaire.
+        Accept answers for a questionnaire.
+
+        The response is buffered and written in a batch shortly after. A
+        retried submission with the same idempotency key is stored once.
         """
         try:
             # Find the questionnaire by ID using MongoDB
-            questionnaire_doc = questionnaire_collection.find_one({"_id": ObjectId(questionnaire_id)})
+            questionnaire_doc = questionnaire_collection.find_one(
+                {"_id": ObjectId(questionnaire_id)}, {"_id": 1}
+            )
             if not questionnaire_doc:
                 return None
-            
-            # In a real application, you might store the answers in a database
-            # For this example, we'll just return a success message
+
+            # Idempotency keys only need to be unique per questionnaire
+            response_id = f"{questionnaire_id}:{idempotency_key or ObjectId()}"
+            response_writer.submit({
+                "_id": response_id,
+                "questionnaire_id": questionnaire_id,
+                "answers": answers,
+                "submitted_at": datetime.utcnow()
+            })
             return {
                 "questionnaire_id": questionnaire_id,
+                "response_id": response_id,
                 "status": "success",
                 "message": "Questionnaire submitted successfully"
             }
+        except ResponseBufferFullError:
+            raise
         except Exception as e:
             print(f"Error in submit_questionnaire: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
@@ -0,0 +1,151 @@
+from app.models.response import responses_collection, questionnaire_stats_collection
+from collections import defaultdict
+from datetime import datetime
+import math
+
+
+def _question_answers(answers):
+    """(question key, answer) pairs of a response's answers"""
+    if isinstance(answers, dict):
+        items = answers.items()
+    elif isinstance(answers, list):
+        items = ((f"q{i}", answer) for i, answer in enumerate(answers, start=1))
+    else:
+        return
+    for key, answer in items:
+        key = str(key)
+        # Keys become field names in the stats document
+        if key and '.' not in key and not key.startswith('$'):
+            yield key, answer
+
+
+def _number(answer):
+    if isinstance(answer, bool):
+        return None
+    if isinstance(answer, (int, float)) and math.isfinite(answer):
+        return answer
+    return None
+
+
+def _histogram_key(value):
+    # Only whole numbers (ratings) get a histogram bucket
+    return str(int(value)) if float(value).is_integer() else None
+
+
+class QuestionnaireStats:
+    """
+    Aggregate statistics of the responses to each questionnaire.
+
+    One document per questionnaire holds counters per question: the number
+    of answers and, for numeric answers, their count, sum, sum of squares
+    and a histogram of whole-number values. The counters are increased with
+    $inc as responses are written, so reading them never touches the raw
+    responses. `rebuild` recomputes them from the responses.
+    """
+    @staticmethod
+    def record(responses):
+        """Add a batch of newly stored responses to the counters"""
+        increments = defaultdict(lambda: defaultdict(int))
+        for response in responses:
+            inc = increments[response['questionnaire_id']]
+            inc['responses'] += 1
+            for key, answer in _question_answers(response.get('answers')):
+                prefix = f"questions.{key}"
+                inc[f"{prefix}.count"] += 1
+                value = _number(answer)
+                if value is None:
+                    continue
+                inc[f"{prefix}.numeric_count"] += 1
+                inc[f"{prefix}.sum"] += value
+                inc[f"{prefix}.sum_sq"] += value * value
+                bucket = _histogram_key(value)
+                if bucket is not None:
+                    inc[f"{prefix}.histogram.{bucket}"] += 1
+
+        # One update per questionnaire in the batch
+        for questionnaire_id, inc in increments.items():
+            questionnaire_stats_collection.update_one(
+                {'_id': questionnaire_id},
+                {'$inc': dict(inc), '$set': {'updated_at': datetime.utcnow()}},
+                upsert=True
+            )
+
+    @staticmethod
+    def get(questionnaire_id):
+        """Summary of the stored counters: counts, mean, stddev and histograms"""
+        doc = questionnaire_stats_collection.find_one({'_id': questionnaire_id})
+        if not doc:
+            return {'questionnaire_id': questionnaire_id, 'responses': 0, 'questions': {}}
+
+        questions = {}
+        for key, counters in doc.get('questions', {}).items():
+            summary = {'count': counters.get('count', 0)}
+            n = counters.get('numeric_count', 0)
+            if n:
+                mean = counters['sum'] / n
+                variance = max(counters['sum_sq'] / n - mean * mean, 0.0)
+                summary.update(
+                    mean=mean,
+                    stddev=math.sqrt(variance),
+                    histogram=counters.get('histogram', {})
+                )
+            questions[key] = summary
+        return {
+            'questionnaire_id': questionnaire_id,
+            'responses': doc.get('responses', 0),
+            'questions': questions,
+            'updated_at': doc.get('updated_at')
+        }
+
+    @staticmethod
+    def rebuild(questionnaire_id=None):
+        """
+        Recompute the counters from the stored responses, for one
+        questionnaire or all of them. Returns the number of stats documents
+        written.
+
+        Responses stored while a rebuild runs may be counted twice or not
+        at all, so run it while submissions are paused.
+        """
+        import numpy as np
+
+        query = {'questionnaire_id': questionnaire_id} if questionnaire_id else {}
+        counts = defaultdict(lambda: defaultdict(int))
+        values = defaultdict(lambda: defaultdict(list))
+        responses = defaultdict(int)
+        for response in responses_collection.find(query, {'questionnaire_id': 1, 'answers': 1}):
+            qid = response['questionnaire_id']
+            responses[qid] += 1
+            for key, answer in _question_answers(response.get('answers')):
+                counts[qid][key] += 1
+                value = _number(answer)
+                if value is not None:
+                    values[qid][key].append(value)
+
+        for qid, total in responses.items():
+            questions = {}
+            for key, count in counts[qid].items():
+                counters = {'count': count}
+                numbers = np.asarray(values[qid].get(key, []), dtype=np.float64)
+                if numbers.size:
+                    counters.update(
+                        numeric_count=int(numbers.size),
+                        sum=float(numbers.sum()),
+                        sum_sq=float(np.dot(numbers, numbers))
+                    )
+                    whole = numbers[numbers == np.floor(numbers)]
+                    buckets, bucket_counts = np.unique(whole.astype(np.int64), return_counts=True)
+                    counters['histogram'] = {
+                        str(b): int(c) for b, c in zip(buckets.tolist(), bucket_counts.tolist())
+                    }
+                questions[key] = counters
+            questionnaire_stats_collection.replace_one(
+                {'_id': qid},
+                {'_id': qid, 'responses': total, 'questions': questions,
+                 'updated_at': datetime.utcnow()},
+                upsert=True
+            )
+
+        if questionnaire_id and not responses:
+            questionnaire_stats_collection.delete_one({'_id': questionnaire_id})
+        return len(responses)
@@ -0,0 +1,211 @@
+from app.models.response import responses_collection, dead_letters_collection
+from app.services.questionnaire_stats import QuestionnaireStats
+from pymongo.errors import BulkWriteError
+from datetime import datetime, timedelta
+import atexit
+import threading
+import os
+
+# A buffer is written once it holds this many responses, and at least
+# every this many seconds
+RESPONSE_FLUSH_SIZE = int(os.environ.get('RESPONSE_FLUSH_SIZE', '100'))
+RESPONSE_FLUSH_INTERVAL = float(os.environ.get('RESPONSE_FLUSH_INTERVAL', '1'))
+# Responses kept in memory at most while the database is unavailable
+RESPONSE_BUFFER_MAX = int(os.environ.get('RESPONSE_BUFFER_MAX', '10000'))
+# Writes a response gets before it is moved to the dead-letter collection
+RESPONSE_MAX_ATTEMPTS = int(os.environ.get('RESPONSE_MAX_ATTEMPTS', '5'))
+
+DUPLICATE_KEY = 11000
+
+
+class ResponseBufferFullError(Exception):
+    """Raised when responses cannot be written fast enough"""
+
+
+class ResponseWriter:
+    """
+    Buffers questionnaire responses and writes them in batches.
+
+    Submissions are appended to an in-memory buffer that is written with a
+    single unordered insert_many when it reaches `flush_size` responses or
+    after `flush_interval` seconds. Responses are keyed by their
+    idempotency key, so a retried submission hits a duplicate key error,
+    which is ignored, instead of being stored twice.
+
+    A batch that fails as a whole, e.g. while the database is unavailable,
+    goes back into the buffer. Responses rejected individually with another
+    error are retried too, and after `max_attempts` moved to `dead_letters`
+    with the last error, so an accepted submission is never just dropped.
+
+    `on_flush` callbacks receive the responses each flush inserted.
+    """
+    def __init__(self, collection, flush_size=RESPONSE_FLUSH_SIZE,
+                 flush_interval=RESPONSE_FLUSH_INTERVAL, max_buffer=RESPONSE_BUFFER_MAX,
+                 dead_letters=None, max_attempts=RESPONSE_MAX_ATTEMPTS):
+        self.collection = collection
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.dead_letters = dead_letters
+        self.max_attempts = max(1, max_attempts)
+        self.on_flush = []
+        self._init_state()
+
+    def _init_state(self):
+        self._buffer = []
+        # Failed writes per response _id
+        self._attempts = {}
+        # Ids of responses whose insert failed without a result; the attempt
+        # may have stored them, so a duplicate on retry is not necessarily
+        # an earlier submission
+        self._uncertain = set()
+        self._lock = threading.Lock()
+        # Serializes flushes so batches are written in submission order
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def submit(self, response):
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                raise ResponseBufferFullError(
+                    f"Response buffer is full ({self.max_buffer} responses waiting)"
+                )
+            self._buffer.append(response)
+            full = len(self._buffer) >= self.flush_size
+            self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="response-writer")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error writing responses: {str(e)}")
+
+    def flush(self):
+        """Write everything buffered so far; returns the responses inserted"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return []
+
+            try:
+                self.collection.insert_many(batch, ordered=False)
+                inserted = batch
+                retried = set()
+            except BulkWriteError as e:
+                errors = e.details.get('writeErrors', [])
+                failed = {error['index'] for error in errors}
+                inserted = [r for i, r in enumerate(batch) if i not in failed]
+                duplicates = [batch[error['index']] for error in errors
+                              if error.get('code') == DUPLICATE_KEY]
+                inserted += self._stored_by_earlier_attempt(duplicates)
+                retried = self._retry([(batch[error['index']], error.get('errmsg'))
+                                       for error in errors if error.get('code') != DUPLICATE_KEY])
+            except Exception:
+                # Nothing is known about what was written; retry the batch
+                # with the next flush
+                self._uncertain.update(response['_id'] for response in batch)
+                with self._lock:
+                    self._buffer[:0] = batch
+                raise
+            for response in batch:
+                if response['_id'] not in retried:
+                    self._attempts.pop(response['_id'], None)
+                    self._uncertain.discard(response['_id'])
+
+        for callback in self.on_flush:
+            try:
+                callback(inserted)
+            except Exception as e:
+                print(f"Error in response flush callback: {str(e)}")
+        return inserted
+
+    def _stored_by_earlier_attempt(self, duplicates):
+        """
+        The duplicates that a failed earlier attempt of this flush stored,
+        rather than an earlier submission with the same idempotency key
+        """
+        uncertain = [r for r in duplicates if r['_id'] in self._uncertain]
+        if not uncertain:
+            return []
+        try:
+            stored = {
+                doc['_id']: doc.get('submitted_at')
+                for doc in self.collection.find(
+                    {'_id': {'$in': [r['_id'] for r in uncertain]}}, {'submitted_at': 1}
+                )
+            }
+        except Exception as e:
+            print(f"Could not check {len(uncertain)} retried response(s): {str(e)}")
+            return []
+        # MongoDB keeps datetimes to the millisecond
+        return [
+            r for r in uncertain
+            if stored.get(r['_id']) is not None
+            and abs(stored[r['_id']] - r['submitted_at']) < timedelta(milliseconds=1)
+        ]
+
+    def _retry(self, failures):
+        """Put rejected responses back in the buffer, or dead-letter them"""
+        retry, dead = [], []
+        for response, error in failures:
+            attempts = self._attempts.get(response['_id'], 0) + 1
+            if attempts < self.max_attempts:
+                self._attempts[response['_id']] = attempts
+                retry.append(response)
+            else:
+                self._attempts.pop(response['_id'], None)
+                self._uncertain.discard(response['_id'])
+                dead.append((response, error))
+        if retry:
+            with self._lock:
+                self._buffer[:0] = retry
+        for response, error in dead:
+            self._dead_letter(response, error)
+        return {response['_id'] for response in retry}
+
+    def _dead_letter(self, response, error):
+        print(f"Could not store response {response.get('_id')} after "
+              f"{self.max_attempts} attempts: {error}")
+        if self.dead_letters is None:
+            return
+        try:
+            self.dead_letters.replace_one(
+                {'_id': response['_id']},
+                {'_id': response['_id'], 'response': response, 'error': error,
+                 'failed_at': datetime.utcnow()},
+                upsert=True
+            )
+        except Exception as e:
+            print(f"Could not dead-letter response {response.get('_id')}: {str(e)}")
+
+    def close(self):
+        """Write what is left in the buffer, e.g. at shutdown"""
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error writing responses: {str(e)}")
+
+    def _reset_after_fork(self):
+        # The flusher thread does not survive a fork; responses buffered in
+        # the parent are the parent's to write
+        self._init_state()
+
+
+response_writer = ResponseWriter(responses_collection, dead_letters=dead_letters_collection)
+# Keep the per-questionnaire statistics current as responses are stored
+response_writer.on_flush.append(QuestionnaireStats.record)
+os.register_at_fork(after_in_child=response_writer._reset_after_fork)
+atexit.register(response_writer.close)
@@ -0,0 +1,203 @@
+"""
+Content-addressed cache for extraction results.
+
+Results are keyed by the document content (Drive md5Checksum plus
+modifiedTime when available, otherwise a sha256 of the downloaded bytes)
+together with EXTRACTOR_VERSION, so bumping the version invalidates
+everything extracted by an older extractor.
+
+The backend is chosen with RESULT_CACHE_BACKEND:
+- memory: in-process LRU (default)
+- sqlite: file at RESULT_CACHE_PATH, shared by workers on the same host
+- mongo: `extraction_cache` collection, shared by all workers
+- none: caching disabled
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+EXTRACTOR_VERSION = os.environ.get('EXTRACTOR_VERSION', '1')
+RESULT_CACHE_BACKEND = os.environ.get('RESULT_CACHE_BACKEND', 'memory').lower()
+RESULT_CACHE_PATH = os.environ.get('RESULT_CACHE_PATH', 'extraction_cache.sqlite3')
+# Entries older than this many seconds are treated as missing (0 disables)
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', str(30 * 24 * 3600)))
+# Least recently used entries are evicted above this size
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', '10000'))
+
+
+def key_for_file(file, version=EXTRACTOR_VERSION):
+    """Key from Drive metadata, so a hit does not even need a download"""
+    if not file.get('md5Checksum'):
+        return None
+    material = f"drive:{file['md5Checksum']}:{file.get('modifiedTime', '')}:{version}"
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def key_for_content(buffer, version=EXTRACTOR_VERSION, chunk_size=1024 * 1024):
+    """Key from the downloaded bytes; the buffer is rewound afterwards"""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: buffer.read(chunk_size), b''):
+        digest.update(chunk)
+    buffer.seek(0)
+    digest.update(f":{version}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class MemoryResultCache:
+    def __init__(self, max_entries=RESULT_CACHE_MAX_ENTRIES, ttl=RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if self.ttl and time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteResultCache:
+    def __init__(self, path=RESULT_CACHE_PATH, max_entries=RESULT_CACHE_MAX_ENTRIES,
+                 ttl=RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            self._conn.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results "
+                "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+
+class MongoResultCache:
+    def __init__(self, collection, max_entries=RESULT_CACHE_MAX_ENTRIES, ttl=RESULT_CACHE_TTL):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._writes = 0
+        self._indexed = False
+        self._index_lock = threading.Lock()
+
+    def _ensure_indexes(self):
+        # Created on first use rather than here, so importing the module
+        # with the mongo backend does not connect to MongoDB
+        if self._indexed:
+            return
+        with self._index_lock:
+            if self._indexed:
+                return
+            if self.ttl:
+                self._ensure_ttl_index()
+            self.collection.create_index('accessedAt')
+            self._indexed = True
+
+    def _ensure_ttl_index(self):
+        from pymongo.errors import OperationFailure
+
+        # Mongo removes expired entries in the background
+        try:
+            self.collection.create_index('storedAt', expireAfterSeconds=int(self.ttl))
+        except OperationFailure as e:
+            if e.code != 85:
+                raise
+            # IndexOptionsConflict: RESULT_CACHE_TTL changed, update the index in place
+            self.collection.database.command(
+                'collMod', self.collection.name,
+                index={'keyPattern': {'storedAt': 1}, 'expireAfterSeconds': int(self.ttl)}
+            )
+
+    def get(self, key):
+        self._ensure_indexes()
+        now = datetime.utcnow()
+        query = {'_id': key}
+        if self.ttl:
+            # The TTL monitor only runs once a minute
+            query['storedAt'] = {'$gt': now - timedelta(seconds=self.ttl)}
+        document = self.collection.find_one_and_update(
+            query, {'$set': {'accessedAt': now}}, projection={'value': 1}
+        )
+        return document['value'] if document else None
+
+    def set(self, key, value):
+        self._ensure_indexes()
+        now = datetime.utcnow()
+        self.collection.replace_one(
+            {'_id': key},
+            {'_id': key, 'value': value, 'storedAt': now, 'accessedAt': now},
+            upsert=True
+        )
+        # Counting is not free, so size-based eviction only runs every 100 writes
+        self._writes += 1
+        if self._writes % 100 == 0:
+            excess = self.collection.estimated_document_count() - self.max_entries
+            if excess > 0:
+                oldest = self.collection.find({}, {'_id': 1}).sort('accessedAt', 1).limit(excess)
+                self.collection.delete_many({'_id': {'$in': [d['_id'] for d in oldest]}})
+
+
+def create_result_cache(backend=RESULT_CACHE_BACKEND):
+    if backend == 'none':
+        return None
+    if backend == 'sqlite':
+        return SQLiteResultCache()
+    if backend == 'mongo':
+        from app.db import LazyCollection
+        return MongoResultCache(LazyCollection('extraction_cache'))
+    return MemoryResultCache()
+
+
+result_cache = create_result_cache()
@@ -0,0 +1,242 @@
+"""
+Output sinks that receive extraction results one at a time as the task
+pipeline produces them.
+"""
+import csv
+import gzip
+import os
+import random
+import time
+
+from app import lazy
+
+errors = lazy.module('googleapiclient.errors')
+GOOGLE_ERRORS_AVAILABLE = lazy.available('googleapiclient')
+
+OUTPUT_HEADER = ["Filename", "Name", "Date", "Address", "Full Text"]
+
+# Rows written between explicit flushes of the CSV file
+CSV_FLUSH_EVERY = int(os.environ.get('CSV_FLUSH_EVERY', '100'))
+# Rows sent per values().append request
+SHEETS_CHUNK_SIZE = int(os.environ.get('SHEETS_CHUNK_SIZE', '500'))
+SHEETS_MAX_RETRIES = int(os.environ.get('SHEETS_MAX_RETRIES', '6'))
+
+QUOTA_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded', 'quotaExceeded'}
+
+
+def result_key(result):
+    """Identifies a result across attempts: the Drive file id, else the filename"""
+    return result.get('fileId') or result['filename']
+
+
+def result_row(result):
+    fields = result['content'].get('fields', {})
+    return [
+        result['filename'],
+        fields.get('name', ''),
+        fields.get('date', ''),
+        fields.get('address', ''),
+        result['content'].get('text', '')
+    ]
+
+
+class CsvSink:
+    """
+    Stream rows to a CSV file, gzip-compressed when the path ends in .gz.
+
+    With append=True rows are added to an existing file (the header is only
+    written when the file is new), which is how incremental re-runs extend
+    the output of earlier runs.
+    """
+    def __init__(self, path, append=False, flush_every=CSV_FLUSH_EVERY):
+        self.path = path
+        self.flush_every = max(1, flush_every)
+        self.rows_written = 0
+        write_header = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        mode = 'at' if append else 'wt'
+        if path.endswith('.gz'):
+            self._file = gzip.open(path, mode, newline='', encoding='utf-8')
+        else:
+            self._file = open(path, mode, newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        if write_header:
+            self._writer.writerow(OUTPUT_HEADER)
+
+    def write(self, result):
+        self._writer.writerow(result_row(result))
+        self.rows_written += 1
+        if self.rows_written % self.flush_every == 0:
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CollectingSink:
+    """
+    Collect results in memory and hand them to `on_complete` once the whole
+    run succeeded, for outputs that can only be written in one go.
+    """
+    def __init__(self, on_complete):
+        self.on_complete = on_complete
+        self.results = []
+
+    def write(self, result):
+        self.results.append(result)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.on_complete(self.results)
+
+
+class SheetsSink:
+    """
+    Buffer rows and append them to a sheet in chunks of `chunk_size`.
+
+    Results whose key (see `result_key`) is in `skip_keys` are dropped, so
+    a run that resumes after an interruption does not write the rows that
+    the previous attempt already appended, whatever order the files come in
+    and whichever of them failed before. After every chunk `on_flush` is
+    called with the keys of the rows it appended, to checkpoint them.
+
+    Appends are not idempotent: a 5xx or a timeout can arrive after the rows
+    were written. Only quota rejections are retried blindly; after any
+    other retryable error the sheet's row count decides whether the chunk
+    is sent again.
+    """
+    def __init__(self, sheets_service, spreadsheet_id, sheet='Sheet1', skip_keys=(),
+                 replace=False, on_flush=None, chunk_size=SHEETS_CHUNK_SIZE,
+                 max_retries=SHEETS_MAX_RETRIES):
+        self.sheets_service = sheets_service
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet = sheet
+        self.skip_keys = set(skip_keys)
+        self.rows_written = len(self.skip_keys)
+        self.on_flush = on_flush
+        self.chunk_size = max(1, chunk_size)
+        self.max_retries = max_retries
+        self._buffer = []
+        self._keys = []
+        # Rows in the sheet, read before the first append
+        self._sheet_rows = None
+
+        if replace and not self.skip_keys:
+            # A full run replaces the results of earlier runs
+            self._execute(self.sheets_service.spreadsheets().values().clear(
+                spreadsheetId=self.spreadsheet_id, range=self.sheet, body={}
+            ))
+            self._sheet_rows = 0
+            self._buffer.append(OUTPUT_HEADER)
+
+    def write(self, result):
+        key = result_key(result)
+        if key in self.skip_keys:
+            return
+        self._buffer.append(result_row(result))
+        self._keys.append(key)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        self._append(self._buffer)
+        keys, self._buffer, self._keys = self._keys, [], []
+        self.rows_written += len(keys)
+        if self.on_flush:
+            self.on_flush(keys)
+
+    def _append(self, rows):
+        if self._sheet_rows is None:
+            self._sheet_rows = self._row_count()
+        for attempt in range(self.max_retries + 1):
+            try:
+                # Rejected requests wrote nothing and are safe to send again
+                self._execute(self.sheets_service.spreadsheets().values().append(
+                    spreadsheetId=self.spreadsheet_id,
+                    range=f"{self.sheet}!A1",
+                    valueInputOption="RAW",
+                    insertDataOption="INSERT_ROWS",
+                    body={"values": rows}
+                ), retryable=self._is_rejected)
+                break
+            except Exception as e:
+                if attempt == self.max_retries or not self._is_retryable(e):
+                    raise
+                self._backoff(attempt)
+                # The append may have gone through before the error
+                appended = self._row_count() - self._sheet_rows
+                if appended == len(rows):
+                    break
+                if appended != 0:
+                    raise RuntimeError(f"Sheet changed by {appended} rows during an append of "
+                                       f"{len(rows)}; not resending it") from e
+        self._sheet_rows += len(rows)
+
+    def _row_count(self):
+        # Column A holds the filename, which every row has
+        response = self._execute(self.sheets_service.spreadsheets().values().get(
+            spreadsheetId=self.spreadsheet_id, range=f"{self.sheet}!A:A",
+            majorDimension="ROWS"
+        ))
+        return len(response.get('values', []))
+
+    def _execute(self, request, retryable=None):
+        retryable = retryable or self._is_retryable
+        for attempt in range(self.max_retries + 1):
+            try:
+                return request.execute()
+            except Exception as e:
+                if attempt == self.max_retries or not retryable(e):
+                    raise
+                self._backoff(attempt)
+
+    @staticmethod
+    def _backoff(attempt):
+        # Sheets write quotas are per minute, so back off generously
+        time.sleep(random.uniform(0, min(64, 2 ** attempt)))
+
+    @staticmethod
+    def _is_rejected(error):
+        """Errors that mean the request was refused before doing anything"""
+        if not GOOGLE_ERRORS_AVAILABLE or not isinstance(error, errors.HttpError):
+            return False
+        status = error.resp.status
+        if status == 429:
+            return True
+        if status == 403:
+            reasons = {detail.get('reason') for detail in (error.error_details or [])
+                       if isinstance(detail, dict)}
+            return bool(reasons & QUOTA_REASONS)
+        return False
+
+    @classmethod
+    def _is_retryable(cls, error):
+        if cls._is_rejected(error):
+            return True
+        if not GOOGLE_ERRORS_AVAILABLE or not isinstance(error, errors.HttpError):
+            return isinstance(error, OSError)
+        return error.resp.status >= 500
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+            return
+        # Keep whatever finished before the failure so a resumed run can
+        # continue from the checkpoint
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Could not flush buffered rows to Google Sheets: {str(e)}")
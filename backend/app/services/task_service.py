@@ -1,51 +1,124 @@
-from app.config import tasks_collection
-from app.models.task import Task
+from app.config import tasks_collection, TASK_CONCURRENCY
+from app.models.task import Task, TASK_SUMMARY_PROJECTION
+from app.services.job_queue import JobQueue
+from app.services.credential_store import CredentialStore
+from app.services.result_cache import result_cache, key_for_file, key_for_content
+from app.services.extraction_client import get_extraction_client
+from app.services.sinks import CsvSink, CollectingSink, SheetsSink
+from app.services.progress import ProgressTracker, expand_progress
+from app.pagination import fetch_page, parse_fields
+from app.metrics import PIPELINE_FILES, PIPELINE_STAGE_SECONDS, TASK_RUNS, timed
+from app import bulk
 from bson import ObjectId
-import threading
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import time
-import json
 import os
-import requests
-import tempfile
 
-# Import Google API libraries conditionally to avoid errors if not installed
-try:
-    from googleapiclient.discovery import build
-    from googleapiclient.http import MediaFileUpload
-    from google.oauth2 import service_account
-    GOOGLE_APIS_AVAILABLE = True
-except ImportError:
-    GOOGLE_APIS_AVAILABLE = False
+# The Google API libraries are imported on first use, and may be missing
+from app.services.google_clients import (
+    client_cache,
+    DRIVE_SCOPES,
+    SHEETS_SCOPES,
+    GOOGLE_APIS_AVAILABLE
+)
+from app.services.drive_download import download_to_buffer
+from app.services.drive_listing import (
+    iter_folder_files,
+    iter_changed_files,
+    iter_files_by_id,
+    get_start_page_token
+)
+
+if not GOOGLE_APIS_AVAILABLE:
     print("Google API libraries not available. Some features will be limited.")
 
 SERVICE_ACCOUNT_FILE = "config/service_account.json"
 
+# Event streams hold a request worker while open; gunicorn.conf.py turns
+# them off for sync workers, where each would take a whole process.
+# How often a stream checks for changes, and how long one stays open
+# before the client has to reconnect
+SSE_ENABLED = os.environ.get('SSE_ENABLED', 'true').lower() == 'true'
+SSE_POLL_INTERVAL = float(os.environ.get('SSE_POLL_INTERVAL', '1'))
+SSE_MAX_DURATION = float(os.environ.get('SSE_MAX_DURATION', '300'))
+FINISHED_STATUSES = ('completed', 'failed')
+
+# Fields that can be requested with ?fields= on the task list; the
+# credential store reference stays internal
+TASK_FIELDS = {field: field for field in Task('').to_dict() if field != 'credentialsId'}
+
 class TaskService:
     @staticmethod
     def get_all_tasks():
-        try:
-            # Try MongoDB-style sorting
-            tasks = list(tasks_collection.find().sort('createdAt', -1))
-        except TypeError:
-            # Fallback for in-memory store
-            tasks = list(tasks_collection.find())
-            # Sort manually by createdAt if available
-            tasks.sort(key=lambda x: x.get('createdAt', ''), reverse=True)
+        tasks = list(tasks_collection.find({}, TASK_SUMMARY_PROJECTION).sort('createdAt', -1))
+        
+        return [Task.from_dict(task).to_summary() for task in tasks]
+    
+    @staticmethod
+    def get_tasks_page(limit, cursor=None, fields=None):
+        """
+        One page of task summaries, newest first, and the cursor for the next page.
         
-        return [Task.from_dict(task).to_dict() for task in tasks]
+        With `fields`, only those task fields are loaded and returned.
+        """
+        projection = parse_fields(fields, TASK_FIELDS)
+        tasks, next_cursor = fetch_page(tasks_collection, 'createdAt', limit, cursor=cursor,
+                                        projection=projection or TASK_SUMMARY_PROJECTION)
+        if projection is None:
+            tasks = [Task.from_dict(task).to_summary() for task in tasks]
+        return tasks, next_cursor
     
     @staticmethod
     def get_task_by_id(task_id):
         task = tasks_collection.find_one({'_id': task_id})
         if task:
-            return Task.from_dict(task).to_dict()
+            data = TaskService._to_api(Task.from_dict(task))
+            data['progress'] = expand_progress(task.get('progress'))
+            return data
         return None
     
+    @staticmethod
+    def watch_task(task_id, poll_interval=SSE_POLL_INTERVAL, timeout=SSE_MAX_DURATION):
+        """
+        Yield the task's status and progress each time they change, until
+        the task finishes or `timeout` seconds have passed. Yields None on
+        polls without a change, so callers can send keepalives.
+        """
+        deadline = time.monotonic() + timeout
+        last = None
+        while time.monotonic() < deadline:
+            task = tasks_collection.find_one({'_id': task_id}, {'status': 1, 'progress': 1})
+            if not task:
+                return
+            state = (task.get('status'), (task.get('progress') or {}).get('seq'))
+            if state != last:
+                last = state
+                yield {'status': task.get('status'), 'progress': expand_progress(task.get('progress'))}
+                if task.get('status') in FINISHED_STATUSES:
+                    return
+            else:
+                yield None
+            time.sleep(poll_interval)
+    
     @staticmethod
     def create_task(task_data):
-        task = Task.from_dict(task_data)
+        task = TaskService._new_task(task_data)
+        TaskService._store_credentials(task)
         result = tasks_collection.insert_one(task.to_dict())
-        return task.to_dict()
+        return TaskService._to_api(task)
+    
+    @staticmethod
+    def _new_task(task_data):
+        task = Task.from_dict(task_data)
+        # The credential store id is always minted by the server: a client
+        # supplied one would overwrite, and on delete remove, the
+        # credentials of the task it belongs to
+        task.credentials_id = None
+        return task
     
     @staticmethod
     def update_task(task_id, task_data):
@@ -53,55 +126,177 @@ class TaskService:
         if not existing_task:
             return None
         
-        # Preserve the _id and createdAt fields
-        task_data['_id'] = task_id
+        updated_task = TaskService._updated_task(existing_task, task_data)
+        TaskService._store_credentials(updated_task)
+        
+        tasks_collection.update_one({'_id': task_id}, TaskService._update_document(updated_task))
+        return TaskService._to_api(updated_task)
+    
+    @staticmethod
+    def _updated_task(existing_task, task_data):
+        # Preserve the _id, createdAt and credentials reference fields
+        task_data['_id'] = existing_task['_id']
         task_data['createdAt'] = existing_task.get('createdAt')
+        task_data['credentialsId'] = existing_task.get('credentialsId')
         
         updated_task = Task.from_dict(task_data)
-        tasks_collection.update_one(
-            {'_id': task_id},
-            {'$set': updated_task.to_dict()}
-        )
-        return updated_task.to_dict()
+        if not updated_task.google_credentials:
+            # Blank credentials in the form keep the stored ones, including
+            # inline credentials of tasks created before the credential store
+            updated_task.google_credentials = existing_task.get('googleCredentials', '')
+            updated_task.google_api_key = existing_task.get('googleApiKey', '')
+        return updated_task
+    
+    @staticmethod
+    def _update_document(task):
+        return {'$set': task.to_dict(),
+                '$unset': {'googleCredentials': '', 'googleApiKey': ''}}
     
     @staticmethod
     def delete_task(task_id):
+        task = tasks_collection.find_one({'_id': task_id}, {'credentialsId': 1})
         result = tasks_collection.delete_one({'_id': task_id})
+        if task:
+            CredentialStore.delete(task.get('credentialsId'))
         return result.deleted_count > 0
     
     @staticmethod
-    def start_task(task_id):
-        task = tasks_collection.find_one({'_id': task_id})
-        if not task:
-            return False
+    def create_tasks(items):
+        """Create many tasks with one insert; returns per-item results"""
+        results = []
+        tasks = []
+        for i, task_data in enumerate(items):
+            if not isinstance(task_data, dict):
+                results.append({'index': i, 'status': 'error', 'error': 'Task must be an object'})
+                continue
+            tasks.append((i, TaskService._new_task(task_data)))
+        if not tasks:
+            return results
         
-        # Update task status to in_progress
-        tasks_collection.update_one(
-            {'_id': task_id},
-            {'$set': {'status': 'in_progress'}}
-        )
+        TaskService._store_credentials_many([task for _, task in tasks])
+        try:
+            tasks_collection.insert_many([task.to_dict() for _, task in tasks], ordered=False)
+            errors = {}
+        except BulkWriteError as e:
+            errors = bulk.write_errors(e)
         
-        # Start processing in a separate thread
-        thread = threading.Thread(
-            target=TaskService._process_task,
-            args=(task,)
-        )
-        thread.daemon = True
-        thread.start()
+        for position, (i, task) in enumerate(tasks):
+            if position in errors:
+                results.append({'index': i, 'status': 'error', 'id': task._id, 'error': errors[position]})
+            else:
+                results.append({'index': i, 'status': 'created', 'id': task._id})
+        # Credentials saved for tasks that could not be inserted
+        CredentialStore.delete_many([tasks[position][1].credentials_id for position in errors])
+        return results
+    
+    @staticmethod
+    def update_tasks(items):
+        """Update many tasks, given with their _id, in one bulk write"""
+        results = []
+        ids = [bulk.item_object_id(item) for item in items]
+        existing = {
+            task['_id']: task
+            for task in tasks_collection.find({'_id': {'$in': [i for i in ids if i]}})
+        }
+        
+        updates = []
+        for i, (task_id, task_data) in enumerate(zip(ids, items)):
+            if not isinstance(task_data, dict) or not task_id:
+                results.append({'index': i, 'status': 'error', 'error': 'Task must be an object with a valid _id'})
+            elif task_id not in existing:
+                results.append({'index': i, 'status': 'not_found', 'id': task_id})
+            else:
+                updates.append((i, TaskService._updated_task(existing[task_id], dict(task_data))))
+        if not updates:
+            return results
+        
+        TaskService._store_credentials_many([task for _, task in updates])
+        try:
+            tasks_collection.bulk_write([
+                UpdateOne({'_id': task._id}, TaskService._update_document(task))
+                for _, task in updates
+            ], ordered=False)
+            errors = {}
+        except BulkWriteError as e:
+            errors = bulk.write_errors(e)
+        
+        for position, (i, task) in enumerate(updates):
+            if position in errors:
+                results.append({'index': i, 'status': 'error', 'id': task._id, 'error': errors[position]})
+            else:
+                results.append({'index': i, 'status': 'updated', 'id': task._id})
+        return results
+    
+    @staticmethod
+    def delete_tasks(items):
+        """Delete many tasks, given as ids or objects with an _id"""
+        ids = [bulk.item_object_id(item) for item in items]
+        existing = {
+            task['_id']: task.get('credentialsId')
+            for task in tasks_collection.find({'_id': {'$in': [i for i in ids if i]}}, {'credentialsId': 1})
+        }
+        if existing:
+            tasks_collection.delete_many({'_id': {'$in': list(existing)}})
+            CredentialStore.delete_many(existing.values())
         
-        return True
+        results = []
+        for i, task_id in enumerate(ids):
+            if not task_id:
+                results.append({'index': i, 'status': 'error', 'error': 'Missing or invalid task id'})
+            else:
+                status = 'deleted' if task_id in existing else 'not_found'
+                results.append({'index': i, 'status': status, 'id': task_id})
+        return results
+    
+    @staticmethod
+    def _store_credentials(task):
+        """Move submitted secrets into the credential store"""
+        if task.google_credentials or task.google_api_key:
+            task.credentials_id = CredentialStore.save(
+                task.google_credentials, task.google_api_key, task.credentials_id
+            )
+    
+    @staticmethod
+    def _store_credentials_many(tasks):
+        tasks = [task for task in tasks if task.google_credentials or task.google_api_key]
+        ids = CredentialStore.save_many([
+            (task.google_credentials, task.google_api_key, task.credentials_id) for task in tasks
+        ])
+        for task, credentials_id in zip(tasks, ids):
+            task.credentials_id = credentials_id
+    
+    @staticmethod
+    def _to_api(task):
+        data = task.to_dict()
+        del data['credentialsId']
+        data['hasCredentials'] = bool(task.credentials_id or task.google_credentials)
+        return data
+    
+    @staticmethod
+    def start_task(task_id, full_rescan=False):
+        if full_rescan:
+            # Forget the change cursor so the whole folder is processed again
+            tasks_collection.update_one({'_id': task_id}, {'$set': {'driveCursor': None}})
+        
+        # Queue the task; a worker from the pool picks it up and sets it to in_progress
+        return JobQueue.enqueue(task_id)
     
     @staticmethod
     def _process_task(task):
+        next_page_token = None
+        cursor = None
+        progress = ProgressTracker(task['_id'])
         try:
-            # Convert task dictionary to Task object
-            task_obj = Task.from_dict(task)
+            # Convert task dictionary to Task object and load its credentials
+            task_obj = CredentialStore.attach(Task.from_dict(task))
             
             # Process files from Google Drive
             if task_obj.source_type == 'google_drive':
                 if not GOOGLE_APIS_AVAILABLE:
                     # Simulate processing if Google APIs are not available
                     time.sleep(2)
+                    progress.add('listed', 2)
+                    progress.stage('processing')
                     results = [
                         {
                             'filename': 'sample_document_1.jpg',
@@ -113,41 +308,44 @@ class TaskService:
                         }
                     ]
                 else:
-                    # Get files from Google Drive
-                    files = TaskService._get_files_from_google_drive(task_obj)
+                    # Take the new change cursor before listing so that files
+                    # changed while this run is in progress are seen next time
+                    cursor = TaskService._get_drive_cursor(task)
+                    next_page_token = TaskService._get_drive_start_page_token()
                     
-                    # Process each file
-                    results = []
-                    for file in files:
-                        # Download the file
-                        file_content = TaskService._download_file(file, task_obj)
-                        
-                        # Process the file using external API
-                        processed_content = TaskService._process_file_with_external_api(file_content)
-                        
-                        # Add to results
-                        results.append({
-                            'filename': file['name'],
-                            'content': processed_content
-                        })
+                    # Files are listed page by page and processed as they arrive.
+                    # The cursor moves past files that failed last time, so
+                    # incremental runs fetch those again by id
+                    retry_ids = [f['fileId'] for f in task.get('failedFiles') or [] if f.get('fileId')]
+                    files = progress.track_listing(
+                        TaskService._get_files_from_google_drive(task_obj, cursor, retry_ids)
+                    )
+                    
+                    # Download and process the files on a bounded worker pool
+                    results = TaskService._process_files(files, task_obj, progress)
                 
-                # Save results to output destination
-                if task_obj.output_type == 'google_sheets':
-                    if GOOGLE_APIS_AVAILABLE:
-                        TaskService._save_to_google_sheets(results, task_obj)
-                    else:
-                        print(f"Would save to Google Sheets: {results}")
-                elif task_obj.output_type == 'csv':
-                    TaskService._save_to_csv(results, task_obj)
+                # Stream results into the output as they arrive
+                TaskService._write_results(results, task_obj, append=bool(cursor), progress=progress)
+            
+            progress.stage('completed')
             
             # Update task status to completed
+            update = {'status': 'completed'}
+            if next_page_token:
+                update['driveCursor'] = {
+                    'folderId': task_obj.source_path,
+                    'startPageToken': next_page_token
+                }
             tasks_collection.update_one(
                 {'_id': task_obj._id},
-                {'$set': {'status': 'completed'}}
+                {'$set': update}
             )
+            TASK_RUNS.inc(status='completed')
             
         except Exception as e:
             print(f"Error processing task: {str(e)}")
+            progress.stage('failed')
+            TASK_RUNS.inc(status='failed')
             # Update task status to failed
             tasks_collection.update_one(
                 {'_id': task['_id']},
@@ -155,61 +353,187 @@ class TaskService:
             )
     
     @staticmethod
-    def _get_files_from_google_drive(task):
-        if not GOOGLE_APIS_AVAILABLE:
-            return []
-            
-        # Parse Google credentials
-        credentials_info = SERVICE_ACCOUNT_FILE
-        credentials = service_account.Credentials.from_service_account_file(
-            credentials_info,
-            scopes=['https://www.googleapis.com/auth/drive.readonly']
-        )
-        
-        # Build the Drive API client
-        drive_service = build('drive', 'v3', credentials=credentials)
+    def _process_files(files, task, progress=None):
+        """
+        Download and extract files concurrently, yielding results in input order.
         
-        # List files in the specified folder
-        results = drive_service.files().list(
-            q=f"'{task.source_path}' in parents and mimeType contains 'application/pdf'",
-            fields="files(id, name, mimeType)"
-        ).execute()
+        `files` may be a generator; files are submitted as soon as they are
+        listed, and only a small window of results is held at any time.
+        """
+        concurrency = max(1, int(task.concurrency or TASK_CONCURRENCY))
+        window = concurrency * 2
+        with ThreadPoolExecutor(max_workers=concurrency,
+                                thread_name_prefix=f"task-{task._id}") as executor:
+            pending = deque()
+            for file in files:
+                pending.append(executor.submit(TaskService._process_file, file, task, progress))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    
+    @staticmethod
+    def _write_results(results, task, append=False, progress=None):
+        """
+        Write successful results to the task output and record per-file
+        failures and cache statistics on the task.
+        """
+        failed_files = []
+        cache_hits = 0
+        written = 0
+        with TaskService._open_sink(task, append) as sink:
+            for result in results:
+                if 'error' in result:
+                    failed_files.append({'fileId': result.get('fileId'), 'filename': result['filename'],
+                                         'error': result['error']})
+                    if progress:
+                        progress.add('failed')
+                    continue
+                if result.get('cached'):
+                    cache_hits += 1
+                with timed(PIPELINE_STAGE_SECONDS, stage='write'):
+                    sink.write(result)
+                written += 1
+                if progress:
+                    progress.add('written')
         
-        return results.get('files', [])
+        tasks_collection.update_one(
+            {'_id': task._id},
+            {'$set': {
+                'failedFiles': failed_files,
+                'cacheHits': cache_hits,
+                'cacheMisses': written - cache_hits
+            }}
+        )
+    
+    @staticmethod
+    def _open_sink(task, append=False):
+        if task.output_type == 'csv':
+            return CsvSink(task.output_path, append=append)
+        if task.output_type == 'google_sheets' and GOOGLE_APIS_AVAILABLE:
+            return TaskService._open_sheets_sink(task, append)
+        return CollectingSink(lambda results: print(f"Would save to {task.output_type}: {results}"))
+    
+    @staticmethod
+    def _process_file(file, task, progress=None):
+        try:
+            # Drive metadata is enough to find a cached result without downloading
+            cache_key = key_for_file(file) if result_cache else None
+            processed_content = result_cache.get(cache_key) if cache_key else None
+            if processed_content is not None:
+                if progress:
+                    progress.add('extracted')
+                PIPELINE_FILES.inc(result='cached')
+                return {
+                    'fileId': file.get('id'),
+                    'filename': file['name'],
+                    'content': processed_content,
+                    'cached': True
+                }
+            
+            # Download the file and process it using external API
+            with TaskService._download_file(file, task) as file_content:
+                if progress:
+                    progress.add('downloaded')
+                if result_cache and not cache_key and file_content is not None:
+                    cache_key = key_for_content(file_content)
+                    processed_content = result_cache.get(cache_key)
+                
+                cached = processed_content is not None
+                if not cached:
+                    with timed(PIPELINE_STAGE_SECONDS, stage='extract'):
+                        processed_content = TaskService._process_file_with_external_api(file_content)
+                    if cache_key:
+                        result_cache.set(cache_key, processed_content)
+                if progress:
+                    progress.add('extracted')
+            
+            PIPELINE_FILES.inc(result='cached' if cached else 'extracted')
+            return {
+                'fileId': file.get('id'),
+                'filename': file['name'],
+                'content': processed_content,
+                'cached': cached
+            }
+        except Exception as e:
+            # A single bad file should not abort the whole task
+            print(f"Error processing file {file.get('name')}: {str(e)}")
+            PIPELINE_FILES.inc(result='failed')
+            return {
+                'fileId': file.get('id'),
+                'filename': file.get('name', ''),
+                'error': str(e)
+            }
+    
+    @staticmethod
+    def _get_drive_cursor(task):
+        """Saved changes token, if the last successful run used the same folder"""
+        cursor = task.get('driveCursor') or {}
+        if cursor.get('folderId') == task.get('sourcePath'):
+            return cursor.get('startPageToken')
+        return None
+    
+    @staticmethod
+    def _get_drive_start_page_token():
+        with client_cache.client('drive', 'v3', DRIVE_SCOPES,
+                                 credentials_file=SERVICE_ACCOUNT_FILE) as drive_service:
+            return get_start_page_token(drive_service)
+    
+    @staticmethod
+    def _get_files_from_google_drive(task, cursor=None, retry_ids=()):
+        """
+        Yield the PDFs in the task folder, or only the ones changed since
+        cursor together with the `retry_ids` files that failed before.
+        """
+        if not GOOGLE_APIS_AVAILABLE:
+            return
+            
+        # Get a cached Drive API client for the service account
+        with client_cache.client('drive', 'v3', DRIVE_SCOPES,
+                                 credentials_file=SERVICE_ACCOUNT_FILE) as drive_service:
+            if cursor:
+                seen = set()
+                for file in iter_changed_files(drive_service, task.source_path, cursor):
+                    seen.add(file['id'])
+                    yield file
+                retry_ids = [file_id for file_id in dict.fromkeys(retry_ids) if file_id not in seen]
+                yield from iter_files_by_id(drive_service, task.source_path, retry_ids)
+            else:
+                yield from iter_folder_files(drive_service, task.source_path)
     
     @staticmethod
+    @contextmanager
     def _download_file(file, task):
+        """
+        Yield the file content as a binary buffer that is closed afterwards.
+        """
         if not GOOGLE_APIS_AVAILABLE:
-            return None
+            yield None
+            return
             
-        # Parse Google credentials
-        credentials_info = json.loads(task.google_credentials)
-        credentials = service_account.Credentials.from_service_account_info(
-            credentials_info,
-            scopes=['https://www.googleapis.com/auth/drive.readonly']
-        )
-        
-        # Build the Drive API client
-        drive_service = build('drive', 'v3', credentials=credentials)
+        # Get a cached Drive API client for the task credentials and
+        # stream the file into a spooled buffer
+        with client_cache.client('drive', 'v3', DRIVE_SCOPES,
+                                 credentials_json=task.google_credentials) as drive_service:
+            with timed(PIPELINE_STAGE_SECONDS, stage='download'):
+                buffer = download_to_buffer(drive_service, file['id'])
         
-        # Download the file
-        request = drive_service.files().get_media(fileId=file['id'])
-        
-        # Create a temporary file to store the downloaded content
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            downloader = MediaFileUpload(temp_file.name, resumable=True)
-            downloader.resumable_progress = 0
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-            
-            # Return the path to the temporary file
-            return temp_file.name
+        try:
+            yield buffer
+        finally:
+            buffer.close()
     
     @staticmethod
-    def _process_file_with_external_api(file_path):
-        # This is a placeholder for the external API call
-        # In a real implementation, you would send the file to an OCR or document processing API
+    def _process_file_with_external_api(file_content):
+        # Send the document to the extraction API when one is configured.
+        # Calls from concurrent file workers are batched and rate limited
+        # by the shared client.
+        client = get_extraction_client()
+        if client is not None:
+            data = file_content.read() if hasattr(file_content, 'read') else file_content
+            return client.extract(data)
+        
+        # Without an extraction API, fall back to a placeholder
         # For demonstration purposes, we'll just return some dummy data
         
         # Simulate API processing time
@@ -226,20 +550,32 @@ class TaskService:
         }
     
     @staticmethod
-    def _save_to_google_sheets(results, task):
-        if not GOOGLE_APIS_AVAILABLE:
-            return
-            
-        # Parse Google credentials
-        credentials_info = json.loads(task.google_credentials)
-        credentials = service_account.Credentials.from_service_account_info(
-            credentials_info,
-            scopes=['https://www.googleapis.com/auth/spreadsheets']
-        )
-        
-        # Build the Sheets API client
-        sheets_service = build('sheets', 'v4', credentials=credentials)
+    @contextmanager
+    def _open_sheets_sink(task, append=False):
+        """
+        Yield a SheetsSink that checkpoints the files it has written on the task.
+        """
+        # Files already appended by an interrupted attempt of this run
+        task_doc = tasks_collection.find_one({'_id': task._id}, {'outputWrittenFiles': 1}) or {}
+        written_files = task_doc.get('outputWrittenFiles') or []
         
+        # Get a cached Sheets API client for the task credentials
+        with client_cache.client('sheets', 'v4', SHEETS_SCOPES,
+                                 credentials_json=task.google_credentials) as sheets_service:
+            spreadsheet_id = TaskService._get_or_create_spreadsheet(sheets_service, task)
+            
+            def checkpoint(keys):
+                tasks_collection.update_one(
+                    {'_id': task._id},
+                    {'$push': {'outputWrittenFiles': {'$each': keys}}}
+                )
+            
+            with SheetsSink(sheets_service, spreadsheet_id, skip_keys=written_files,
+                            replace=not append, on_flush=checkpoint) as sink:
+                yield sink
+    
+    @staticmethod
+    def _get_or_create_spreadsheet(sheets_service, task):
         # Check if the spreadsheet exists, if not create it
         spreadsheet_id = task.output_path
         if not spreadsheet_id or spreadsheet_id == "":
@@ -250,47 +586,26 @@ class TaskService:
                 }
             ).execute()
             spreadsheet_id = spreadsheet['spreadsheetId']
+            task.output_path = spreadsheet_id
             
             # Update the task with the new spreadsheet ID
             tasks_collection.update_one(
                 {'_id': task._id},
                 {'$set': {'outputPath': spreadsheet_id}}
             )
+        return spreadsheet_id
+    
+    @staticmethod
+    def _save_to_google_sheets(results, task):
+        if not GOOGLE_APIS_AVAILABLE:
+            return
         
-        # Prepare data for the spreadsheet
-        values = [
-            ["Filename", "Name", "Date", "Address", "Full Text"]
-        ]
-        
-        for result in results:
-            values.append([
-                result['filename'],
-                result['content']['fields'].get('name', ''),
-                result['content']['fields'].get('date', ''),
-                result['content']['fields'].get('address', ''),
-                result['content']['text']
-            ])
-        
-        # Update the spreadsheet
-        sheets_service.spreadsheets().values().update(
-            spreadsheetId=spreadsheet_id,
-            range="Sheet1!A1",
-            valueInputOption="RAW",
-            body={"values": values}
-        ).execute()
+        with TaskService._open_sheets_sink(task) as sink:
+            for result in results:
+                sink.write(result)
     
     @staticmethod
     def _save_to_csv(results, task):
-        # Create CSV content
-        csv_content = "Filename,Name,Date,Address,Full Text\n"
-        
-        for result in results:
-            csv_content += f"{result['filename']},"
-            csv_content += f"{result['content']['fields'].get('name', '')},"
-            csv_content += f"{result['content']['fields'].get('date', '')},"
-            csv_content += f"{result['content']['fields'].get('address', '')},"
-            csv_content += f"{result['content']['text']}\n"
-        
-        # Write to file
-        with open(task.output_path, 'w') as f:
-            f.write(csv_content) 
\ No newline at end of file
+        with CsvSink(task.output_path) as sink:
+            for result in results:
+                sink.write(result)
@@ -0,0 +1,27 @@
+"""
+Questionnaire statistics maintenance.
+
+Recomputes the aggregate statistics from the stored responses, e.g. after
+changing how they are counted or to repair them:
+
+    python -m app.stats                      # all questionnaires
+    python -m app.stats --questionnaire ID   # one questionnaire
+"""
+import argparse
+import time
+
+from app.services.questionnaire_stats import QuestionnaireStats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild questionnaire statistics from responses")
+    parser.add_argument('--questionnaire', help="only rebuild this questionnaire")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    rebuilt = QuestionnaireStats.rebuild(args.questionnaire)
+    print(f"Rebuilt statistics for {rebuilt} questionnaire(s) in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Standalone task worker.
+
+Runs the task worker pool without the API so workers can be scaled
+separately, e.g. with RUN_EMBEDDED_WORKERS=false on the API process:
+
+    python -m app.worker --concurrency 4
+"""
+import argparse
+import signal
+import threading
+
+from app.config import WORKER_CONCURRENCY, WORKER_POLL_INTERVAL
+from app.services.job_queue import WorkerPool
+from app.services.task_service import TaskService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run document processing task workers")
+    parser.add_argument('--concurrency', type=int, default=WORKER_CONCURRENCY,
+                        help="number of tasks processed at the same time")
+    parser.add_argument('--poll-interval', type=float, default=WORKER_POLL_INTERVAL,
+                        help="seconds between queue polls when idle")
+    args = parser.parse_args()
+
+    pool = WorkerPool(TaskService._process_task, concurrency=args.concurrency,
+                      poll_interval=args.poll_interval)
+    shutdown = threading.Event()
+
+    def handle_signal(signum, frame):
+        print("Shutting down, waiting for running tasks to finish...")
+        shutdown.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    pool.start()
+    shutdown.wait()
+    pool.stop()
+
+
+if __name__ == '__main__':
+    main()
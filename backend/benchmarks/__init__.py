@@ -0,0 +1,12 @@
+"""
+Benchmarks for the task pipeline, the list endpoints and questionnaire
+deployments, run against in-process fakes of Google Drive and Sheets, the
+extraction API and Brainbase.
+
+    python -m benchmarks.run                      # every scenario
+    python -m benchmarks.run task_1k_files --scale 0.1
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --output after.json --compare before.json
+
+See `benchmarks.scenarios` for the scenarios and their parameters.
+"""
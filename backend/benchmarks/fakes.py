@@ -0,0 +1,236 @@
+"""
+In-process stand-ins for the external services.
+
+The fakes sit at the transport level so the code under test runs as in
+production: Google API clients are built from the bundled discovery
+documents on a fake httplib2 transport, and the extraction client posts
+its batches to a fake session. Every fake has a `latency` (seconds per
+call) and an `error_rate` (probability that a call fails with a 503).
+"""
+from contextlib import contextmanager
+from urllib.parse import parse_qs, unquote, urlsplit
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+import httplib2
+from googleapiclient.discovery import build
+
+from app.services.extraction_client import ExtractionClient
+
+FOLDER_QUERY = re.compile(r"'([^']+)' in parents")
+MODIFIED_TIME = '2025-01-01T00:00:00.000Z'
+
+
+class FakeGoogleAPI:
+    """
+    httplib2-compatible transport answering the Drive and Sheets calls
+    the task pipeline makes.
+
+    Every folder holds `files_per_folder` PDFs of `file_size` bytes.
+    Errors are only injected into media downloads and sheet appends, the
+    calls the pipeline retries; listings always succeed.
+    """
+    def __init__(self, files_per_folder=100, file_size=64 * 1024, latency=0.0,
+                 error_rate=0.0, seed=None):
+        self.files_per_folder = files_per_folder
+        self.file_size = file_size
+        self.latency = latency
+        self.error_rate = error_rate
+        # Checksums differ per instance, so persistent result caches stay cold
+        self.namespace = uuid.uuid4().hex
+        self.content = (b'%PDF-1.4\n' + b'0' * file_size)[:file_size]
+        self.requests = 0
+        self.errors = 0
+        self.rows_appended = 0
+        # Rows per spreadsheet, for the row count read by SheetsSink
+        self.sheet_rows = {}
+        self._spreadsheets = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        url = urlsplit(uri)
+        path = unquote(url.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if path == '/drive/v3/files':
+            return self._list(query)
+        if path.startswith('/drive/v3/files/') and query.get('alt') == 'media':
+            return self._inject_error() or self._download(path.rsplit('/', 1)[1], headers or {})
+        if path.startswith('/drive/v3/files/'):
+            return self._get(path.rsplit('/', 1)[1])
+        if path == '/drive/v3/changes/startPageToken':
+            return self._json({'startPageToken': '1'})
+        if path == '/drive/v3/changes':
+            return self._json({'changes': [], 'newStartPageToken': '1'})
+        if path == '/v4/spreadsheets' and method == 'POST':
+            with self._lock:
+                self._spreadsheets += 1
+                return self._json({'spreadsheetId': f"fake-sheet-{self._spreadsheets}"})
+        if path.endswith(':append'):
+            return self._inject_error() or self._append(path, body)
+        if path.endswith(':clear'):
+            with self._lock:
+                self.sheet_rows[self._spreadsheet_id(path)] = 0
+            return self._json({})
+        if path.startswith('/v4/spreadsheets/') and '/values/' in path and method == 'GET':
+            rows = self.sheet_rows.get(self._spreadsheet_id(path), 0)
+            return self._json({'values': [['row']] * rows} if rows else {})
+        return self._json({'error': {'code': 404, 'message': f"No fake for {method} {path}"}}, 404)
+
+    def _list(self, query):
+        match = FOLDER_QUERY.search(query.get('q', ''))
+        folder_id = match.group(1) if match else ''
+        start = int(query.get('pageToken') or 0)
+        end = min(start + int(query.get('pageSize', 100)), self.files_per_folder)
+        page = {'files': [self._file(folder_id, i) for i in range(start, end)]}
+        if end < self.files_per_folder:
+            page['nextPageToken'] = str(end)
+        return self._json(page)
+
+    def _get(self, file_id):
+        folder_id, _, index = file_id.rpartition('-')
+        if not index.isdigit() or int(index) >= self.files_per_folder:
+            return self._json({'error': {'code': 404, 'message': f"File not found: {file_id}"}}, 404)
+        return self._json(self._file(folder_id, int(index)))
+
+    def _file(self, folder_id, i):
+        file_id = f"{folder_id}-{i}"
+        return {
+            'id': file_id,
+            'name': f"document-{i}.pdf",
+            'mimeType': 'application/pdf',
+            'parents': [folder_id],
+            'trashed': False,
+            'md5Checksum': hashlib.md5(f"{self.namespace}:{file_id}".encode()).hexdigest(),
+            'modifiedTime': MODIFIED_TIME
+        }
+
+    def _download(self, file_id, headers):
+        total = len(self.content)
+        start, end = 0, total - 1
+        match = re.match(r'bytes=(\d+)-(\d+)', headers.get('range', ''))
+        if match:
+            start, end = int(match.group(1)), min(int(match.group(2)), total - 1)
+        response = httplib2.Response({
+            'status': '206',
+            'content-type': 'application/pdf',
+            'content-range': f"bytes {start}-{end}/{total}"
+        })
+        return response, self.content[start:end + 1]
+
+    @staticmethod
+    def _spreadsheet_id(path):
+        return path.split('/')[3]
+
+    def _append(self, path, body):
+        rows = len(json.loads(body or '{}').get('values', []))
+        with self._lock:
+            self.rows_appended += rows
+            spreadsheet_id = self._spreadsheet_id(path)
+            self.sheet_rows[spreadsheet_id] = self.sheet_rows.get(spreadsheet_id, 0) + rows
+        return self._json({'updates': {'updatedRows': rows}})
+
+    def _inject_error(self):
+        if not self.error_rate:
+            return None
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return None
+            self.errors += 1
+        return self._json({'error': {'code': 503, 'message': 'Fake backend error'}}, 503)
+
+    @staticmethod
+    def _json(data, status=200):
+        response = httplib2.Response({'status': str(status), 'content-type': 'application/json'})
+        return response, json.dumps(data).encode('utf-8')
+
+
+class FakeClientCache:
+    """
+    Drop-in for `google_clients.client_cache` that hands out clients on a
+    FakeGoogleAPI transport instead of authorizing real credentials.
+    """
+    def __init__(self, google):
+        self.google = google
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def client(self, api, version, scopes, credentials_json=None, credentials_file=None):
+        key = (api, version)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            service = idle.pop() if idle else None
+        if service is None:
+            service = build(api, version, http=self.google, cache_discovery=False,
+                            static_discovery=True)
+        try:
+            yield service
+        finally:
+            with self._lock:
+                self._idle[key].append(service)
+
+
+class FakeResponse:
+    def __init__(self, status_code, data, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._data = data
+        self.text = json.dumps(data)
+
+    def json(self):
+        return self._data
+
+
+class FakeExtractionAPI:
+    """
+    `requests.Session` stand-in for the extraction API. A batch takes
+    `latency` plus `per_document` seconds for each document in it.
+    """
+    def __init__(self, latency=0.05, per_document=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.per_document = per_document
+        self.error_rate = error_rate
+        self.batches = 0
+        self.documents = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        documents = (json or {}).get('documents', [])
+        time.sleep(self.latency + self.per_document * len(documents))
+        with self._lock:
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors += 1
+                return FakeResponse(503, {'error': 'Fake backend error'})
+            self.batches += 1
+            self.documents += len(documents)
+        return FakeResponse(200, {'results': [
+            {
+                'id': document['id'],
+                'text': f"Extracted text of document {document['id']}",
+                'fields': {'bytes': len(base64.b64decode(document['content']))}
+            }
+            for document in documents
+        ]})
+
+
+def fake_extraction_client(api, **kwargs):
+    """An ExtractionClient, with its batching and rate limits, posting to `api`"""
+    client = ExtractionClient(url='http://extraction.invalid/extract', **kwargs)
+    client._ensure_started()
+    # The session is created on the client's loop thread; swap it for the fake
+    client._session = api
+    return client
@@ -0,0 +1,118 @@
+"""
+Run benchmark scenarios and write the results as JSON.
+
+Every scenario runs in its own process, so peak RSS and module state are
+per scenario. Results carry the git commit, so files from different
+commits can be compared with --compare.
+"""
+from datetime import datetime
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+
+
+def parse_overrides(pairs):
+    overrides = {}
+    for pair in pairs:
+        key, _, value = pair.partition('=')
+        try:
+            overrides[key] = json.loads(value)
+        except ValueError:
+            overrides[key] = value
+    return overrides
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_logged_to_stderr(name, params):
+    # The app logs with print, also while being imported; keep that out of stdout
+    sys.stdout = sys.stderr
+    from benchmarks.scenarios import run_scenario
+    return run_scenario(name, params)
+
+
+def run_isolated(name, params):
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(run_logged_to_stderr, (name, params))
+
+
+def compare(results, baseline, out):
+    """Print throughput and p99 changes against a baseline results file"""
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'}:", file=out)
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous or 'error' in current or 'error' in previous:
+            continue
+        changes = []
+        if previous.get('docs_per_second'):
+            change = current['docs_per_second'] / previous['docs_per_second'] - 1
+            changes.append(f"docs/s {change * 100:+.1f}%")
+        p99, previous_p99 = current['latency_ms']['p99'], previous['latency_ms']['p99']
+        if p99 is not None and previous_p99:
+            changes.append(f"p99 {(p99 / previous_p99 - 1) * 100:+.1f}%")
+        print(f"  {name}: {', '.join(changes)}", file=out)
+
+
+def main():
+    # Only the results go to stdout; the app logs with print
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    from benchmarks.scenarios import SCENARIOS, scenario_params
+
+    parser = argparse.ArgumentParser(description="Run backend benchmarks against local fakes")
+    parser.add_argument('scenarios', nargs='*',
+                        help=f"scenarios to run (default: all): {', '.join(SCENARIOS)}")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="multiply the number of files, tasks and documents")
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help="override a scenario parameter, e.g. google_error_rate=0.01")
+    parser.add_argument('--output', help="write the JSON results to this file")
+    parser.add_argument('--compare', metavar='FILE', help="results file to compare against")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(sorted(unknown))}")
+
+    overrides = parse_overrides(args.set)
+    results = {
+        'commit': git_commit(),
+        'created_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'scale': args.scale,
+        'scenarios': {}
+    }
+    for name in args.scenarios or SCENARIOS:
+        params = scenario_params(name, args.scale, overrides)
+        print(f"Running {name} {json.dumps(params)}", file=sys.stderr)
+        try:
+            results['scenarios'][name] = run_isolated(name, params)
+        except Exception as e:
+            print(f"Scenario {name} failed: {str(e)}", file=sys.stderr)
+            results['scenarios'][name] = {'params': params, 'error': str(e)}
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output, file=stdout)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f), stdout)
+
+
+if __name__ == '__main__':
+    main()
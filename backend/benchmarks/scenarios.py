@@ -0,0 +1,391 @@
+"""
+Benchmark scenarios. Each one sets up its fakes and data in a fresh
+process, runs, and returns a result with its throughput (`docs_per_second`,
+in the scenario's `unit`), latency percentiles and peak RSS.
+
+Parameters listed in SIZE_PARAMS are multiplied by --scale; any parameter
+can be overridden with --set name=value.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from time import perf_counter
+import math
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+from bson import ObjectId
+
+from app import create_app
+from app.config import USE_MONGODB, tasks_collection
+from app.metrics import PIPELINE_STAGE_SECONDS
+from app.models.task import Task
+from app.services import job_queue, task_service
+from app.services.job_queue import WorkerPool
+from app.services.progress import expand_progress
+from app.services.task_service import TaskService
+from benchmarks.fakes import (
+    FakeClientCache,
+    FakeExtractionAPI,
+    FakeGoogleAPI,
+    fake_extraction_client
+)
+
+# Parameters scaled by --scale
+SIZE_PARAMS = {'files', 'tasks', 'docs', 'pages', 'starts', 'questionnaires'}
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def latency_summary(seconds):
+    ms = [s * 1000 for s in seconds]
+    return {
+        'count': len(ms),
+        'p50': _round(percentile(ms, 50)),
+        'p99': _round(percentile(ms, 99)),
+        'max': _round(max(ms) if ms else None)
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def result(unit, docs, elapsed, latencies, **extra):
+    return dict(
+        unit=unit,
+        docs=docs,
+        elapsed_seconds=_round(elapsed),
+        docs_per_second=_round(docs / elapsed if elapsed else 0),
+        latency_ms=latency_summary(latencies),
+        peak_rss_mb=peak_rss_mb(),
+        **extra
+    )
+
+
+def _round(value, digits=3):
+    return round(value, digits) if value is not None else None
+
+
+def use_memory_questionnaires():
+    """
+    Questionnaires always live in MongoDB; without USE_MONGODB, keep them
+    and their deployments in memory for the run.
+    """
+    if USE_MONGODB:
+        return
+    from app.memory_store import InMemoryCollection, DESCENDING
+    from app.models import questionnaire
+    from app.routes import questionnaire_routes
+    from app.services import deployment_registry, questionnaire_service
+
+    collection = InMemoryCollection('questionnaires')
+    collection.create_index([('created_at', DESCENDING), ('_id', DESCENDING)])
+    for module in (questionnaire, questionnaire_routes, questionnaire_service):
+        module.questionnaire_collection = collection
+    deployment_registry.flow_deployments_collection = InMemoryCollection('flow_deployments')
+
+
+def install_pipeline_fakes(files_per_folder, params):
+    google = FakeGoogleAPI(
+        files_per_folder=files_per_folder,
+        file_size=params['file_size'],
+        latency=params['google_latency'],
+        error_rate=params['google_error_rate']
+    )
+    extraction = FakeExtractionAPI(
+        latency=params['extraction_latency'],
+        per_document=params['extraction_per_document'],
+        error_rate=params['extraction_error_rate']
+    )
+    client = fake_extraction_client(extraction)
+    task_service.client_cache = FakeClientCache(google)
+    task_service.get_extraction_client = lambda: client
+    return google, extraction
+
+
+def time_process_file(latencies):
+    """Record how long each file takes from download to extracted result"""
+    process_file = TaskService._process_file
+
+    def timed_process_file(*args, **kwargs):
+        started = perf_counter()
+        try:
+            return process_file(*args, **kwargs)
+        finally:
+            latencies.append(perf_counter() - started)
+
+    TaskService._process_file = staticmethod(timed_process_file)
+
+
+def create_tasks(count, concurrency=None):
+    ids = []
+    for i in range(count):
+        task = TaskService.create_task({
+            'name': f"Benchmark task {i}",
+            'sourceType': 'google_drive',
+            'sourcePath': f"folder-{i}",
+            'outputType': 'google_sheets',
+            'googleCredentials': '{"type": "service_account"}',
+            'concurrency': concurrency
+        })
+        ids.append(task['_id'])
+    return ids
+
+
+def task_outcome(task_ids):
+    statuses = Counter()
+    written = failed = 0
+    for task in tasks_collection.find({'_id': {'$in': task_ids}}, {'status': 1, 'progress': 1}):
+        statuses[task.get('status')] += 1
+        progress = expand_progress(task.get('progress')) or {}
+        written += progress.get('written', 0)
+        failed += progress.get('failed', 0)
+    return dict(statuses), written, failed
+
+
+def stage_times():
+    """Calls and mean time per pipeline stage"""
+    return {
+        stage: {'calls': count, 'mean_ms': _round(total / count * 1000)}
+        for (stage,), (count, total) in PIPELINE_STAGE_SECONDS.snapshot().items()
+        if count
+    }
+
+
+PIPELINE_DEFAULTS = {
+    'concurrency': None,
+    'file_size': 64 * 1024,
+    'google_latency': 0.02,
+    'google_error_rate': 0.0,
+    'extraction_latency': 0.05,
+    'extraction_per_document': 0.002,
+    'extraction_error_rate': 0.0,
+}
+
+
+def task_1k_files(params):
+    """One task over a Drive folder of `files` PDFs, written to a sheet"""
+    google, extraction = install_pipeline_fakes(params['files'], params)
+    latencies = []
+    time_process_file(latencies)
+    task_id = create_tasks(1, params['concurrency'])[0]
+
+    started = perf_counter()
+    TaskService._process_task(tasks_collection.find_one({'_id': task_id}))
+    elapsed = perf_counter() - started
+
+    statuses, written, failed = task_outcome([task_id])
+    return result(
+        'files', written, elapsed, latencies,
+        tasks=statuses, failed=failed, stages=stage_times(),
+        google_requests=google.requests, google_errors=google.errors,
+        extraction_batches=extraction.batches, extraction_errors=extraction.errors
+    )
+
+
+def concurrent_tasks(params):
+    """`tasks` tasks of `files` files each, queued at once and run by the worker pool"""
+    google, extraction = install_pipeline_fakes(params['files'], params)
+    task_ids = create_tasks(params['tasks'], params['concurrency'])
+    job_queue.QUEUE_MAX_DEPTH = max(job_queue.QUEUE_MAX_DEPTH, len(task_ids))
+
+    queued = {}
+    finished = {}
+    done = threading.Event()
+
+    def process_task(task):
+        TaskService._process_task(task)
+        finished[task['_id']] = perf_counter()
+        if len(finished) == len(task_ids):
+            done.set()
+
+    pool = WorkerPool(process_task, concurrency=params['workers'] or len(task_ids),
+                      poll_interval=0.05)
+    pool.start()
+    started = perf_counter()
+    for task_id in task_ids:
+        queued[task_id] = perf_counter()
+        TaskService.start_task(task_id)
+    timed_out = not done.wait(params['timeout'])
+    elapsed = perf_counter() - started
+    pool.stop(timeout=5)
+
+    statuses, written, failed = task_outcome(task_ids)
+    return result(
+        'files', written, elapsed,
+        [finished[task_id] - queued[task_id] for task_id in finished],
+        latency_of='task, queued to finished',
+        tasks=statuses, failed=failed, timed_out=timed_out, stages=stage_times(),
+        google_requests=google.requests, google_errors=google.errors,
+        extraction_batches=extraction.batches, extraction_errors=extraction.errors
+    )
+
+
+def list_50k(params):
+    """Task and questionnaire list endpoints over `docs` stored documents each"""
+    use_memory_questionnaires()
+    from app.models.questionnaire import Questionnaire, QuestionBase
+    from app.models import questionnaire
+
+    docs = params['docs']
+    created = datetime.utcnow() - timedelta(seconds=docs)
+    tasks_collection.insert_many([
+        Task(f"Task {i}", source_path=f"folder-{i}",
+             created_at=(created + timedelta(seconds=i)).isoformat()).to_dict()
+        for i in range(docs)
+    ])
+    questions = [QuestionBase(text=f"Question {n}", type='rating') for n in range(5)]
+    questionnaire.questionnaire_collection.insert_many([
+        Questionnaire(title=f"Questionnaire {i}", questions=questions,
+                      created_at=created + timedelta(seconds=i)).to_mongo()
+        for i in range(docs)
+    ])
+
+    client = create_app().test_client()
+    endpoints = {}
+
+    def request(name, url, query):
+        started = perf_counter()
+        response = client.get(url, query_string=query)
+        seconds = perf_counter() - started
+        body = response.get_json()
+        items = body if isinstance(body, list) else body.get('items', [])
+        entry = endpoints.setdefault(name, {'latencies': [], 'docs': 0, 'errors': 0})
+        entry['latencies'].append(seconds)
+        entry['docs'] += len(items)
+        entry['errors'] += response.status_code != 200
+        return body
+
+    for name, url, fields in (('tasks', '/api/tasks', '_id,name,status'),
+                              ('questionnaires', '/api/questionnaires/', 'id,title,status')):
+        for suffix, extra in (('pages', {}), ('pages_fields', {'fields': fields})):
+            cursor = None
+            for _ in range(params['pages']):
+                query = dict(extra, limit=params['page_size'])
+                if cursor:
+                    query['cursor'] = cursor
+                cursor = request(f"{name}_{suffix}", url, query).get('nextCursor')
+                if not cursor:
+                    break
+        for _ in range(params['full_lists']):
+            request(f"{name}_full", url, {})
+
+    all_latencies = [s for entry in endpoints.values() for s in entry['latencies']]
+    total_docs = sum(entry['docs'] for entry in endpoints.values())
+    return result(
+        'documents', total_docs, sum(all_latencies), all_latencies,
+        latency_of='request',
+        endpoints={
+            name: {
+                'requests': len(entry['latencies']),
+                'errors': entry['errors'],
+                'docs_per_second': _round(entry['docs'] / sum(entry['latencies'])),
+                'latency_ms': latency_summary(entry['latencies'])
+            }
+            for name, entry in endpoints.items()
+        }
+    )
+
+
+def concurrent_starts(params):
+    """`starts` simultaneous POST /start calls over `questionnaires` questionnaires"""
+    use_memory_questionnaires()
+    from app.models import questionnaire
+    from app.services import questionnaire_service
+    from app.services.brainbase_client import FakeBrainbaseClient, set_brainbase_client
+
+    brainbase = FakeBrainbaseClient(latency=params['brainbase_latency'],
+                                    error_rate=params['brainbase_error_rate'])
+    set_brainbase_client(brainbase)
+    questionnaire_service.FLOWS_DIR = Path(tempfile.mkdtemp(prefix='benchmark-flows-'))
+
+    ids = [ObjectId() for _ in range(params['questionnaires'])]
+    questionnaire.questionnaire_collection.insert_many([
+        {'_id': _id, 'title': f"Questionnaire {i}", 'created_at': datetime.utcnow(),
+         'questions': [{'text': 'How was your visit?', 'type': 'rating'}],
+         'status': 'Not Started'}
+        for i, _id in enumerate(ids)
+    ])
+
+    app = create_app()
+    starts = params['starts']
+    barrier = threading.Barrier(starts)
+    latencies = [None] * starts
+    statuses = [None] * starts
+
+    def start(i):
+        client = app.test_client()
+        barrier.wait()
+        began = perf_counter()
+        response = client.post(f"/api/questionnaires/{ids[i % len(ids)]}/start")
+        latencies[i] = perf_counter() - began
+        statuses[i] = response.status_code
+
+    started = perf_counter()
+    threads = [threading.Thread(target=start, args=(i,)) for i in range(starts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    requests_done = perf_counter() - started
+
+    # Wait for the accepted deployments to finish
+    in_flight = {'deployment.status': {'$in': ['queued', 'running']}}
+    deadline = time.monotonic() + params['timeout']
+    while questionnaire.questionnaire_collection.count_documents(in_flight) and \
+            time.monotonic() < deadline:
+        time.sleep(0.05)
+    elapsed = perf_counter() - started
+
+    deployments = Counter(
+        (doc.get('deployment') or {}).get('status', 'not_deployed')
+        for doc in questionnaire.questionnaire_collection.find({}, {'deployment': 1})
+    )
+    return result(
+        'deployments', deployments.get('succeeded', 0), elapsed, latencies,
+        latency_of='POST /start request',
+        requests_per_second=_round(starts / requests_done),
+        status_codes={str(code): n for code, n in Counter(statuses).items()},
+        deployments=dict(deployments),
+        brainbase_calls=len(brainbase.calls)
+    )
+
+
+SCENARIOS = {
+    'task_1k_files': (task_1k_files, dict(PIPELINE_DEFAULTS, files=1000)),
+    'concurrent_tasks': (concurrent_tasks, dict(
+        PIPELINE_DEFAULTS, tasks=100, files=20, workers=None, timeout=600
+    )),
+    'list_50k': (list_50k, {'docs': 50000, 'page_size': 100, 'pages': 50, 'full_lists': 3}),
+    'concurrent_starts': (concurrent_starts, {
+        'starts': 200, 'questionnaires': 200, 'brainbase_latency': 0.05,
+        'brainbase_error_rate': 0.0, 'timeout': 300
+    }),
+}
+
+
+def scenario_params(name, scale=1.0, overrides=None):
+    params = dict(SCENARIOS[name][1])
+    for key in SIZE_PARAMS & params.keys():
+        params[key] = max(1, int(params[key] * scale))
+    for key, value in (overrides or {}).items():
+        if key in params:
+            params[key] = value
+    return params
+
+
+def run_scenario(name, params):
+    """Run one scenario in the current process"""
+    return dict(SCENARIOS[name][0](params), params=params)
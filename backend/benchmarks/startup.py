@@ -0,0 +1,120 @@
+"""
+Startup time check: import the app entry point under `python -X importtime`
+and fail if it takes longer than the budget, or if a dependency that is
+meant to load on first use is imported at startup.
+
+    python -m benchmarks.startup                   # wsgi, 5 runs
+    python -m benchmarks.startup --budget-ms 500 --output startup.json
+
+Exits with status 1 when the check fails. tests/test_startup.py runs the
+same check as part of the test suite.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+STARTUP_BUDGET_MS = float(os.environ.get('STARTUP_BUDGET_MS', '800'))
+
+# Loaded through app.lazy or inside functions, never while the app starts
+DEFERRED_MODULES = (
+    'googleapiclient', 'google.oauth2', 'google.auth', 'google_auth_httplib2',
+    'httplib2', 'requests', 'numpy', 'brainbase_labs'
+)
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+
+def measure(module):
+    """One cold import of `module`: (total ms, {direct import: ms}, every module imported)"""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+
+    total = None
+    imports = []
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        imports.append((len(indent), name, int(cumulative) / 1000))
+        if name == module and not indent:
+            total = int(cumulative) / 1000
+
+    # Modules are reported after their own imports, so the direct imports of
+    # `module` are the one-level-deeper lines just before it
+    direct = {}
+    for depth, name, ms in reversed(imports[:[n for _, n, _ in imports].index(module)]):
+        if depth == 0:
+            break
+        if depth == 2:
+            direct[name] = round(ms, 1)
+    return total, direct, {name for _, name, _ in imports}
+
+
+def deferred_imports(modules):
+    """The DEFERRED_MODULES that were imported, themselves or through a submodule"""
+    return [
+        deferred for deferred in DEFERRED_MODULES
+        if any(name == deferred or name.startswith(deferred + '.') for name in modules)
+    ]
+
+
+def check(module='wsgi', runs=5, budget_ms=STARTUP_BUDGET_MS):
+    """Import `module` `runs` times and compare the median with the budget"""
+    totals = []
+    for _ in range(max(1, runs)):
+        total, direct, modules = measure(module)
+        totals.append(total)
+
+    median = statistics.median(totals)
+    deferred = deferred_imports(modules)
+    return {
+        'module': module,
+        'runs': len(totals),
+        'median_ms': round(median, 1),
+        'min_ms': round(min(totals), 1),
+        'budget_ms': budget_ms,
+        'slowest_imports_ms': dict(sorted(direct.items(), key=lambda item: -item[1])[:10]),
+        'deferred_modules_imported': deferred,
+        'ok': median <= budget_ms and not deferred
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of the app entry point")
+    parser.add_argument('--module', default='wsgi', help="module to import (default: wsgi)")
+    parser.add_argument('--runs', type=int, default=5, help="cold imports to take the median of")
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS,
+                        help=f"maximum median import time (default: {STARTUP_BUDGET_MS:g})")
+    parser.add_argument('--output', help="also write the JSON result to this file")
+    args = parser.parse_args()
+
+    result = check(args.module, args.runs, args.budget_ms)
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+    if result['median_ms'] > args.budget_ms:
+        print(f"Importing {args.module} took {result['median_ms']:.0f} ms, "
+              f"over the {args.budget_ms:g} ms budget", file=sys.stderr)
+    if result['deferred_modules_imported']:
+        print(f"Imported at startup instead of on first use: "
+              f"{', '.join(result['deferred_modules_imported'])}", file=sys.stderr)
+    sys.exit(0 if result['ok'] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+gunicorn settings for the API:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+WORKER_MODEL picks how each process serves requests:
+- sync: one request at a time per process
+- threaded (default): WEB_THREADS requests per process on a thread pool
+- gevent: WEB_WORKER_CONNECTIONS requests per process on greenlets
+  (requires `pip install gevent`)
+
+Each process runs its own task worker pool when RUN_EMBEDDED_WORKERS is
+on; the queue is shared through MongoDB. The in-memory store is per
+process, so without USE_MONGODB a single process is used.
+"""
+import multiprocessing
+import os
+
+from app import load_env
+
+load_env()
+
+WORKER_CLASSES = {'sync': 'sync', 'threaded': 'gthread', 'gevent': 'gevent'}
+WORKER_MODEL = os.environ.get('WORKER_MODEL', 'threaded').lower()
+if WORKER_MODEL not in WORKER_CLASSES:
+    raise ValueError(f"WORKER_MODEL must be one of {', '.join(WORKER_CLASSES)}, not {WORKER_MODEL!r}")
+USE_MONGODB = os.environ.get('USE_MONGODB', 'false').lower() == 'true'
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+worker_class = WORKER_CLASSES[WORKER_MODEL]
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+if not USE_MONGODB and workers > 1:
+    print("The in-memory store cannot be shared between processes; using 1 worker process")
+    workers = 1
+# gunicorn turns sync workers with more than one thread into gthread ones
+threads = int(os.environ.get('WEB_THREADS', '8')) if WORKER_MODEL == 'threaded' else 1
+worker_connections = int(os.environ.get('WEB_WORKER_CONNECTIONS', '1000'))
+
+# Seconds a request may take before its worker is restarted, and that
+# stopping workers get to finish requests and drain running tasks
+timeout = int(os.environ.get('WEB_TIMEOUT', '120'))
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', '60'))
+keepalive = int(os.environ.get('WEB_KEEPALIVE', '5'))
+
+# A sync worker serves one request at a time, so every open task event
+# stream would take a whole process, and one that outlives `timeout` gets
+# the worker killed. Streams are off there unless SSE_ENABLED is set, and
+# then kept shorter than the timeout.
+if WORKER_MODEL == 'sync':
+    os.environ.setdefault('SSE_ENABLED', 'false')
+    sse_max_duration = float(os.environ.get('SSE_MAX_DURATION', '300'))
+    os.environ['SSE_MAX_DURATION'] = str(min(sse_max_duration, max(1, timeout - 10)))
+
+# Restart workers after this many requests (0 disables) to bound memory growth
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', '0'))
+
+# Loading the app once in the master shares its memory between workers.
+# gevent patches the standard library in each worker, before the app is
+# imported, so it cannot be combined with preloading.
+preload_app = os.environ.get('PRELOAD_APP', 'false').lower() == 'true' and WORKER_MODEL != 'gevent'
+
+accesslog = os.environ.get('WEB_ACCESS_LOG', '-')
+
+
+def pre_fork(server, worker):
+    # A preloaded app may have connected to MongoDB in the master; do not
+    # fork its sockets and monitor threads. The Mongo client, Brainbase
+    # client and response writer also reset themselves in each child.
+    from app.db import close_client
+    close_client()
+
+
+def post_worker_init(worker):
+    # Threads do not survive the fork, so each worker starts its own pool
+    from app import start_workers
+    start_workers()
+
+
+def worker_exit(server, worker):
+    # Leave a few seconds of the graceful timeout for the rest of the shutdown
+    from app import shutdown
+    shutdown(timeout=max(1, graceful_timeout - 5))
@@ -0,0 +1,52 @@
+from bson import ObjectId
+import pytest
+
+from app import create_app
+from benchmarks.scenarios import use_memory_questionnaires
+
+BAD_IDS = ['bad', {'$gt': ''}, ['x'], 42]
+
+
+@pytest.fixture
+def client():
+    use_memory_questionnaires()
+    return create_app({'TESTING': True, 'ENSURE_INDEXES': False}).test_client()
+
+
+def statuses(response):
+    assert response.status_code == 200
+    return [result['status'] for result in response.json['results']]
+
+
+def test_questionnaire_create_reports_a_malformed_id_per_item(client):
+    response = client.post('/api/questionnaires/bulk', json=[
+        {'id': 'bad', 'title': 'a', 'questions': []},
+        {'title': 'b', 'questions': []}
+    ])
+    assert statuses(response) == ['error', 'created']
+
+
+@pytest.mark.parametrize('method', ['PUT', 'DELETE'])
+def test_questionnaire_update_and_delete_reject_malformed_ids(client, method):
+    created = client.post('/api/questionnaires/bulk', json=[{'title': 'a', 'questions': []}])
+    good = created.json['results'][0]['id']
+    items = [{'id': bad, 'title': 'x', 'questions': []} for bad in BAD_IDS]
+    items.append({'id': good, 'title': 'x', 'questions': []})
+
+    response = client.open('/api/questionnaires/bulk', method=method, json=items)
+    assert statuses(response) == ['error'] * len(BAD_IDS) + [
+        'updated' if method == 'PUT' else 'deleted'
+    ]
+
+
+@pytest.mark.parametrize('method', ['PUT', 'DELETE'])
+def test_task_update_and_delete_reject_malformed_ids(client, method):
+    created = client.post('/api/tasks/bulk', json=[{'name': 'a'}])
+    good = created.json['results'][0]['id']
+    items = [{'_id': bad, 'name': 'x'} for bad in BAD_IDS]
+    items += [{'_id': good, 'name': 'x'}, {'_id': str(ObjectId()), 'name': 'x'}]
+
+    response = client.open('/api/tasks/bulk', method=method, json=items)
+    assert statuses(response) == ['error'] * len(BAD_IDS) + [
+        'updated' if method == 'PUT' else 'deleted', 'not_found'
+    ]
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.questionnaire import Questionnaire
+from app.services import questionnaire_service
+from app.services.brainbase_client import FakeBrainbaseClient, set_brainbase_client
+from app.services.questionnaire_service import QuestionnaireService, shutdown_deployments
+from benchmarks.scenarios import use_memory_questionnaires
+
+
+@pytest.fixture
+def questionnaire(tmp_path, monkeypatch):
+    use_memory_questionnaires()
+    monkeypatch.setattr(questionnaire_service, 'FLOWS_DIR', tmp_path)
+    questionnaire = Questionnaire(title='Intake', questions=[{'text': 'Name?', 'type': 'text'}])
+    questionnaire_service.questionnaire_collection.insert_one(questionnaire.to_mongo())
+    return questionnaire
+
+
+def test_redeploy_updates_the_voice_deployment(questionnaire):
+    client = FakeBrainbaseClient()
+    first = QuestionnaireService.deploy_questionnaire(questionnaire.id, client=client)
+
+    questionnaire_service.questionnaire_collection.update_one(
+        {'_id': questionnaire.to_mongo()['_id']}, {'$set': {'title': 'Intake v2'}}
+    )
+    second = QuestionnaireService.deploy_questionnaire(questionnaire.id, client=client)
+
+    assert second['deployment_id'] == first['deployment_id']
+    assert second['flow_version'] == 'v2'
+    kind, action, kwargs = client.calls[-1]
+    assert (kind, action) == ('voice_deployment', 'update')
+    assert kwargs['deployment_id'] == first['deployment_id']
+    assert kwargs['flow_id'] == second['flow_id']
+    assert [call[:2] for call in client.calls].count(('voice_deployment', 'create')) == 1
+
+
+@pytest.mark.parametrize('heartbeat_age, reclaimed', [(10, False), (3600, True)])
+def test_start_reclaims_a_running_job_without_heartbeats(questionnaire, heartbeat_age, reclaimed):
+    now = datetime.utcnow()
+    questionnaire_service.questionnaire_collection.update_one(
+        {'_id': questionnaire.to_mongo()['_id']},
+        {'$set': {'deployment': {'job_id': 'lost', 'status': 'running', 'queued_at': now,
+                                 'started_at': now,
+                                 'heartbeat_at': now - timedelta(seconds=heartbeat_age)}}}
+    )
+    set_brainbase_client(FakeBrainbaseClient())
+    try:
+        deployment = QuestionnaireService.start_questionnaire(questionnaire.id)
+        shutdown_deployments()
+    finally:
+        set_brainbase_client(None)
+
+    assert (deployment['job_id'] != 'lost') is reclaimed
+    status = QuestionnaireService.get_deployment(questionnaire.id)['status']
+    assert status == ('succeeded' if reclaimed else 'running')
@@ -0,0 +1,127 @@
+import re
+from types import SimpleNamespace
+
+import googleapiclient.http
+import pytest
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from app.models.task import Task
+from app.services import task_service
+from app.services.drive_download import download_to_buffer, open_download
+from app.services.drive_listing import iter_files_by_id, iter_folder_files
+from benchmarks.fakes import FakeClientCache, FakeGoogleAPI
+
+
+class FlakyDownloads(FakeGoogleAPI):
+    """Fails the ranged GETs starting at `fail_at` bytes `failures` times each"""
+    def __init__(self, fail_at, failures, status=503, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_at = set(fail_at)
+        self.failures = failures
+        self.status = status
+        self.failed = {}
+        self.ranges = []
+
+    def _download(self, file_id, headers):
+        start = int(re.match(r'bytes=(\d+)-', headers['range']).group(1))
+        self.ranges.append(start)
+        if start in self.fail_at and self.failed.get(start, 0) < self.failures:
+            self.failed[start] = self.failed.get(start, 0) + 1
+            return self._json({'error': {'code': self.status, 'message': 'Fake error'}}, self.status)
+        return super()._download(file_id, headers)
+
+
+def drive_on(google):
+    """A real Drive client on the fake transport"""
+    return build('drive', 'v3', http=google, cache_discovery=False, static_discovery=True)
+
+
+@pytest.fixture(autouse=True)
+def no_retry_sleep(monkeypatch):
+    # MediaIoBaseDownload sleeps rand() * 2 ** retry between its retries
+    monkeypatch.setattr(googleapiclient.http, 'random', SimpleNamespace(random=lambda: 0))
+
+
+@pytest.fixture
+def google():
+    return FakeGoogleAPI(files_per_folder=10, file_size=1024)
+
+
+@pytest.fixture
+def drive(google):
+    return drive_on(google)
+
+
+def test_download_reads_the_file_in_chunks(google, drive):
+    with open_download(drive, 'folder-1', chunk_size=300) as buffer:
+        assert buffer.read() == google.content
+    # 1024 bytes in 300-byte ranges
+    assert google.requests == 4
+
+
+def test_small_download_stays_in_memory(drive):
+    with open_download(drive, 'folder-1', spool_max_size=4096) as buffer:
+        assert not buffer._rolled
+
+
+def test_large_download_spills_to_disk_and_is_removed(drive):
+    buffer = download_to_buffer(drive, 'folder-1', chunk_size=256, spool_max_size=512)
+    assert buffer._rolled
+    buffer.close()
+    assert buffer.closed
+
+
+def test_download_resumes_from_the_failed_chunk():
+    # Three failures exhaust the retries within a chunk, so the download resumes
+    google = FlakyDownloads(fail_at=[600], failures=3, files_per_folder=1, file_size=1000)
+    buffer = download_to_buffer(drive_on(google), 'folder-0', chunk_size=300, max_resumes=1)
+    assert buffer.read() == google.content
+    # The earlier chunks are not fetched again
+    assert google.ranges == [0, 300, 600, 600, 600, 600, 900]
+
+
+def test_download_gives_up_after_max_resumes():
+    google = FlakyDownloads(fail_at=[300], failures=100, files_per_folder=1, file_size=1000)
+    with pytest.raises(HttpError):
+        download_to_buffer(drive_on(google), 'folder-0', chunk_size=300, max_resumes=1)
+
+
+def test_download_does_not_resume_after_a_client_error():
+    google = FlakyDownloads(fail_at=[0], failures=1, status=404, files_per_folder=1, file_size=1000)
+    with pytest.raises(HttpError):
+        download_to_buffer(drive_on(google), 'folder-0', chunk_size=300, max_resumes=3)
+    assert google.ranges == [0]
+
+
+@pytest.mark.parametrize('files, pages', [(0, 1), (99, 1), (100, 1), (101, 2), (250, 3)])
+def test_folder_listing_follows_page_tokens(files, pages):
+    google = FakeGoogleAPI(files_per_folder=files)
+    listed = list(iter_folder_files(drive_on(google), 'folder', page_size=100))
+    assert [f['id'] for f in listed] == [f"folder-{i}" for i in range(files)]
+    assert google.requests == pages
+
+
+def test_folder_listing_is_lazy(drive, google):
+    files = iter_folder_files(drive, 'folder', page_size=4)
+    assert google.requests == 0
+    first = [next(files) for _ in range(4)]
+    assert google.requests == 1
+    assert len(first) + len(list(files)) == 10
+    assert google.requests == 3
+
+
+def test_files_are_fetched_by_id_skipping_missing_and_moved_ones(drive, google):
+    files = iter_files_by_id(drive, 'folder', ['folder-3', 'folder-99', 'other-1', 'folder-7'])
+    assert [f['id'] for f in files] == ['folder-3', 'folder-7']
+    assert google.requests == 4
+
+
+def test_incremental_runs_retry_the_files_that_failed(monkeypatch, google):
+    monkeypatch.setattr(task_service, 'client_cache', FakeClientCache(google))
+    task = Task('t', source_path='folder')
+    files = task_service.TaskService._get_files_from_google_drive(
+        task, cursor='1', retry_ids=['folder-2', 'folder-2', 'folder-5']
+    )
+    # The fake changes feed is empty, so only the retried files are listed
+    assert [f['id'] for f in files] == ['folder-2', 'folder-5']
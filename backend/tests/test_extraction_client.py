@@ -0,0 +1,104 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import pytest
+
+from app.services.extraction_client import ExtractionError
+from benchmarks.fakes import FakeExtractionAPI, FakeResponse, fake_extraction_client
+
+
+class ScriptedExtractionAPI(FakeExtractionAPI):
+    """Answers with the scripted responses first, then like FakeExtractionAPI"""
+    def __init__(self, responses=(), **kwargs):
+        super().__init__(latency=0, **kwargs)
+        self.responses = list(responses)
+        self.posts = 0
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        self.posts += 1
+        if self.responses:
+            return self.responses.pop(0)
+        return super().post(url, json=json, headers=headers, timeout=timeout)
+
+
+@pytest.fixture
+def make_client():
+    clients = []
+
+    def make(api, **kwargs):
+        kwargs.setdefault('qps', 1000)
+        client = fake_extraction_client(api, **kwargs)
+        # Record the backoff delays instead of sleeping them
+        client.backoffs = []
+        client._backoff = lambda attempt: client.backoffs.append(attempt) or 0
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+def test_documents_are_batched(make_client):
+    api = ScriptedExtractionAPI()
+    client = make_client(api, batch_size=4, batch_wait=0.2)
+    contents = [f"document {i}".encode() for i in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(client.extract, contents))
+
+    assert [r['fields']['bytes'] for r in results] == [len(c) for c in contents]
+    assert api.batches == 2
+
+
+def test_5xx_and_429_are_retried_with_backoff(make_client):
+    api = ScriptedExtractionAPI([FakeResponse(503, {}), FakeResponse(429, {})])
+    client = make_client(api, max_retries=3)
+
+    assert client.extract(b'pdf')['fields'] == {'bytes': 3}
+    assert api.posts == 3
+    assert client.backoffs == [0, 1]
+
+
+def test_retry_after_is_honoured_instead_of_the_backoff(make_client):
+    api = ScriptedExtractionAPI([FakeResponse(429, {}, headers={'Retry-After': '1'})])
+    client = make_client(api, max_retries=3)
+
+    started = time.monotonic()
+    client.extract(b'pdf')
+    assert time.monotonic() - started >= 1
+    assert api.posts == 2
+    assert client.backoffs == []
+
+
+def test_gives_up_after_max_retries(make_client):
+    api = ScriptedExtractionAPI([FakeResponse(503, {'error': 'down'})] * 3)
+    client = make_client(api, max_retries=2)
+
+    with pytest.raises(ExtractionError, match='503'):
+        client.extract(b'pdf')
+    assert api.posts == 3
+
+
+def test_client_errors_are_not_retried(make_client):
+    api = ScriptedExtractionAPI([FakeResponse(400, {'error': 'bad document'})])
+    client = make_client(api, max_retries=3)
+
+    with pytest.raises(ExtractionError, match='400'):
+        client.extract(b'pdf')
+    assert api.posts == 1
+
+
+def test_a_failed_document_does_not_fail_its_batch(make_client):
+    api = ScriptedExtractionAPI([FakeResponse(200, {'results': [
+        {'id': '0', 'error': 'unreadable'},
+        {'id': '1', 'text': 'ok', 'fields': {}}
+    ]})])
+    client = make_client(api, batch_size=2, batch_wait=0.2)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(client.extract, b'a')
+        time.sleep(0.05)
+        second = executor.submit(client.extract, b'b')
+
+    with pytest.raises(ExtractionError, match='unreadable'):
+        first.result()
+    assert second.result() == {'text': 'ok', 'fields': {}}
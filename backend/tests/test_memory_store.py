@@ -0,0 +1,203 @@
+from bson import ObjectId
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+import pytest
+
+from app import memory_store
+from app.memory_store import ASCENDING, DESCENDING, HASHED, InMemoryCollection
+
+
+def people():
+    return [
+        {'_id': 1, 'name': 'ada', 'age': 36, 'team': 'a', 'address': {'city': 'london'}},
+        {'_id': 2, 'name': 'bob', 'age': 25, 'team': 'b', 'address': {'city': 'paris'}},
+        {'_id': 3, 'name': 'cy', 'age': 41, 'team': 'a', 'address': {'city': 'paris'}},
+        {'_id': 4, 'name': 'di', 'age': 25, 'team': 'c'},
+        {'_id': 5, 'name': 'ed', 'age': None, 'team': 'b', 'tags': ['x', 'y']},
+    ]
+
+
+def collection(indexes=()):
+    coll = InMemoryCollection('people')
+    for keys in indexes:
+        coll.create_index([keys])
+    coll.insert_many(people())
+    return coll
+
+
+def ids(documents):
+    return [document['_id'] for document in documents]
+
+
+def test_dotted_path_filters():
+    coll = collection()
+    assert ids(coll.find({'address.city': 'paris'})) == [2, 3]
+    assert ids(coll.find({'address.city': {'$exists': False}})) == [4, 5]
+    assert ids(coll.find({'tags': 'y'})) == [5]
+
+
+def test_comparisons_are_type_bracketed():
+    coll = collection()
+    # None never compares greater than a number
+    assert ids(coll.find({'age': {'$gte': 0}})) == [1, 2, 3, 4]
+    assert ids(coll.find({'age': {'$gt': '0'}})) == []
+
+
+QUERIES = [
+    {'team': {'$in': ['a', 'c']}},
+    {'team': 'b', 'age': {'$ne': None}},
+    {'age': {'$gte': 25, '$lt': 40}},
+    {'age': {'$lte': 25}},
+    {'$or': [{'team': 'c'}, {'age': {'$gt': 40}}]},
+    {'team': {'$nin': ['a']}, 'address.city': 'paris'},
+]
+
+
+@pytest.mark.parametrize('query', QUERIES)
+@pytest.mark.parametrize('indexes', [
+    [('age', ASCENDING), ('team', ASCENDING)],
+    [('age', ASCENDING), ('team', HASHED)],
+])
+def test_indexed_queries_match_a_full_scan(query, indexes):
+    expected = ids(collection().find(query))
+    assert ids(collection(indexes).find(query)) == expected
+
+
+@pytest.mark.parametrize('threshold', [0, 1000])
+@pytest.mark.parametrize('query', [{}, {'team': 'a'}, {'age': {'$gt': 25}}])
+def test_sorted_pages_match_a_full_scan(monkeypatch, threshold, query):
+    # A threshold of 0 makes _select walk the sort index instead of
+    # sorting the filtered documents
+    monkeypatch.setattr(memory_store, 'INDEX_SCAN_THRESHOLD', threshold)
+    scanned = collection()
+    indexed = collection([('age', ASCENDING), ('team', HASHED)])
+    for direction in (ASCENDING, DESCENDING):
+        sort = [('age', direction), ('_id', direction)]
+        for skip, limit in ((0, 0), (0, 2), (1, 2), (3, 5)):
+            expected = ids(scanned.find(query).sort(sort).skip(skip).limit(limit))
+            assert ids(indexed.find(query).sort(sort).skip(skip).limit(limit)) == expected
+
+
+def test_sort_skip_limit():
+    coll = collection()
+    assert ids(coll.find().sort([('age', DESCENDING), ('_id', ASCENDING)])) == [3, 1, 2, 4, 5]
+    assert ids(coll.find().sort('name', DESCENDING).skip(1).limit(2)) == [4, 3]
+    assert ids(coll.find({'team': 'a'}).sort('age').limit(1)) == [1]
+    assert coll.find_one({'team': 'b'}, sort=[('age', DESCENDING)])['_id'] == 2
+
+
+def test_index_stays_in_sync_with_writes():
+    coll = collection([('age', ASCENDING), ('team', HASHED)])
+    coll.update_one({'_id': 2}, {'$set': {'age': 50, 'team': 'a'}})
+    coll.delete_one({'_id': 3})
+    assert ids(coll.find({'age': {'$gt': 40}})) == [2]
+    assert ids(coll.find({'team': 'a'})) == [1, 2]
+    assert ids(coll.find().sort('age', DESCENDING).limit(2)) == [2, 1]
+
+
+def test_projection_and_copies():
+    coll = collection()
+    assert coll.find_one({'_id': 1}, {'name': 1}) == {'_id': 1, 'name': 'ada'}
+    assert 'address' not in coll.find_one({'_id': 1}, {'address': 0})
+    document = coll.find_one({'_id': 1})
+    document['address']['city'] = 'rome'
+    assert coll.find_one({'_id': 1})['address']['city'] == 'london'
+
+
+def test_update_operators():
+    coll = collection()
+    result = coll.update_one({'_id': 5}, {
+        '$set': {'address.city': 'oslo'},
+        '$inc': {'visits': 2},
+        '$push': {'tags': {'$each': ['z']}},
+        '$unset': {'age': ''}
+    })
+    assert (result.matched_count, result.modified_count) == (1, 1)
+    document = coll.find_one({'_id': 5})
+    assert document['address'] == {'city': 'oslo'}
+    assert document['visits'] == 2
+    assert document['tags'] == ['x', 'y', 'z']
+    assert 'age' not in document
+
+    result = coll.update_many({'team': 'a'}, {'$inc': {'age': 1}})
+    assert (result.matched_count, result.modified_count) == (2, 2)
+    assert ids(coll.find({'age': {'$in': [37, 42]}})) == [1, 3]
+
+    result = coll.update_one({'_id': 1}, {'$set': {'team': 'a'}})
+    assert (result.matched_count, result.modified_count) == (1, 0)
+
+
+def test_upserts():
+    coll = InMemoryCollection()
+    result = coll.update_one(
+        {'key': 'k', 'count': {'$gt': 5}},
+        {'$inc': {'count': 1}, '$push': {'log': 'a'}, '$setOnInsert': {'created': True}},
+        upsert=True
+    )
+    assert isinstance(result.upserted_id, ObjectId)
+    document = coll.find_one({'key': 'k'})
+    # Operator conditions are not copied into the new document
+    assert {k: v for k, v in document.items() if k != '_id'} == \
+        {'key': 'k', 'count': 1, 'log': ['a'], 'created': True}
+
+    result = coll.update_one({'key': 'k'}, {'$inc': {'count': 1}, '$setOnInsert': {'created': False}},
+                             upsert=True)
+    assert result.upserted_id is None
+    assert coll.find_one({'key': 'k'})['count'] == 2
+    assert coll.find_one({'key': 'k'})['created'] is True
+
+    result = coll.update_many({'key': 'other'}, {'$set': {'n': 1}}, upsert=True)
+    assert result.upserted_id is not None
+    assert coll.count_documents({}) == 2
+
+
+def test_duplicate_keys():
+    coll = collection()
+    coll.create_index('name', unique=True)
+    with pytest.raises(DuplicateKeyError):
+        coll.insert_one({'_id': 1, 'name': 'new'})
+    with pytest.raises(DuplicateKeyError):
+        coll.insert_one({'name': 'ada'})
+    with pytest.raises(DuplicateKeyError):
+        coll.update_one({'_id': 2}, {'$set': {'name': 'ada', 'age': 99}})
+    # A rejected update leaves the document and the indexes untouched
+    assert coll.find_one({'_id': 2})['age'] == 25
+    assert ids(coll.find({'name': 'ada'})) == [1]
+
+
+@pytest.mark.parametrize('ordered, inserted', [(True, [10]), (False, [10, 11])])
+def test_insert_many_errors(ordered, inserted):
+    coll = collection()
+    with pytest.raises(BulkWriteError) as error:
+        coll.insert_many([{'_id': 10}, {'_id': 1}, {'_id': 11}], ordered=ordered)
+    assert error.value.details['nInserted'] == len(inserted)
+    assert [e['index'] for e in error.value.details['writeErrors']] == [1]
+    assert ids(coll.find({'_id': {'$gte': 10}})) == inserted
+
+
+def test_bulk_write():
+    coll = collection()
+    result = coll.bulk_write([
+        InsertOne({'_id': 6, 'name': 'fay'}),
+        UpdateOne({'_id': 1}, {'$set': {'age': 37}}),
+        UpdateOne({'_id': 7}, {'$set': {'name': 'gus'}}, upsert=True),
+        DeleteOne({'_id': 2}),
+    ])
+    assert (result.inserted_count, result.matched_count, result.modified_count,
+            result.deleted_count, result.upserted_count) == (1, 1, 1, 1, 1)
+    assert result.upserted_ids == {2: 7}
+    assert ids(coll.find()) == [1, 3, 4, 5, 6, 7]
+
+
+@pytest.mark.parametrize('ordered, applied', [(True, False), (False, True)])
+def test_bulk_write_errors(ordered, applied):
+    coll = collection()
+    with pytest.raises(BulkWriteError) as error:
+        coll.bulk_write([
+            InsertOne({'_id': 1}),
+            UpdateOne({'_id': 2}, {'$set': {'age': 30}}),
+        ], ordered=ordered)
+    details = error.value.details
+    assert [(e['index'], e['code']) for e in details['writeErrors']] == [(0, 11000)]
+    assert details['nModified'] == int(applied)
+    assert (coll.find_one({'_id': 2})['age'] == 30) is applied
@@ -0,0 +1,37 @@
+from datetime import datetime
+import base64
+import json
+
+from bson import ObjectId
+import pytest
+
+from app.pagination import PaginationError, decode_cursor, encode_cursor
+
+
+def token(*values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('sort_value, _id', [
+    ('2025-01-01T00:00:00', 'abc'),
+    (datetime(2025, 1, 1, 12, 30), ObjectId()),
+    (None, ObjectId()),
+    (3, 'abc'),
+])
+def test_cursor_round_trip(sort_value, _id):
+    assert decode_cursor(encode_cursor(sort_value, _id)) == (sort_value, _id)
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!',
+    token('only one value'),
+    token({'$ne': None}, str(ObjectId())),
+    token('2025', {'$gt': ''}),
+    token(['a'], 'b'),
+    token({'$oid': 'zz'}, 'b'),
+    token({'$oid': str(ObjectId()), '$ne': 1}, 'b'),
+    token({'$date': 5}, 'b'),
+])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(PaginationError):
+        decode_cursor(cursor)
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+from googleapiclient.discovery import build
+import pytest
+
+from app.services import sinks
+from app.services.sinks import SheetsSink
+from benchmarks.fakes import FakeGoogleAPI
+
+
+class FlakySheets(FakeGoogleAPI):
+    """Fails the next appends with `status`, after writing them if `written`"""
+    def __init__(self, failures, status=503, written=False):
+        super().__init__()
+        self.failures = list(failures)
+        self.status = status
+        self.written = written
+        self.appends = 0
+
+    def _append(self, path, body):
+        self.appends += 1
+        if self.failures and self.failures.pop(0):
+            if self.written:
+                super()._append(path, body)
+            return self._json({'error': {'code': self.status, 'message': 'Fake error'}}, self.status)
+        return super()._append(path, body)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(sinks, 'time', SimpleNamespace(sleep=lambda seconds: None))
+
+
+def write(google, count, **kwargs):
+    sheets = build('sheets', 'v4', http=google, cache_discovery=False, static_discovery=True)
+    kwargs.setdefault('chunk_size', 2)
+    with SheetsSink(sheets, 'sheet-1', replace=True, **kwargs) as sink:
+        for i in range(count):
+            sink.write({'fileId': str(i), 'filename': f"{i}.pdf", 'content': {}})
+    return google.sheet_rows['sheet-1']
+
+
+def test_a_rejected_append_is_sent_again():
+    google = FlakySheets([True], status=429)
+    # Header and three rows
+    assert write(google, 3) == 4
+    assert google.appends == 3
+
+
+def test_an_append_that_failed_before_writing_is_sent_again():
+    google = FlakySheets([True], status=503, written=False)
+    assert write(google, 3) == 4
+    assert google.appends == 3
+
+
+def test_an_append_that_failed_after_writing_is_not_duplicated():
+    google = FlakySheets([False, True], status=503, written=True)
+    assert write(google, 3) == 4
+    assert google.appends == 2
+
+
+def test_client_errors_are_not_retried():
+    google = FlakySheets([True], status=400)
+    with pytest.raises(Exception):
+        # One chunk, written when the sink closes
+        write(google, 1, chunk_size=10)
+    assert google.appends == 1
@@ -0,0 +1,22 @@
+"""
+Startup time budget. Each import runs in a fresh interpreter, see
+benchmarks.startup; set STARTUP_BUDGET_MS to adjust the budget.
+"""
+from benchmarks.startup import STARTUP_BUDGET_MS, check
+
+
+def test_wsgi_imports_within_budget_without_deferred_modules():
+    result = check('wsgi', runs=3)
+
+    assert not result['deferred_modules_imported'], \
+        "imported at startup instead of on first use"
+    assert result['median_ms'] <= STARTUP_BUDGET_MS, \
+        f"slowest imports: {result['slowest_imports_ms']}"
+
+
+def test_importing_a_deferred_module_is_caught():
+    # googleapiclient.errors pulls in googleapiclient and httplib2
+    result = check('googleapiclient.errors', runs=1, budget_ms=float('inf'))
+
+    assert 'googleapiclient' in result['deferred_modules_imported']
+    assert not result['ok']
@@ -0,0 +1,44 @@
+from app.config import credentials_collection, tasks_collection
+from app.services.credential_store import CredentialStore
+from app.services.task_service import TaskService
+
+
+def task_data(name, credentials, **extra):
+    return dict(name=name, sourceType='google_drive', sourcePath='folder',
+                outputType='csv', googleCredentials=credentials, **extra)
+
+
+def credentials_id(task_id):
+    return tasks_collection.find_one({'_id': task_id})['credentialsId']
+
+
+def test_api_responses_do_not_expose_the_credentials_id():
+    task = TaskService.create_task(task_data('a', '{"a": 1}'))
+
+    assert 'credentialsId' not in task
+    assert 'credentialsId' not in TaskService.get_task_by_id(task['_id'])
+    assert task['hasCredentials']
+
+
+def test_a_client_supplied_credentials_id_is_ignored():
+    a = TaskService.create_task(task_data('a', '{"a": 1}'))
+    stolen = credentials_id(a['_id'])
+
+    b = TaskService.create_task(task_data('b', '{"b": 2}', credentialsId=stolen))
+    c = TaskService.create_tasks([task_data('c', '{"c": 3}', credentialsId=stolen)])[0]
+    assert stolen not in (credentials_id(b['_id']), credentials_id(c['id']))
+
+    TaskService.delete_task(b['_id'])
+    TaskService.delete_tasks([c['id']])
+    assert CredentialStore.load(stolen)['googleCredentials'] == '{"a": 1}'
+
+
+def test_update_keeps_the_stored_credentials_id():
+    a = TaskService.create_task(task_data('a', '{"a": 1}'))
+    stored = credentials_id(a['_id'])
+    other = TaskService.create_task(task_data('b', '{"b": 2}'))
+
+    TaskService.update_task(a['_id'], task_data('a2', '{"a": 2}', credentialsId=credentials_id(other['_id'])))
+    assert credentials_id(a['_id']) == stored
+    assert CredentialStore.load(stored)['googleCredentials'] == '{"a": 2}'
+    assert credentials_collection.find_one({'_id': credentials_id(other['_id'])})['googleCredentials'] == '{"b": 2}'
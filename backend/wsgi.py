@@ -0,0 +1,13 @@
+"""
+Production WSGI entry point:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py starts the task workers in every server process and
+drains them on shutdown. Under other WSGI servers, call start_workers()
+after the fork and shutdown() before exit, or run the workers separately
+with `python -m app.worker`.
+"""
+from app import create_app
+
+app = create_app()
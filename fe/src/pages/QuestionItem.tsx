@@ -36,11 +36,21 @@ const QuestionItem: React.FC<QuestionItemProps> = ({
         >
           <MenuItem value="rating">Rating</MenuItem>
           <MenuItem value="open_ended">Open Ended</MenuItem>
+          <MenuItem value="multiple_choice">Multiple Choice</MenuItem>
         </Select>
         <IconButton onClick={() => onDelete(index)} color="error">
           <DeleteIcon />
         </IconButton>
       </Box>
+      {question.type === 'multiple_choice' && (
+        <TextField
+          fullWidth
+          label="Options (comma separated)"
+          value={(question.options || []).join(', ')}
+          onChange={(e) => onUpdate(index, 'options', e.target.value.split(',').map((o) => o.trim()))}
+          sx={{ mt: 2 }}
+        />
+      )}
     </Box>
   );
 };
@@ -72,7 +72,7 @@ const QuestionnaireEdit: React.FC = () => {
         const startData = await apiRequest(`${api.endpoints.questionnaires}/${id}/start`, {
           method: 'POST',
         });
-        console.log('Questionnaire started:', startData);
+        console.log('Questionnaire deployment queued:', startData);
         navigate('/');
       } else {
         setQuestionnaire(statusData);
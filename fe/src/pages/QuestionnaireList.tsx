@@ -37,18 +37,26 @@ interface Questionnaire {
   status: 'Not Started' | 'Running' | 'Stopped' | 'Complete';
 }
 
+const PAGE_SIZE = 20;
+
 const QuestionnaireList: React.FC = () => {
   const [questionnaires, setQuestionnaires] = useState<Questionnaire[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [editingQuestionnaire, setEditingQuestionnaire] = useState<Questionnaire | null>(null);
   const [deleteConfirmId, setDeleteConfirmId] = useState<string | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const navigate = useNavigate();
 
-  const fetchQuestionnaires = async () => {
+  const fetchQuestionnaires = async (cursor: string | null = null) => {
     try {
-      const data = await apiRequest(api.endpoints.questionnaires);
-      setQuestionnaires(data);
+      const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+      if (cursor) {
+        params.set('cursor', cursor);
+      }
+      const data = await apiRequest(`${api.endpoints.questionnaires}/?${params}`);
+      setQuestionnaires(prev => cursor ? [...prev, ...data.items] : data.items);
+      setNextCursor(data.nextCursor);
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to load questionnaires');
     } finally {
@@ -190,6 +198,13 @@ const QuestionnaireList: React.FC = () => {
               </Card>
             </ListItem>
           ))}
+          {nextCursor && (
+            <Box display="flex" justifyContent="center">
+              <Button onClick={() => fetchQuestionnaires(nextCursor)}>
+                Load more
+              </Button>
+            </Box>
+          )}
         </List>
       )}
 
@@ -2,6 +2,16 @@ import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import api from '../utils/axios-config';
 
+interface TaskProgress {
+  stage: string;
+  listed: number;
+  downloaded: number;
+  extracted: number;
+  written: number;
+  failed: number;
+  etaSeconds: number | null;
+}
+
 interface Task {
   _id: string;
   name: string;
@@ -10,8 +20,8 @@ interface Task {
   sourcePath: string;
   outputType: string;
   outputPath: string;
-  googleApiKey: string;
-  googleCredentials: string;
+  hasCredentials: boolean;
+  progress?: TaskProgress | null;
 }
 
 const TaskDetail: React.FC = () => {
@@ -41,8 +51,9 @@ const TaskDetail: React.FC = () => {
             sourcePath: response.data.sourcePath || '',
             outputType: response.data.outputType || 'google_sheets',
             outputPath: response.data.outputPath || '',
-            googleApiKey: response.data.googleApiKey || '',
-            googleCredentials: response.data.googleCredentials || ''
+            // Stored credentials are never sent back; leaving these blank keeps them
+            googleApiKey: '',
+            googleCredentials: ''
           });
         }
         setLoading(false);
@@ -55,6 +66,22 @@ const TaskDetail: React.FC = () => {
     fetchTask();
   }, [taskId]);
 
+  // Follow a queued or running task through its event stream instead of polling
+  const isActive = task?.status === 'queued' || task?.status === 'in_progress';
+  useEffect(() => {
+    if (!taskId || !isActive) return;
+
+    const events = new EventSource(`${api.defaults.baseURL}/api/tasks/${taskId}/events`);
+    events.addEventListener('progress', (e) => {
+      const { status, progress } = JSON.parse((e as MessageEvent).data);
+      setTask(prev => (prev ? { ...prev, status, progress } : prev));
+      if (status === 'completed' || status === 'failed') {
+        events.close();
+      }
+    });
+    return () => events.close();
+  }, [taskId, isActive]);
+
   const handleChange = (e: React.ChangeEvent<HTMLInputElement | HTMLSelectElement | HTMLTextAreaElement>) => {
     const { name, value } = e.target;
     setFormData(prev => ({
@@ -66,7 +93,9 @@ const TaskDetail: React.FC = () => {
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     try {
-      await api.put(`/api/tasks/${taskId}`, formData);
+      const response = await api.put(`/api/tasks/${taskId}`, formData);
+      setTask(response.data);
+      setFormData(prev => ({ ...prev, googleApiKey: '', googleCredentials: '' }));
       alert('Task configuration saved successfully!');
     } catch (error) {
       console.error('Error updating task:', error);
@@ -77,7 +106,7 @@ const TaskDetail: React.FC = () => {
   const handleStartTask = async () => {
     try {
       await api.post(`/api/tasks/${taskId}/start`);
-      alert('Task started successfully!');
+      alert('Task queued successfully!');
       // Refresh the task data
       const response = await api.get(`/api/tasks/${taskId}`);
       setTask(response.data);
@@ -202,7 +231,8 @@ const TaskDetail: React.FC = () => {
             name="googleApiKey"
             value={formData.googleApiKey}
             onChange={handleChange}
-            required
+            placeholder={task.hasCredentials ? 'Stored - leave blank to keep' : ''}
+            required={!task.hasCredentials}
           />
         </div>
 
@@ -215,7 +245,8 @@ const TaskDetail: React.FC = () => {
             onChange={handleChange}
             rows={5}
             style={{ width: '100%', fontFamily: 'monospace' }}
-            required
+            placeholder={task.hasCredentials ? 'Stored - leave blank to keep' : ''}
+            required={!task.hasCredentials}
           />
         </div>
 
@@ -225,13 +256,27 @@ const TaskDetail: React.FC = () => {
             type="button" 
             onClick={handleStartTask}
             style={{ backgroundColor: '#007bff' }}
-            disabled={task.status === 'in_progress'}
+            disabled={task.status === 'in_progress' || task.status === 'queued'}
           >
-            {task.status === 'in_progress' ? 'Task Running...' : 'Start Task'}
+            {task.status === 'in_progress' ? 'Task Running...' :
+             task.status === 'queued' ? 'Task Queued...' : 'Start Task'}
           </button>
         </div>
       </form>
 
+      {task.progress && (
+        <div style={{ marginTop: '20px', padding: '15px', backgroundColor: '#e9ecef', borderRadius: '4px' }}>
+          <h3>Progress: {task.progress.stage}</h3>
+          <p>
+            {task.progress.listed} listed, {task.progress.downloaded} downloaded,{' '}
+            {task.progress.extracted} extracted, {task.progress.written} written,{' '}
+            {task.progress.failed} failed
+            {isActive && task.progress.etaSeconds != null &&
+              ` - about ${Math.ceil(task.progress.etaSeconds)}s left`}
+          </p>
+        </div>
+      )}
+
       {task.status === 'completed' && (
         <div style={{ marginTop: '20px', padding: '15px', backgroundColor: '#d4edda', borderRadius: '4px', color: '#155724' }}>
           <h3>Task Completed Successfully</h3>
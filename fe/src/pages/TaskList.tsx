@@ -9,23 +9,34 @@ interface Task {
   createdAt: string;
 }
 
+const PAGE_SIZE = 20;
+
 const TaskList: React.FC = () => {
   const [tasks, setTasks] = useState<Task[]>([]);
   const [loading, setLoading] = useState<boolean>(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const navigate = useNavigate();
 
-  useEffect(() => {
-    const fetchTasks = async () => {
-      try {
-        const response = await api.get('/api/tasks');
-        setTasks(response.data);
-        setLoading(false);
-      } catch (error) {
-        console.error('Error fetching tasks:', error);
-        setLoading(false);
-      }
-    };
+  // Fetch one page of tasks with only the fields the list shows
+  const fetchTasks = async (cursor: string | null = null) => {
+    try {
+      const response = await api.get('/api/tasks', {
+        params: {
+          limit: PAGE_SIZE,
+          fields: '_id,name,status,createdAt',
+          ...(cursor ? { cursor } : {}),
+        },
+      });
+      setTasks(prev => cursor ? [...prev, ...response.data.items] : response.data.items);
+      setNextCursor(response.data.nextCursor);
+      setLoading(false);
+    } catch (error) {
+      console.error('Error fetching tasks:', error);
+      setLoading(false);
+    }
+  };
 
+  useEffect(() => {
     fetchTasks();
   }, []);
 
@@ -60,12 +71,16 @@ const TaskList: React.FC = () => {
                 <p>Status: <span style={{ 
                   color: task.status === 'completed' ? 'green' : 
                          task.status === 'in_progress' ? 'orange' : 
+                         task.status === 'queued' ? 'steelblue' : 
                          task.status === 'failed' ? 'red' : 'gray' 
                 }}>{task.status}</span></p>
                 <p>Created: {new Date(task.createdAt).toLocaleString()}</p>
               </div>
             </Link>
           ))}
+          {nextCursor && (
+            <button onClick={() => fetchTasks(nextCursor)}>Load more</button>
+          )}
         </div>
       )}
     </div>